@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# benchmarks/bench_lexer.py
+#
+# Запуск: python benchmarks/bench_lexer.py [speed|memory|stream|parallel|intern|relex|cache|
+#                                         bulk|errors|dispatch]
+#                                         [--size БАЙТ] [--repeat N]
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+from contextlib import nullcontext
+from pathlib import Path
+
+from common import (best_time, generate_comment_heavy_of_size, generate_identifier_heavy_of_size,
+                    generate_program_of_size, generate_string_heavy_of_size, print_row)
+
+import src.lexer.regex_scanner as regex_module
+import src.lexer.scanner as scanner_module
+from src.lexer.regex_scanner import ENGINES
+from src.lexer.cache import TokenCache
+from src.lexer.parallel import scan_parallel
+from src.lexer.scanner import Scanner
+from src.lexer.source import open_reader
+
+
+def bench_engines(source: str, repeat: int) -> None:
+    print(f"Размер исходника: {len(source) / 1e6:.2f} МБ")
+    print_row("движок", "время, с", "токенов/с")
+    for name, scanner_class in ENGINES.items():
+        count = 0
+
+        def run():
+            nonlocal count
+            count = len(scanner_class(source).scan_tokens())
+
+        elapsed = best_time(run, repeat)
+        print_row(name, f"{elapsed:.3f}", f"{count / elapsed:,.0f}")
+
+
+class DictToken:
+    # Прежнее устройство Token: обычный объект с __dict__
+
+    def __init__(self, token_type, lexeme, line, column, literal_value=None):
+        self.token_type = token_type
+        self.lexeme = lexeme
+        self.line = line
+        self.column = column
+        self.literal_value = literal_value
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used, len(result)
+
+
+def bench_memory(source: str) -> None:
+    print(f"Размер исходника: {len(source) / 1e6:.2f} МБ")
+    print_row("хранилище", "МБ", "байт/токен")
+
+    original_token = scanner_module.Token
+    scanner_module.Token = DictToken
+    try:
+        used, count = measure(lambda: Scanner(source).scan_tokens())
+    finally:
+        scanner_module.Token = original_token
+    print_row("Token + dict", f"{used / 1e6:.1f}", f"{used / count:.0f}")
+
+    used, count = measure(lambda: Scanner(source).scan_tokens())
+    print_row("Token slots", f"{used / 1e6:.1f}", f"{used / count:.0f}")
+
+    used, count = measure(lambda: Scanner(source).scan_buffer())
+    print_row("TokenBuffer", f"{used / 1e6:.1f}", f"{used / count:.0f}")
+
+
+def bench_stream(source: str) -> None:
+    # Пиковая память потокового лексинга файла: целиком в памяти или фрагментами
+    print(f"Размер исходника: {len(source) / 1e6:.2f} МБ")
+    print_row("чтение", "пик, МБ")
+
+    fd, path = tempfile.mkstemp(suffix=".src")
+    os.close(fd)
+    try:
+        Path(path).write_text(source, encoding="utf-8")
+        for mode in ("memory", "chunked", "mmap"):
+            gc.collect()
+            tracemalloc.start()
+            if mode == "memory":
+                context = nullcontext(Path(path).read_text(encoding="utf-8"))
+            else:
+                context = open_reader(path, mode)
+            with context as input_source:
+                for _ in Scanner(input_source).iter_tokens():
+                    pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print_row(mode, f"{peak / 1e6:.1f}")
+    finally:
+        os.remove(path)
+
+
+def bench_parallel(source: str, repeat: int) -> None:
+    print(f"Размер исходника: {len(source) / 1e6:.2f} МБ")
+    print_row("процессов", "время, с", "ускорение")
+    serial = best_time(lambda: Scanner(source).scan_tokens(), repeat)
+    print_row("serial", f"{serial:.3f}", "1.00")
+    for workers in (1, 2, 4, 8):
+        elapsed = best_time(lambda: scan_parallel(source, Scanner, workers), repeat)
+        print_row(workers, f"{elapsed:.3f}", f"{serial / elapsed:.2f}")
+
+
+def bench_intern(size: int, repeat: int) -> None:
+    # Интернирование отключается подменой intern на str (возвращает ту же строку)
+    source = generate_identifier_heavy_of_size(size)
+    print(f"Размер исходника: {len(source) / 1e6:.2f} МБ (много идентификаторов)")
+    print_row("движок", "интерн.", "время, с", "МБ")
+    for name, scanner_class in ENGINES.items():
+        for interned in (False, True):
+            if not interned:
+                scanner_module.intern = regex_module.intern = str
+            try:
+                elapsed = best_time(lambda: scanner_class(source).scan_tokens(), repeat)
+                used, _ = measure(lambda: scanner_class(source).scan_tokens())
+            finally:
+                scanner_module.intern = regex_module.intern = sys.intern
+            print_row(name, "да" if interned else "нет", f"{elapsed:.3f}", f"{used / 1e6:.1f}")
+
+
+def bench_relex(source: str, repeat: int) -> None:
+    # Один символ в середине файла: полное сканирование против relex
+    print(f"Размер исходника: {len(source) / 1e6:.2f} МБ")
+    print_row("правка", "полное, с", "relex, с")
+    middle = source.index("\n", len(source) // 2) + 1
+    for title, edit_range, new_text in [
+        ("символ", (middle, middle), "x"),
+        ("строка", (middle, middle), "int z = 0;\n"),
+        ("удаление", (middle, middle + 10), ""),
+    ]:
+        edited = source[:middle] + new_text + source[edit_range[1]:]
+        full = best_time(lambda: Scanner(edited).scan_buffer(), repeat)
+
+        scanner = Scanner(source)
+        buffer = scanner.scan_buffer()
+
+        def run():
+            scanner.source = source
+            scanner.relex(buffer, edit_range, new_text)
+
+        print_row(title, f"{full:.3f}", f"{best_time(run, repeat):.4f}")
+
+
+def bench_cache(source: str, repeat: int) -> None:
+    print(f"Размер исходника: {len(source) / 1e6:.2f} МБ")
+    print_row("режим", "время, с", "байт/токен")
+    scan = best_time(lambda: Scanner(source).scan_tokens(), repeat)
+    print_row("без кэша", f"{scan:.3f}", "")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TokenCache(directory)
+        tokens = cache.scan(Scanner(source))
+        size = sum(path.stat().st_size for path in Path(directory).iterdir())
+        hit = best_time(lambda: cache.scan(Scanner(source)), repeat)
+        print_row("попадание", f"{hit:.3f}", f"{size / len(tokens):.0f}")
+
+
+def bench_bulk(size: int, repeat: int) -> None:
+    # Входы, где большая часть текста — пробелы, комментарии и строки
+    print_row("вход", "движок", "время, с", "МБ/с")
+    for title, source in [
+        ("обычный", generate_program_of_size(size)),
+        ("комментарии", generate_comment_heavy_of_size(size)),
+        ("строки", generate_string_heavy_of_size(size)),
+    ]:
+        for name, scanner_class in ENGINES.items():
+            elapsed = best_time(lambda: scanner_class(source).scan_tokens(), repeat)
+            print_row(title, name, f"{elapsed:.3f}", f"{len(source) / 1e6 / elapsed:.2f}")
+
+
+def bench_errors(size: int, repeat: int) -> None:
+    # Испорченный вход с ошибкой почти на каждой строке: форматирование всех
+    # сообщений (как раньше делал Scanner.error), хранение диагностик без
+    # форматирования и режим подсчёта. Затем время до первой ошибки
+    line = "int x = @ + $; string s = \"\\q\"; 99999999999;\n"
+    source = line * max(1, size // len(line))
+    print(f"Размер исходника: {len(source) / 1e6:.2f} МБ")
+    print_row("режим", "время, с", "ошибок")
+
+    def run(error_limit, formatted):
+        scanner = Scanner(source, error_limit)
+        scanner.scan_tokens()
+        if formatted:
+            scanner.get_errors()
+        return scanner.errors.count
+
+    for title, error_limit, formatted in [
+        ("форматирование", None, True),
+        ("диагностики", None, False),
+        ("лимит 100", 100, False),
+        ("подсчёт", 0, False),
+    ]:
+        elapsed = best_time(lambda: run(error_limit, formatted), repeat)
+        print_row(title, f"{elapsed:.3f}", run(error_limit, formatted))
+
+    # Корректный файл с одной ошибкой: в начале, в середине и в конце.
+    # validate с max_errors=1 останавливается на ней
+    program = generate_program_of_size(size)
+    print_row("позиция ошибки", "полный, с", "validate, с")
+    for title, position in [("начало", 0), ("середина", len(program) // 2), ("конец", len(program))]:
+        position = program.rfind("\n", 0, position) + 1
+        broken = program[:position] + "@\n" + program[position:]
+        full = best_time(lambda: Scanner(broken).scan_tokens(), repeat)
+        early = best_time(lambda: Scanner(broken, max_errors=1).validate(), repeat)
+        print_row(title, f"{full:.3f}", f"{early:.3f}")
+
+
+def bench_dispatch(size: int, repeat: int) -> None:
+    # Классический движок на входах, где время уходит на разбор операторов,
+    # идентификаторов и чисел
+    numbers = "".join(f"x = {n} + {n}.5 * -{n % 97};\n" for n in range(1000))
+    print_row("вход", "время, с", "МБ/с")
+    for title, source in [
+        ("обычный", generate_program_of_size(size)),
+        ("идентификаторы", generate_identifier_heavy_of_size(size)),
+        ("числа", numbers * max(1, size // len(numbers))),
+    ]:
+        elapsed = best_time(lambda: Scanner(source).scan_tokens(), repeat)
+        print_row(title, f"{elapsed:.3f}", f"{len(source) / 1e6 / elapsed:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк лексера")
+    parser.add_argument("suite", nargs="?", choices=["speed", "memory", "stream", "parallel", "intern", "relex", "cache",
+                                                      "bulk", "errors", "dispatch"],
+                        default="speed",
+                        help="speed - токенов в секунду, memory - байт на токен, "
+                             "stream - пиковая память при чтении фрагментами, "
+                             "parallel - масштабирование по числу процессов, "
+                             "intern - эффект интернирования лексем, "
+                             "relex - повторное сканирование после правки, "
+                             "cache - чтение токенов из кэша, "
+                             "bulk - входы с длинными комментариями и строками, "
+                             "errors - цена ошибок на испорченном входе, "
+                             "dispatch - разбор операторов, идентификаторов и чисел")
+    parser.add_argument("--size", type=int, default=2_000_000, help="Размер исходника в байтах")
+    parser.add_argument("--repeat", type=int, default=3, help="Число повторов")
+    args = parser.parse_args()
+
+    source = generate_program_of_size(args.size)
+    if args.suite == "memory":
+        bench_memory(source)
+    elif args.suite == "stream":
+        bench_stream(source)
+    elif args.suite == "parallel":
+        bench_parallel(source, args.repeat)
+    elif args.suite == "intern":
+        bench_intern(args.size, args.repeat)
+    elif args.suite == "relex":
+        bench_relex(source, args.repeat)
+    elif args.suite == "cache":
+        bench_cache(source, args.repeat)
+    elif args.suite == "bulk":
+        bench_bulk(args.size, args.repeat)
+    elif args.suite == "errors":
+        bench_errors(args.size, args.repeat)
+    elif args.suite == "dispatch":
+        bench_dispatch(args.size, args.repeat)
+    else:
+        bench_engines(source, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
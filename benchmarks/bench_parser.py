@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# benchmarks/bench_parser.py
+#
+# Запуск: python benchmarks/bench_parser.py [speed|expressions|sources] [--size БАЙТ] [--repeat N]
+import argparse
+
+from common import best_time, generate_expression_heavy_of_size, generate_program_of_size, print_row
+
+from src.lexer.scanner import Scanner
+from src.lexer.serialize import TokenStreamReader, dump_tokens
+from src.parser.parser import Parser
+
+
+def bench_speed(source: str, repeat: int) -> None:
+    # Разбор готовых токенов: время лексера не входит
+    tokens = Scanner(source).scan_tokens()
+    print(f"Размер исходника: {len(source) / 1e6:.2f} МБ, токенов: {len(tokens):,}")
+    elapsed = best_time(lambda: Parser(tokens).parse(), repeat)
+    print_row("время, с", "токенов/с", "МБ/с")
+    print_row(f"{elapsed:.3f}", f"{len(tokens) / elapsed:,.0f}", f"{len(source) / 1e6 / elapsed:.2f}")
+
+
+def bench_expressions(size: int, repeat: int) -> None:
+    # Обычная программа против программы из длинных выражений: на втором
+    # входе почти всё время уходит на разбор выражений
+    print_row("вход", "время, с", "токенов/с", "МБ/с")
+    for title, source in [
+        ("обычный", generate_program_of_size(size)),
+        ("выражения", generate_expression_heavy_of_size(size)),
+    ]:
+        tokens = Scanner(source).scan_tokens()
+        elapsed = best_time(lambda: Parser(tokens).parse(), repeat)
+        print_row(title, f"{elapsed:.3f}", f"{len(tokens) / elapsed:,.0f}", f"{len(source) / 1e6 / elapsed:.2f}")
+
+
+def bench_sources(source: str, repeat: int) -> None:
+    # Один и тот же разбор по списку токенов, TokenBuffer и TokenStreamReader:
+    # тип текущего токена берётся без создания Token
+    tokens = Scanner(source).scan_tokens()
+    print(f"Размер исходника: {len(source) / 1e6:.2f} МБ, токенов: {len(tokens):,}")
+    print_row("токены", "время, с", "токенов/с")
+    for title, token_source in [
+        ("список", tokens),
+        ("TokenBuffer", Scanner(source).scan_buffer()),
+        ("TokenStream", TokenStreamReader(dump_tokens(tokens, []))),
+    ]:
+        elapsed = best_time(lambda: Parser(token_source).parse(), repeat)
+        print_row(title, f"{elapsed:.3f}", f"{len(tokens) / elapsed:,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк парсера")
+    parser.add_argument("suite", nargs="?", choices=["speed", "expressions", "sources"], default="speed",
+                        help="speed - токенов в секунду, "
+                             "expressions - программа из длинных выражений, "
+                             "sources - список токенов, TokenBuffer и TokenStreamReader")
+    parser.add_argument("--size", type=int, default=1_000_000, help="Размер исходника в байтах")
+    parser.add_argument("--repeat", type=int, default=3, help="Число повторов")
+    args = parser.parse_args()
+
+    if args.suite == "expressions":
+        bench_expressions(args.size, args.repeat)
+    elif args.suite == "sources":
+        bench_sources(generate_program_of_size(args.size), args.repeat)
+    else:
+        bench_speed(generate_program_of_size(args.size), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# benchmarks/bench_preprocessor.py
+#
+# Запуск: python benchmarks/bench_preprocessor.py [macros|chains|stream|fused|include|conditions|variants] [--size БАЙТ] [--repeat N]
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from common import (best_time, generate_comment_heavy_of_size, generate_macro_header, generate_macro_user_of_size,
+                    generate_program_of_size, print_row)
+
+from src.lexer.scanner import Scanner
+from src.lexer.source import ChunkedReader
+from src.parser.parser import Parser
+from src.preprocessor.fused import FusedScanner
+from src.preprocessor.expression import ExpressionEvaluator, compile_tokens, run_program, tokenize
+from src.preprocessor.include import HeaderCache
+from src.preprocessor.macros import MacroProcessor
+from src.preprocessor.preprocessor import PreprocessedReader, Preprocessor, read_chunks, split_lines
+
+
+def bench_macros(size: int, repeat: int) -> None:
+    # Раскрытие за один проход по строке против подстановки по очереди
+    # (re.sub на каждый макрос) при росте числа макросов. Подстановка по
+    # очереди на тысячах макросов идёт минутами, поэтому она меряется на
+    # начале программы; сравниваются строки в секунду
+    print_row("макросов", "по очереди", "один проход", "ускорение")
+    for count in [10, 100, 1_000, 10_000]:
+        header = generate_macro_header(count)
+        lines = generate_macro_user_of_size(size, count).splitlines(keepends=True)
+        sample = lines[:max(20, 20_000 // count)]
+
+        def run(program, sequential):
+            pp = Preprocessor(header + "".join(program))
+            if sequential:
+                pp._expand_macros = pp._expand_sequential
+            return pp.process()
+
+        assert run(sample, True) == run(sample, False)
+        slow = len(sample) / best_time(lambda: run(sample, True), repeat)
+        fast = len(lines) / best_time(lambda: run(lines, False), repeat)
+        print_row(count, f"{slow:,.0f}", f"{fast:,.0f}", f"{fast / slow:.1f}x")
+
+
+class _Uncached(dict):
+    # Кэш раскрытий, который ничего не хранит
+
+    def __setitem__(self, key, value):
+        pass
+
+
+def bench_chains(size: int, repeat: int) -> None:
+    # MacroProcessor: готовые раскрытия против раскрытия значения при
+    # каждом использовании. Цепочка: C0 -> C1 -> ... -> Cn. Ромб: верхний
+    # макрос ссылается на width макросов, каждый из которых ссылается на
+    # одну и ту же цепочку
+    def chain(depth):
+        return "".join(f"#define C{n} C{n + 1} + {n}\n" for n in range(depth)) + f"#define C{depth} 0\n"
+
+    def diamond(width, depth):
+        sides = "".join(f"#define SIDE{n} (C0)\n" for n in range(width))
+        top = " * ".join(f"SIDE{n}" for n in range(width))
+        return chain(depth) + sides + f"#define TOP {top}\n"
+
+    print_row("макросы", "без кэша, с", "с кэшем, с", "ускорение")
+    for title, header, use in [
+        ("цепочка 10", chain(10), "C0"),
+        ("цепочка 100", chain(100), "C0"),
+        ("ромб 10x10", diamond(10, 10), "TOP"),
+        ("ромб 20x50", diamond(20, 50), "TOP"),
+    ]:
+        line = f"x = {use} + y;\n"
+        source = header + line * max(1, size // 20 // len(line))
+
+        def run(cached):
+            macros = MacroProcessor()
+            if not cached:
+                macros._expansions = _Uncached()
+                macros._cyclic = _Uncached()
+            return macros.process_directives(source)
+
+        assert run(True) == run(False)
+        slow = best_time(lambda: run(False), repeat)
+        fast = best_time(lambda: run(True), repeat)
+        print_row(title, f"{slow:.3f}", f"{fast:.3f}", f"{slow / fast:.1f}x")
+
+
+def bench_stream(size: int) -> None:
+    # Пиковая память цепочки файл -> препроцессор -> сканер (как в full):
+    # текст результата целиком против построчной передачи
+    def whole(path):
+        with open(path, encoding="utf-8") as file:
+            source = file.read()
+        for _ in Scanner(Preprocessor(source).process()).iter_tokens():
+            pass
+
+    def streamed(path):
+        pp = Preprocessor()
+        with ChunkedReader(path) as reader:
+            lines = pp.process_lines(split_lines(read_chunks(reader)))
+            for _ in Scanner(PreprocessedReader(lines)).iter_tokens():
+                pass
+
+    def peak(run, path):
+        gc.collect()
+        tracemalloc.start()
+        run(path)
+        used = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return used
+
+    print_row("размер, МБ", "целиком, МБ", "потоком, МБ")
+    for scale in [1, 2, 4]:
+        source = "#define LIMIT 10\n" + generate_comment_heavy_of_size(size * scale)
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".src", delete=False) as file:
+            file.write(source)
+        try:
+            print_row(f"{len(source) / 1e6:.1f}", f"{peak(whole, file.name) / 1e6:.1f}",
+                      f"{peak(streamed, file.name) / 1e6:.1f}")
+        finally:
+            os.unlink(file.name)
+
+
+def bench_fused(size: int, repeat: int) -> None:
+    # Команды full и parse --preprocess: препроцессор, передающий текст
+    # сканеру, против совмещённого сканера на исходниках с комментариями
+    def staged(path, parse):
+        pp = Preprocessor()
+        with ChunkedReader(path) as reader:
+            scanner = Scanner(PreprocessedReader(pp.process_lines(split_lines(read_chunks(reader)))))
+            return finish(scanner, parse)
+
+    def fused(path, parse):
+        with ChunkedReader(path) as reader:
+            return finish(FusedScanner(reader), parse)
+
+    def finish(scanner, parse):
+        if parse:
+            Parser(scanner.scan_tokens()).parse()
+            return len(scanner.tokens)
+        return sum(1 for _ in scanner.iter_tokens())
+
+    print_row("вход", "команда", "раздельно, с", "совмещённо, с", "ускорение")
+    for title, source in [
+        ("комментарии", "#define LIMIT 10\n" + generate_comment_heavy_of_size(size)),
+        ("макросы", generate_macro_header(100) + generate_macro_user_of_size(size, 100)),
+    ]:
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".src", delete=False) as file:
+            file.write(source)
+        try:
+            for command, parse in [("full", False), ("parse", True)]:
+                assert staged(file.name, parse) == fused(file.name, parse)
+                slow = best_time(lambda: staged(file.name, parse), repeat)
+                fast = best_time(lambda: fused(file.name, parse), repeat)
+                print_row(title, command, f"{slow:.3f}", f"{fast:.3f}", f"{slow / fast:.1f}x")
+        finally:
+            os.unlink(file.name)
+
+
+def bench_include(size: int, repeat: int) -> None:
+    # Сборка из units единиц трансляции, каждая включает общие заголовки:
+    # свой кэш заголовков у каждого препроцессора против общего на сборку
+    def run(directory, units, shared):
+        cache = HeaderCache()
+        for n in range(units):
+            path = os.path.join(directory, f"unit{n}.src")
+            pp = Preprocessor(path=path, header_cache=cache if shared else None)
+            with ChunkedReader(path) as reader:
+                for _ in pp.process_lines(split_lines(read_chunks(reader))):
+                    pass
+        return cache
+
+    header = "#ifndef TYPES_H\n#define TYPES_H\n" + generate_comment_heavy_of_size(size) + "#endif\n"
+    print_row("единиц", "без общего, с", "общий кэш, с", "ускорение", "обработок")
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "types.h"), "w", encoding="utf-8") as file:
+            file.write(header)
+        with open(os.path.join(directory, "limits.h"), "w", encoding="utf-8") as file:
+            file.write('#pragma once\n#include "types.h"\n' + generate_macro_header(100))
+        for units in [10, 50, 200]:
+            for n in range(units):
+                with open(os.path.join(directory, f"unit{n}.src"), "w", encoding="utf-8") as file:
+                    file.write(f'#include "limits.h"\n#include "types.h"\nint unit_{n} = LIMIT_99;\n')
+            slow = best_time(lambda: run(directory, units, False), repeat)
+            fast = best_time(lambda: run(directory, units, True), repeat)
+            print_row(units, f"{slow:.3f}", f"{fast:.3f}", f"{slow / fast:.1f}x",
+                      run(directory, units, True).misses)
+
+
+def bench_conditions(size: int, repeat: int) -> None:
+    # Один исходник на все варианты сборки: блоки #if/#elif/#else по
+    # макросам варианта. Вычислитель с кэшами против разбора каждого
+    # условия заново; строки невыбранных веток не обрабатываются
+    class Uncached(ExpressionEvaluator):
+        def evaluate(self, text, macros):
+            return run_program(compile_tokens(self._expand(tokenize(text), macros)))
+
+    body = "".join(f"int value_{n} = LEVEL * {n};\n" for n in range(5))
+    block = (f"#if defined(FAST) && LEVEL >= 2\n{body}#elif LEVEL == 1 || (MODE & 4) != 0\n{body}"
+             f"#elif !defined(FAST) && MODE % 3 == 1\n{body}#else\n{body}#endif\n")
+    source = block * max(1, size // len(block))
+    variants = [{"LEVEL": "0", "MODE": "0"}, {"LEVEL": "1", "MODE": "4"},
+                {"LEVEL": "2", "MODE": "1", "FAST": "1"}, {"LEVEL": "3", "MODE": "7"}]
+
+    def run(macros, cached):
+        pp = Preprocessor(source)
+        if not cached:
+            pp.evaluator = Uncached()
+        for name, value in macros.items():
+            pp.define(name, value)
+        return pp.process()
+
+    print_row("вариант", "без кэша, с", "с кэшем, с", "ускорение", "строк на выходе")
+    for macros in variants:
+        title = " ".join(f"{name}={value}" for name, value in macros.items())
+        output = run(macros, True)
+        assert output == run(macros, False)
+        slow = best_time(lambda: run(macros, False), repeat)
+        fast = best_time(lambda: run(macros, True), repeat)
+        print_row(title, f"{slow:.3f}", f"{fast:.3f}", f"{slow / fast:.1f}x", output.count("\n"))
+
+
+def bench_variants(size: int, repeat: int) -> None:
+    # 20 вариантов сборки одного исходника: отдельный препроцессор на каждый
+    # вариант (как 20 запусков preprocess) против process_variants, в одном
+    # процессе и в пуле; затем то же через командную строку
+    features = 5
+    chunk = generate_program_of_size(max(1, size // (features * 3)))
+    source = "".join(
+        f"#if defined(F{n}) && LEVEL >= 2\n{chunk}#elif defined(F{n})\n{chunk}#else\n{chunk}#endif\n"
+        for n in range(features))
+    variants = [{f"F{n}": "1" for n in range(features) if mask >> n & 1} | {"LEVEL": str(mask % 3)}
+                for mask in range(20)]
+
+    def separate(path):
+        with open(path, encoding="utf-8") as file:
+            text = file.read()
+        outputs = []
+        for macros in variants:
+            pp = Preprocessor(text, path=path)
+            for name, value in macros.items():
+                pp.define(name, value)
+            outputs.append(pp.process())
+        return outputs
+
+    def batch(path, workers):
+        with open(path, encoding="utf-8") as file:
+            pp = Preprocessor(file.read(), path=path)
+        return [result.output for result in pp.process_variants(variants, workers)]
+
+    def cli(path, directory, batched):
+        def run(*arguments):
+            subprocess.run([sys.executable, "-m", "src.cli", "preprocess", "--input", path, *arguments],
+                           check=True, capture_output=True, cwd=Path(__file__).parent.parent)
+        specs = [",".join(f"{name}={value}" for name, value in macros.items()) for macros in variants]
+        if batched:
+            run(*[argument for spec in specs for argument in ("--variant", spec)], "--output-dir", directory)
+            return
+        for number, macros in enumerate(variants, 1):
+            defines = [argument for name, value in macros.items() for argument in ("-D", f"{name}={value}")]
+            run(*defines, "--output", os.path.join(directory, f"variant{number}.src"))
+
+    print_row("способ", "время, с", "ускорение")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "variants.src")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(source)
+        assert separate(path) == batch(path, None) == batch(path, 4)
+
+        slow = best_time(lambda: separate(path), repeat)
+        print_row("20 препроцессоров", f"{slow:.3f}", "1.0x")
+        for title, workers in [("process_variants", None), ("process_variants, 4 процесса", 4)]:
+            fast = best_time(lambda: batch(path, workers), repeat)
+            print_row(title, f"{fast:.3f}", f"{slow / fast:.1f}x")
+
+        slow = best_time(lambda: cli(path, directory, False), 1)
+        fast = best_time(lambda: cli(path, directory, True), 1)
+        print_row("20 запусков preprocess", f"{slow:.3f}", "1.0x")
+        print_row("preprocess --variant x20", f"{fast:.3f}", f"{slow / fast:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк препроцессора")
+    parser.add_argument("suite", nargs="?", default="macros",
+                        choices=["macros", "chains", "stream", "fused", "include", "conditions", "variants"],
+                        help="macros - раскрытие при росте числа макросов, "
+                             "chains - цепочки и ромбы макросов в MacroProcessor, "
+                             "stream - пиковая память построчной обработки, "
+                             "fused - препроцессор внутри сканера против отдельного прохода, "
+                             "include - общий кэш заголовков на сборку, "
+                             "conditions - вычисление условий #if с кэшем, "
+                             "variants - 20 вариантов сборки за один разбор исходника")
+    parser.add_argument("--size", type=int, default=200_000, help="Размер исходника в байтах")
+    parser.add_argument("--repeat", type=int, default=3, help="Число повторов")
+    args = parser.parse_args()
+
+    if args.suite == "chains":
+        bench_chains(args.size, args.repeat)
+    elif args.suite == "stream":
+        bench_stream(args.size)
+    elif args.suite == "fused":
+        bench_fused(args.size, args.repeat)
+    elif args.suite == "include":
+        bench_include(args.size, args.repeat)
+    elif args.suite == "conditions":
+        bench_conditions(args.size, args.repeat)
+    elif args.suite == "variants":
+        bench_variants(args.size, args.repeat)
+    else:
+        bench_macros(args.size, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
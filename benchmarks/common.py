@@ -0,0 +1,128 @@
+# benchmarks/common.py
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+# Добавляем корневую папку проекта в путь Python
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+FUNCTION_TEMPLATE = """// Функция номер {n}
+fn compute_{n}(int a, int b) -> int {{
+    /* многострочный
+       комментарий */
+    int result_{n} = a * {n} + b - 17;
+    float ratio = 3.14 * a;
+    string name = "function {n}";
+    while (result_{n} > 0 && a != b) {{
+        result_{n} -= 1;
+        if (result_{n} % 2 == 0) {{
+            a = a + 1;
+        }} else {{
+            b = b - 1;
+        }}
+    }}
+    return result_{n};
+}}
+
+"""
+
+
+def generate_program(functions: int) -> str:
+    return "".join(FUNCTION_TEMPLATE.format(n=n) for n in range(functions))
+
+
+def generate_program_of_size(size_bytes: int) -> str:
+    chunk = generate_program(100)
+    return chunk * max(1, size_bytes // len(chunk))
+
+
+IDENTIFIER_TEMPLATE = """fn update_{n}(int index, int count) -> int {{
+    int total = index + count;
+    total = total * index - count / index + total;
+    if (total > count && index < count) {{
+        total = total + index + count + total;
+    }}
+    return total + index + count;
+}}
+
+"""
+
+
+def generate_identifier_heavy_of_size(size_bytes: int) -> str:
+    chunk = "".join(IDENTIFIER_TEMPLATE.format(n=n) for n in range(100))
+    return chunk * max(1, size_bytes // len(chunk))
+
+
+COMMENT_TEMPLATE = """/*
+ * Блок {n}: длинный многострочный комментарий, который лексер
+ * пропускает целиком. Lorem ipsum dolor sit amet, consectetur
+ * adipiscing elit, sed do eiusmod tempor incididunt ut labore.
+ */
+int value_{n} = {n}; // пояснение к значению {n}, тоже без токенов
+
+"""
+
+
+def generate_comment_heavy_of_size(size_bytes: int) -> str:
+    chunk = "".join(COMMENT_TEMPLATE.format(n=n) for n in range(100))
+    return chunk * max(1, size_bytes // len(chunk))
+
+
+STRING_TEMPLATE = """string text_{n} = "Строка номер {n}: длинный литерал без escape-последовательностей, Lorem ipsum dolor sit amet";
+string path_{n} = "C:\\dir\\file_{n}.txt\tи табуляция\n";
+
+"""
+
+
+def generate_string_heavy_of_size(size_bytes: int) -> str:
+    chunk = "".join(STRING_TEMPLATE.format(n=n) for n in range(100))
+    return chunk * max(1, size_bytes // len(chunk))
+
+
+EXPRESSION_TEMPLATE = """fn eval_{n}(int a, int b, int c) -> int {{
+    int x = (a + b * {n} - c / 3) % 7 + -a * (b - c);
+    x = x * 2 + a * b - c * a + (x - 1) * (b + {n});
+    bool ok = a + 1 < b * 2 && b - c >= a || !(x % 2 == 0) && c != {n};
+    x += compute(a, b + 1, c * 2) - point.x * point.y + x++;
+    return (x + a) * (b - c) / (a * a + b * b + 1) - x;
+}}
+
+"""
+
+
+def generate_expression_heavy_of_size(size_bytes: int) -> str:
+    chunk = "".join(EXPRESSION_TEMPLATE.format(n=n) for n in range(100))
+    return chunk * max(1, size_bytes // len(chunk))
+
+
+def generate_macro_header(count: int) -> str:
+    # Сгенерированный заголовок: константы и макросы, ссылающиеся на соседей
+    lines = []
+    for n in range(count):
+        value = f"LIMIT_{n - 1} + {n}" if n % 10 else str(n)
+        lines.append(f"#define LIMIT_{n} {value}\n")
+    return "".join(lines)
+
+
+def generate_macro_user_of_size(size_bytes: int, count: int) -> str:
+    # Программа того же размера, использующая макросы из заголовка
+    body = "".join(
+        f"    total = total + LIMIT_{n * 7919 % count} * index;\n" for n in range(200)
+    )
+    chunk = f"fn use(int index) -> int {{\n    int total = 0;\n{body}    return total;\n}}\n\n"
+    return chunk * max(1, size_bytes // len(chunk))
+
+
+def best_time(func: Callable[[], object], repeat: int = 3) -> float:
+    timings: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def print_row(*columns) -> None:
+    print("  ".join(f"{c:<14}" for c in columns))
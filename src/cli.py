@@ -3,11 +3,15 @@ import argparse
 import sys
 import subprocess
 from pathlib import Path
-from typing import List, Optional
-
-from src.lexer.scanner import Scanner
-from src.lexer.token import TokenType
-from src.preprocessor.preprocessor import Preprocessor
+from contextlib import nullcontext
+from typing import Dict, List, Optional
+
+from src.lexer.cache import TokenCache
+from src.lexer.regex_scanner import ENGINES, create_scanner
+from src.lexer.serialize import SerializationError, TokenStreamReader, dump_tokens
+from src.lexer.source import READERS, open_reader
+from src.preprocessor.fused import FusedScanner
+from src.preprocessor.preprocessor import PreprocessedReader, Preprocessor, read_chunks, split_lines
 from src.parser.parser import Parser
 from src.parser.visitor import ASTPrettyPrinter, ASTSemanticAnalyzer
 from src.parser.ast import ast_to_json, generate_dot
@@ -27,34 +31,126 @@ def read_file(path: str) -> str:
         sys.exit(1)
 
 
+def open_input(path: str, mode: str):
+    # Исходник целиком в памяти или читатель фрагментами для больших файлов
+    if mode == "memory":
+        return nullcontext(read_file(path))
+    try:
+        return open_reader(path, mode)
+    except FileNotFoundError:
+        print(f"Ошибка: файл не найден: {path}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"Ошибка при чтении файла {path}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def open_cache(args) -> Optional[TokenCache]:
+    if not args.cache_dir:
+        return None
+    if getattr(args, "reader", "memory") != "memory":
+        print("Ошибка: --cache-dir работает только с --reader memory", file=sys.stderr)
+        sys.exit(1)
+    return TokenCache(args.cache_dir)
+
+
+def print_cache_stats(cache: Optional[TokenCache]) -> None:
+    if cache is not None:
+        print(cache.stats(), file=sys.stderr)
+
+
 def print_errors(errors, title="Ошибки:") -> bool:
+    # Диагностики (src/lexer/diagnostic.py) форматируются только здесь
     if errors:
         print(f"\n{title}", file=sys.stderr)
         for error in errors:
-            if isinstance(error, tuple) and len(error) == 3:
-                line, col, msg = error
-                print(f"[Строка {line}, Колонка {col}] {msg}", file=sys.stderr)
-            elif hasattr(error, 'line') and hasattr(error, 'column') and hasattr(error, 'message'):
-                # Для объектов ошибок из парсера
-                print(f"[Строка {error.line}, Колонка {error.column}] {error.message}", file=sys.stderr)
-            else:
-                print(error, file=sys.stderr)
+            print(error, file=sys.stderr)
+        dropped = getattr(errors, "dropped", 0)
+        if dropped:
+            print(f"... и ещё ошибок: {dropped}", file=sys.stderr)
         return True
     return False
 
 
-def run_preprocess(args):
-    source = read_file(args.input)
+def write_tokens(tokens, out, end="\n"):
+    # Токены пишутся по мере сканирования, список строк не строится
+    separator = ""
+    for token in tokens:
+        out.write(separator)
+        out.write(str(token))
+        separator = "\n"
+    out.write(end)
+
+
+def preprocess_lines(pp: Preprocessor, reader):
+    # Файл читается фрагментами, результат отдаётся по строкам
+    return pp.process_lines(split_lines(read_chunks(reader)))
+
+
+def parse_defines(definitions) -> Dict[str, str]:
+    # ИМЯ[=ЗНАЧЕНИЕ] -> макросы; без значения — 1, как у #define ИМЯ
+    macros = {}
+    for definition in definitions:
+        name, separator, value = definition.partition("=")
+        macros[name] = value if separator else "1"
+    return macros
+
+
+def create_preprocessor(args, error_limit: Optional[int] = None, source: str = "") -> Preprocessor:
+    # #include ищется рядом с входным файлом, затем в каталогах -I;
+    # -D ИМЯ[=ЗНАЧЕНИЕ] — как #define в начале файла
+    pp = Preprocessor(source, error_limit=error_limit, path=args.input, include_dirs=args.include_dir or ())
+    for name, value in parse_defines(args.define or ()).items():
+        pp.define(name, value)
+    return pp
+
+
+def run_preprocess_variants(args):
+    # Один исходник под каждым --variant (макросы через запятую поверх -D);
+    # директивы и условия разбираются один раз на все варианты
+    variants = [parse_defines(filter(None, spec.split(","))) for spec in args.variant]
+    pp = create_preprocessor(args, source=read_file(args.input))
+    results = pp.process_variants(variants, args.jobs)
+
+    failed = False
+    input_path = Path(args.input)
+    if args.output_dir:
+        Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+    for number, (spec, result) in enumerate(zip(args.variant, results), 1):
+        title = f"вариант {number}: {spec or '(без макросов)'}"
+        if args.show:
+            print(f"// {title}")
+            sys.stdout.write(result.output)
+            print()
+        if args.output_dir:
+            path = Path(args.output_dir) / f"{input_path.stem}.{number}{input_path.suffix}"
+            path.write_text(result.output, encoding="utf-8")
+            print(f"Результат ({title}) сохранен в {path}")
+        failed = print_errors(result.errors, f"Ошибки препроцессора ({title}):") or failed
+
+    if failed:
+        sys.exit(1)
+
 
-    pp = Preprocessor(source)
-    result = pp.process()
+def run_preprocess(args):
+    if args.variant:
+        run_preprocess_variants(args)
+        return
+    pp = create_preprocessor(args)
+    with open_input(args.input, "chunked") as reader:
+        out = open(args.output, "w", encoding="utf-8") if args.output else nullcontext()
+        with out:
+            for line in preprocess_lines(pp, reader):
+                if args.show:
+                    sys.stdout.write(line)
+                if args.output:
+                    out.write(line)
     errors = pp.errors
 
     if args.show:
-        print(result)
+        print()
 
     if args.output:
-        Path(args.output).write_text(result, encoding="utf-8")
         print(f"Результат сохранен в {args.output}")
 
     if print_errors(errors, "Ошибки препроцессора:"):
@@ -62,26 +158,36 @@ def run_preprocess(args):
 
 
 def run_lex(args):
-    source = read_file(args.input)
-
-    scanner = Scanner(source)
-
-    tokens = []
-    while True:
-        token = scanner.next_token()
-        tokens.append(str(token))
-        if token.token_type == TokenType.EOF:
-            break
-
-    errors = scanner.get_errors()
-
-    if not args.quiet:
-        output = "\n".join(tokens)
-        if args.output:
-            Path(args.output).write_text(output, encoding="utf-8")
+    cache = open_cache(args)
+    with open_input(args.input, args.reader) as source:
+        # С --fail-fast сканирование останавливается на первой ошибке
+        max_errors = 1 if args.fail_fast else args.max_errors
+        scanner = create_scanner(source, args.engine, args.error_limit, max_errors)
+        tokens = cache.scan(scanner) if cache else scanner.iter_tokens()
+
+        if args.quiet:
+            for _ in tokens:
+                pass
+        elif args.format == "binary":
+            # Список ошибок сканера дополняется по ходу, dump_tokens читает
+            # его после всех токенов
+            data = dump_tokens(tokens, scanner.errors)
+            if args.output:
+                Path(args.output).write_bytes(data)
+                print(f"Токены сохранены в {args.output}")
+            else:
+                sys.stdout.flush()
+                sys.stdout.buffer.write(data)
+                sys.stdout.buffer.flush()
+        elif args.output:
+            with open(args.output, "w", encoding="utf-8") as out:
+                write_tokens(tokens, out, end="")
             print(f"Токены сохранены в {args.output}")
         else:
-            print(output)
+            write_tokens(tokens, sys.stdout)
+
+    errors = scanner.errors
+    print_cache_stats(cache)
 
     if args.fail_fast and errors:
         print_errors(errors, "Ошибки лексического анализа:")
@@ -91,42 +197,97 @@ def run_lex(args):
         print_errors(errors, "Ошибки лексического анализа:")
 
 
+def read_token_stream(path: str) -> TokenStreamReader:
+    try:
+        return TokenStreamReader(Path(path).read_bytes())
+    except FileNotFoundError:
+        print(f"Ошибка: файл не найден: {path}", file=sys.stderr)
+        sys.exit(1)
+    except (OSError, SerializationError) as e:
+        print(f"Ошибка при чтении файла {path}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def remap_errors(errors, source_map, scanner):
+    # Позиции в результате препроцессора -> позиции в исходном файле
+    if source_map is None:
+        return errors
+    return source_map.remap(errors, scanner.line_index)
+
+
+def check_fused(args) -> None:
+    if args.fused and args.engine != "classic":
+        print("Ошибка: --fused работает только с --engine classic", file=sys.stderr)
+        sys.exit(1)
+
+
 def run_parse(args):
-    source = read_file(args.input)
+    source_map = None
+    scanner = None
+    check_fused(args)
+    if args.fused and not args.preprocess:
+        print("Ошибка: --fused работает только с --preprocess", file=sys.stderr)
+        sys.exit(1)
+    if args.cache_dir and (args.preprocess or args.tokens):
+        print("Ошибка: --cache-dir не работает с --preprocess и --tokens", file=sys.stderr)
+        sys.exit(1)
 
-    # Препроцессинг если нужно
-    if args.preprocess:
-        pp = Preprocessor(source)
-        source = pp.process()
+    if args.tokens:
+        # Вход — двоичный поток токенов от lex --format binary
+        tokens = read_token_stream(args.input)
+        lex_errors = tokens.errors
+    elif args.preprocess:
+        # Результат препроцессора идёт в сканер по строкам, не собираясь в
+        # одну строку. Кэша здесь нет (--cache-dir отклоняется выше): для
+        # перевода позиций нужен индекс строк, который строит сканер, а из
+        # кэша ошибки приходят готовыми строками. С --fused директивы и
+        # макросы разбирает сам сканер, позиции токенов уже исходные
+        pp = create_preprocessor(args, args.error_limit)
+        with open_input(args.input, "chunked") as reader:
+            if args.fused:
+                scanner = FusedScanner(reader, pp, args.error_limit)
+            else:
+                scanner = create_scanner(PreprocessedReader(preprocess_lines(pp, reader)),
+                                         args.engine, args.error_limit)
+            tokens = scanner.scan_tokens()
+        source_map = scanner.expansion_sites if args.fused else pp.source_map
         if pp.errors:
             print_errors(pp.errors, "Ошибки препроцессора:")
             if args.fail_fast:
                 sys.exit(1)
+        lex_errors = scanner.errors if args.fused else remap_errors(scanner.errors, source_map, scanner)
+    else:
+        source = read_file(args.input)
 
-    # Лексический анализ
-    scanner = Scanner(source)
-    tokens = scanner.scan_tokens()
+        # Лексический анализ
+        cache = open_cache(args)
+        scanner = create_scanner(source, args.engine, args.error_limit)
+        tokens = cache.scan(scanner) if cache else scanner.scan_tokens()
+        print_cache_stats(cache)
+        lex_errors = scanner.errors
 
-    if scanner.get_errors():
-        print_errors(scanner.get_errors(), "Ошибки лексического анализа:")
+    if lex_errors:
+        print_errors(lex_errors, "Ошибки лексического анализа:")
         if args.fail_fast:
             sys.exit(1)
 
     # Синтаксический анализ
-    parser = Parser(tokens)
+    parser = Parser(tokens, args.error_limit)
     ast = parser.parse()
 
-    if parser.errors:
-        print_errors(parser.errors, "Ошибки синтаксического анализа:")
+    parse_errors = remap_errors(parser.errors, source_map, scanner)
+    if parse_errors:
+        print_errors(parse_errors, "Ошибки синтаксического анализа:")
         if args.fail_fast:
             sys.exit(1)
 
     # Семантический анализ (опционально)
     if args.semantic:
-        analyzer = ASTSemanticAnalyzer()
+        analyzer = ASTSemanticAnalyzer(args.error_limit)
         analyzer.visit(ast)
-        if analyzer.errors:
-            print_errors(analyzer.errors, "Ошибки семантического анализа:")
+        semantic_errors = remap_errors(analyzer.errors, source_map, scanner)
+        if semantic_errors:
+            print_errors(semantic_errors, "Ошибки семантического анализа:")
             if args.fail_fast:
                 sys.exit(1)
 
@@ -168,39 +329,47 @@ def run_parse(args):
 
 
 def run_full(args):
-    source = read_file(args.input)
-
-    pp = Preprocessor(source)
-    processed = pp.process()
-
-    pp_errors = pp.errors
+    # Файл -> препроцессор -> сканер -> вывод токенов одним потоком.
+    # Ошибки препроцессора известны только после прохода, поэтому
+    # выводятся после токенов
+    check_fused(args)
+    pp = create_preprocessor(args)
+    with open_input(args.input, "chunked") as reader:
+        if args.fused:
+            scanner = FusedScanner(reader, pp)
+        else:
+            scanner = create_scanner(PreprocessedReader(preprocess_lines(pp, reader)), args.engine)
+        write_tokens(scanner.iter_tokens(), sys.stdout)
 
-    if pp_errors:
-        print_errors(pp_errors, "Ошибки препроцессора:")
+    if print_errors(pp.errors, "Ошибки препроцессора:"):
         sys.exit(1)
 
-    scanner = Scanner(processed)
-    tokens = []
-
-    while True:
-        token = scanner.next_token()
-        tokens.append(str(token))
-        if token.token_type == TokenType.EOF:
-            break
+    # Позиции ошибок совмещённого сканера уже исходные
+    errors = scanner.errors if args.fused else remap_errors(scanner.errors, pp.source_map, scanner)
 
-    errors = scanner.get_errors()
-
-    print("\n".join(tokens))
     if print_errors(errors, "Ошибки лексического анализа:"):
         sys.exit(1)
 
 
 def run_check(args):
-    source = read_file(args.input)
+    cache = open_cache(args)
+    with open_input(args.input, args.reader) as source:
+        # В режиме --count-only сообщения не сохраняются, только считаются.
+        # Токены не нужны: без кэша сканер только проверяет вход
+        error_limit = 0 if args.count_only else args.error_limit
+        max_errors = 1 if args.fail_fast else args.max_errors
+        scanner = create_scanner(source, args.engine, error_limit, max_errors)
+        if cache:
+            cache.scan(scanner)
+        else:
+            scanner.validate()
+    errors = scanner.errors
+    print_cache_stats(cache)
 
-    scanner = Scanner(source)
-    scanner.scan_tokens()
-    errors = scanner.get_errors()
+    if args.count_only and errors:
+        count = f"не менее {errors.count}" if scanner.truncated else errors.count
+        print(f"Проверка не пройдена. Обнаружено ошибок: {count}", file=sys.stderr)
+        sys.exit(1)
 
     if errors:
         print("Проверка не пройдена. Обнаружены ошибки:", file=sys.stderr)
@@ -242,6 +411,17 @@ def main():
     pp_parser.add_argument("--input", required=True, help="Входной файл с исходным кодом")
     pp_parser.add_argument("--output", help="Выходной файл (по умолчанию: stdout)")
     pp_parser.add_argument("--show", action="store_true", help="Показать обработанный код")
+    pp_parser.add_argument("-I", "--include-dir", action="append",
+                           help="Каталог поиска файлов #include (можно несколько)")
+    pp_parser.add_argument("-D", "--define", action="append",
+                           help="Определить макрос: ИМЯ или ИМЯ=ЗНАЧЕНИЕ (можно несколько)")
+    pp_parser.add_argument("--variant", action="append",
+                           help="Вариант сборки: макросы ИМЯ[=ЗНАЧЕНИЕ] через запятую поверх -D; "
+                                "с несколькими --variant исходник разбирается один раз на все")
+    pp_parser.add_argument("--jobs", type=int,
+                           help="С --variant: обрабатывать варианты в N процессах")
+    pp_parser.add_argument("--output-dir",
+                           help="С --variant: каталог для результатов ИМЯ.N.РАСШИРЕНИЕ")
     pp_parser.set_defaults(func=run_preprocess)
 
     # Команда lex
@@ -254,6 +434,17 @@ def main():
     lex_parser.add_argument("--quiet", action="store_true", help="Подавить обычный вывод")
     lex_parser.add_argument("--fail-fast", action="store_true",
                             help="Завершиться при первой ошибке")
+    lex_parser.add_argument("--engine", choices=sorted(ENGINES), default="classic",
+                            help="Движок лексера: classic (по умолчанию) или regex")
+    lex_parser.add_argument("--reader", choices=["memory"] + sorted(READERS), default="memory",
+                            help="Чтение входа: memory (целиком, по умолчанию), chunked или mmap")
+    lex_parser.add_argument("--format", choices=["text", "binary"], default="text",
+                            help="Формат токенов: text (по умолчанию) или binary (см. src/lexer/serialize.py)")
+    lex_parser.add_argument("--cache-dir", help="Каталог кэша токенов (повторно не сканировать неизменённые файлы)")
+    lex_parser.add_argument("--error-limit", type=int,
+                            help="Выводить не больше N ошибок (остальные только считаются)")
+    lex_parser.add_argument("--max-errors", type=int,
+                            help="Остановить сканирование после N ошибок")
     lex_parser.set_defaults(func=run_lex)
 
     # Команда parse (НОВАЯ)
@@ -268,10 +459,23 @@ def main():
     parse_parser.add_argument("--png", help="Сгенерировать PNG из DOT (требуется Graphviz)")
     parse_parser.add_argument("--preprocess", action="store_true",
                               help="Запустить препроцессор перед анализом")
+    parse_parser.add_argument("-I", "--include-dir", action="append",
+                              help="С --preprocess: каталог поиска файлов #include (можно несколько)")
+    parse_parser.add_argument("-D", "--define", action="append",
+                              help="С --preprocess: определить макрос ИМЯ или ИМЯ=ЗНАЧЕНИЕ (можно несколько)")
+    parse_parser.add_argument("--fused", action="store_true",
+                              help="С --preprocess: директивы и макросы разбирает сам лексер, без промежуточного текста")
     parse_parser.add_argument("--semantic", action="store_true",
                               help="Выполнить семантический анализ")
     parse_parser.add_argument("--fail-fast", action="store_true",
                               help="Завершиться при первой ошибке")
+    parse_parser.add_argument("--engine", choices=sorted(ENGINES), default="classic",
+                              help="Движок лексера: classic (по умолчанию) или regex")
+    parse_parser.add_argument("--tokens", action="store_true",
+                              help="Вход - двоичный поток токенов от lex --format binary")
+    parse_parser.add_argument("--cache-dir", help="Каталог кэша токенов (повторно не сканировать неизменённые файлы)")
+    parse_parser.add_argument("--error-limit", type=int,
+                              help="Выводить не больше N ошибок на каждом этапе (остальные только считаются)")
     parse_parser.set_defaults(func=run_parse)
 
     # Команда full
@@ -280,6 +484,14 @@ def main():
         help="Запустить полный цикл: препроцессор + лексер"
     )
     full_parser.add_argument("--input", required=True, help="Входной файл с исходным кодом")
+    full_parser.add_argument("--engine", choices=sorted(ENGINES), default="classic",
+                             help="Движок лексера: classic (по умолчанию) или regex")
+    full_parser.add_argument("-I", "--include-dir", action="append",
+                             help="Каталог поиска файлов #include (можно несколько)")
+    full_parser.add_argument("-D", "--define", action="append",
+                             help="Определить макрос: ИМЯ или ИМЯ=ЗНАЧЕНИЕ (можно несколько)")
+    full_parser.add_argument("--fused", action="store_true",
+                             help="Директивы и макросы разбирает сам лексер, без промежуточного текста")
     full_parser.set_defaults(func=run_full)
 
     # Команда check
@@ -288,6 +500,19 @@ def main():
         help="Проверить исходный код на лексические ошибки"
     )
     check_parser.add_argument("--input", required=True, help="Входной файл с исходным кодом")
+    check_parser.add_argument("--engine", choices=sorted(ENGINES), default="classic",
+                              help="Движок лексера: classic (по умолчанию) или regex")
+    check_parser.add_argument("--reader", choices=["memory"] + sorted(READERS), default="memory",
+                              help="Чтение входа: memory (целиком, по умолчанию), chunked или mmap")
+    check_parser.add_argument("--cache-dir", help="Каталог кэша токенов (повторно не сканировать неизменённые файлы)")
+    check_parser.add_argument("--error-limit", type=int,
+                              help="Выводить не больше N ошибок (остальные только считаются)")
+    check_parser.add_argument("--count-only", action="store_true",
+                              help="Только подсчитать ошибки, не формируя сообщений")
+    check_parser.add_argument("--max-errors", type=int,
+                              help="Остановить проверку после N ошибок")
+    check_parser.add_argument("--fail-fast", action="store_true",
+                              help="Остановить проверку на первой ошибке")
     check_parser.set_defaults(func=run_check)
 
     # Команда spec
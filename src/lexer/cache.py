@@ -0,0 +1,113 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .scanner import LEXER_VERSION, Scanner
+from .serialize import SerializationError, dump_tokens, load_tokens
+from .token import Token
+
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+# Кэш потоков токенов на диске. Ключ — хеш версии лексера и текста
+# исходника, поэтому неизменённые файлы не сканируются повторно. При
+# превышении max_bytes удаляются давно не использованные записи (LRU по
+# времени изменения файла: при попадании оно обновляется).
+class TokenCache:
+
+    SUFFIX = '.tok'
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source: str) -> str:
+        digest = hashlib.sha256(f"{LEXER_VERSION}\0".encode())
+        digest.update(source.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / (key + self.SUFFIX)
+
+    def load(self, key: str) -> Optional[Tuple[List[Token], List[str]]]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            result = load_tokens(data)
+        except SerializationError:
+            # Испорченная запись ведёт себя как промах
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return result
+
+    def store(self, key: str, tokens: List[Token], errors: List[str]) -> None:
+        data = dump_tokens(tokens, errors)
+        # Запись через временный файл: параллельные сборки не увидят половину
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            Path(temp_path).unlink(missing_ok=True)
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        for path in self.directory.glob('*' + self.SUFFIX):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def scan(self, scanner: Scanner) -> List[Token]:
+        # Обёртка над scan_tokens: при попадании токены и ошибки берутся из кэша
+        if scanner._reader is not None:
+            raise ValueError("Кэш токенов требует исходник в памяти")
+        if scanner.max_errors is not None:
+            # Сохранённый полный список не знает, где оборвать сканирование
+            return scanner.scan_tokens()
+        key = self.key(scanner.source)
+        cached = self.load(key)
+        if cached is not None:
+            self.hits += 1
+            scanner.tokens, errors = cached
+            # Из кэша ошибки приходят готовыми строками
+            for error in errors:
+                scanner.errors.report(error)
+            return scanner.tokens
+
+        self.misses += 1
+        tokens = scanner.scan_tokens()
+        # Урезанный error_limit список ошибок и оборванные на max_errors
+        # токены в кэш не попадают
+        if not scanner.errors.dropped and not scanner.truncated:
+            self.store(key, tokens, scanner.errors)
+        return tokens
+
+    def stats(self) -> str:
+        return f"Кэш токенов: попаданий {self.hits}, промахов {self.misses}"
@@ -0,0 +1,134 @@
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+
+
+class Severity(Enum):
+    ERROR = "Ошибка"
+    WARNING = "Предупреждение"
+
+
+# Шаблоны сообщений по коду диагностики. Аргументы подставляются только
+# при выводе, поэтому тысячи ошибок на испорченном входе не форматируются
+# заранее.
+#   L — лексер, P — препроцессор, M — макропроцессор,
+#   S — синтаксический анализ, E — семантический анализ
+MESSAGES: Dict[str, str] = {
+    'L001': "Ожидался '&', получен '{0}'",
+    'L002': "Ожидался '|', получен '{0}'",
+    'L003': "Недопустимый символ: '{0}' (ASCII: {1})",
+    'L004': "Незакрытый многострочный комментарий",
+    'L005': "Незавершенная строка, начатая в {0}:{1}",
+    'L006': "Неизвестная escape-последовательность: \\{0}",
+    'L007': "Литерал с плавающей точкой вне диапазона: {0}",
+    'L008': "Недопустимый литерал с плавающей точкой: {0}",
+    'L009': "Целочисленный литерал вне 32-битного диапазона: {0} (допустимо {1}..{2})",
+    'L010': "Недопустимый целочисленный литерал: {0}",
+    'L011': "Идентификатор слишком длинный: {0}... (максимум 255 символов)",
+    'L012': "Идентификатор не может начинаться с цифры: '{0}'",
+    'L013': "Закрывающая фигурная скобка '}}' без открывающей",
+    'L014': "Незакрытый блок",
+
+    # Тексты P001 и P002 — прежние сообщения Preprocessor
+    'P001': "Unterminated block comment",
+    'P002': "Unknown preprocessor directive: {0}",
+    'P003': "Некорректная директива #include: {0}",
+    'P004': "Включаемый файл не найден: {0}",
+    'P005': "Рекурсивное включение файла: {0}",
+    'P006': "#include не поддерживается в совмещённом режиме: {0}",
+    'P007': "Некорректное условие {0}: {1}",
+    'P008': "Деление на ноль в условии {0}: {1}",
+    'P009': "{0} без #if",
+
+    'M001': "Некорректное имя макроса: {0}",
+    'M002': "Переопределение макроса: {0}",
+    'M003': "синтаксическая ошибка в {0}",
+    'M004': "неизвестная директива: {0}",
+    'M005': "обнаружена рекурсия в макросе: {0}",
+    'M006': "деление на ноль в {0}",
+    'M007': "{0} без #if",
+
+    # Сообщения парсера — готовые строки из грамматических правил
+    'S001': "{0}",
+
+    'E001': "Повторное объявление функции '{0}'",
+    'E002': "Повторное объявление параметра '{0}'",
+    'E003': "Переменная '{0}' уже объявлена в этой области видимости",
+    'E004': "Переменная '{0}' не объявлена",
+    'E005': "Оператор return вне функции",
+    'E006': "Функция '{0}' не объявлена",
+    'E007': "Функция '{0}' ожидает {1} аргументов, получено {2}",
+    'E008': "Целое число {0} вне диапазона 32-бит ({1}..{2})",
+}
+
+
+class Diagnostic:
+    __slots__ = ('code', 'severity', 'line', 'column', 'args', 'expansion', 'file')
+
+    def __init__(self, code: str, severity: Severity, line: Optional[int],
+                 column: Optional[int], args: Tuple[Any, ...] = (),
+                 expansion: Tuple[str, ...] = (), file: Optional[str] = None):
+        self.code = code
+        self.severity = severity
+        self.line = line
+        self.column = column
+        self.args = args
+        # Цепочка раскрытий макросов, внутри которой находится позиция
+        self.expansion = expansion
+        # Включаемый файл, к которому относится позиция; None — основной файл
+        self.file = file
+
+    @property
+    def message(self) -> str:
+        return MESSAGES[self.code].format(*self.args)
+
+    def format(self) -> str:
+        label = self.severity.value
+        message = self.message
+        if self.expansion:
+            message += f" (в раскрытии макроса {' -> '.join(self.expansion)})"
+        prefix = f"{self.file}: " if self.file else ""
+        if self.line is None:
+            return f"{prefix}[{label}] {message}"
+        if self.column is None:
+            return f"{prefix}[Строка {self.line}] {label}: {message}"
+        return f"{prefix}[Строка {self.line}, Колонка {self.column}] {label}: {message}"
+
+    __str__ = format
+
+    def _key(self):
+        return self.code, self.severity, self.line, self.column, self.args, self.expansion, self.file
+
+    def __eq__(self, other):
+        if not isinstance(other, Diagnostic):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"Diagnostic({self.code}, {self.line}:{self.column}, {self.args!r})"
+
+
+# Список диагностик с ограничением: сверх limit сообщения только
+# считаются, limit=0 — режим подсчёта без хранения. Истинен, если была
+# хотя бы одна диагностика, даже не сохранённая.
+class DiagnosticList(list):
+
+    def __init__(self, limit: Optional[int] = None):
+        super().__init__()
+        self.limit = limit
+        self.dropped = 0
+
+    def report(self, diagnostic) -> None:
+        if self.limit is None or len(self) < self.limit:
+            self.append(diagnostic)
+        else:
+            self.dropped += 1
+
+    @property
+    def count(self) -> int:
+        return len(self) + self.dropped
+
+    def __bool__(self) -> bool:
+        return self.count > 0
@@ -0,0 +1,58 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Optional, Tuple
+
+
+# Начала строк в нумерации Scanner: смещение, от которого отсчитывается
+# колонка 1, и номер строки. Сканер записывает их по мере чтения, поэтому
+# позиции по смещению совпадают с line/column токенов и в особых случаях:
+# экранированный перевод строки в литерале не начинает новую строку, после
+# '\n' в многострочном комментарии колонка больше на единицу.
+class LineIndex:
+
+    def __init__(self):
+        self.starts = array('q')
+        self.lines = array('i')
+
+    def add(self, start: int, line: int) -> None:
+        # Смещения не убывают; повторная запись той же позиции заменяет прежнюю
+        if self.starts and self.starts[-1] == start:
+            self.lines[-1] = line
+        else:
+            self.starts.append(start)
+            self.lines.append(line)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        index = bisect_right(self.starts, offset) - 1
+        return self.lines[index], offset - self.starts[index] + 1
+
+    def offset(self, line: int, column: int) -> int:
+        # Обратное к position: смещение позиции line:column
+        index = bisect_right(self.lines, line) - 1
+        return self.starts[index] + column - 1
+
+    def line_bounds(self, line: int) -> Optional[Tuple[int, Optional[int]]]:
+        # Смещения [начало, конец) строки line, у последней строки конец None;
+        # None, если строка целиком внутри комментария или литерала
+        index = bisect_left(self.lines, line)
+        if index == len(self.lines) or self.lines[index] != line:
+            return None
+        end = self.starts[index + 1] if index + 1 < len(self.starts) else None
+        return self.starts[index], end
+
+    def prefix(self, offset: int) -> 'LineIndex':
+        # Записи, действующие до offset включительно
+        count = bisect_right(self.starts, offset)
+        index = LineIndex()
+        index.starts = self.starts[:count]
+        index.lines = self.lines[:count]
+        return index
+
+    def extend_shifted(self, other: 'LineIndex', after: int, offset_delta: int, line_delta: int) -> None:
+        # Дописывает записи other со смещением больше after, сдвинутые после правки
+        first = bisect_right(other.starts, after)
+        self.starts.extend(map(offset_delta.__add__, other.starts[first:]))
+        self.lines.extend(map(line_delta.__add__, other.lines[first:]))
@@ -0,0 +1,154 @@
+import bisect
+import os
+import re
+from sys import intern
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Type
+
+from .scanner import Scanner
+from .token import Token, TokenType
+
+
+# Строки и комментарии: только внутри них перевод строки не является
+# безопасной точкой разреза. Порядок альтернатив повторяет Scanner:
+# '//' раньше '/*', строка обрывается на неэкранированном переводе строки.
+_OPAQUE_RE = re.compile(r"""
+    "(?:[^"\\\r\n]|\\.)*"?
+  | //[^\r\n]*
+  | /\*.*?(?:\*/|\Z)
+""", re.VERBOSE | re.DOTALL)
+
+_TYPES = {token_type.value: token_type for token_type in TokenType}
+
+# Меньше этого на сегмент делить не имеет смысла: запуск процессов дороже
+MIN_SEGMENT_SIZE = 1 << 16
+
+
+def find_split_points(source: str, parts: int) -> List[Tuple[int, int]]:
+    # Возвращает [(смещение, номер строки)] для начала каждого сегмента.
+    # Разрез делается сразу после '\n' вне строк и комментариев, поэтому
+    # сегмент начинается с колонки 1 на границе токенов.
+    unsafe_starts = []
+    unsafe_ends = []
+    # Экранированные '\n' в строках Scanner не считает переводами строки
+    escaped_newlines = []
+    for m in _OPAQUE_RE.finditer(source):
+        start, end = m.span()
+        if source.find('\n', start, end) != -1:
+            unsafe_starts.append(start)
+            unsafe_ends.append(end)
+            if source[start] == '"':
+                escaped_newlines.append((end, source.count('\n', start, end)))
+
+    points = [(0, 1)]
+    length = len(source)
+    escaped_before = 0
+    escaped_index = 0
+    for part in range(1, parts):
+        target = max(length * part // parts, points[-1][0])
+        while True:
+            newline = source.find('\n', target)
+            if newline == -1:
+                return points
+            index = bisect.bisect_right(unsafe_starts, newline) - 1
+            if index >= 0 and newline < unsafe_ends[index]:
+                target = unsafe_ends[index]
+                continue
+            break
+
+        split = newline + 1
+        if split >= length:
+            return points
+        while escaped_index < len(escaped_newlines) and escaped_newlines[escaped_index][0] <= split:
+            escaped_before += escaped_newlines[escaped_index][1]
+            escaped_index += 1
+        points.append((split, 1 + source.count('\n', 0, split) - escaped_before))
+    return points
+
+
+class _SegmentMixin:
+    # Сегмент не знает скобок из соседних сегментов: ошибки о лишней '}'
+    # помечаются, а итоговая глубина проверяется при склейке
+
+    def _unmatched_brace(self) -> None:
+        self.brace_errors.append(len(self.errors))
+        super()._unmatched_brace()
+
+    def _unclosed_blocks(self, depth: int) -> None:
+        self.open_blocks = depth
+        self.error('L014')
+        self.unclosed_error = self.errors.pop()
+
+
+_SEGMENT_CLASSES: Dict[Type[Scanner], Type[Scanner]] = {}
+
+
+def _scan_segment(scanner_class: Type[Scanner], text: str, line: int):
+    segment_class = _SEGMENT_CLASSES.get(scanner_class)
+    if segment_class is None:
+        segment_class = type('Segment' + scanner_class.__name__, (_SegmentMixin, scanner_class), {})
+        _SEGMENT_CLASSES[scanner_class] = segment_class
+
+    scanner = segment_class(text)
+    scanner.line = line
+    scanner.brace_errors = []
+    tokens = scanner.scan_tokens()
+    # Колонки вместо объектов Token: между процессами они передаются в
+    # несколько раз быстрее
+    columns = (
+        [token.token_type.value for token in tokens],
+        [token.lexeme for token in tokens],
+        [token.line for token in tokens],
+        [token.column for token in tokens],
+        [token.literal_value for token in tokens],
+    )
+    return columns, scanner.errors, scanner.brace_errors, scanner.open_blocks, scanner.unclosed_error
+
+
+def scan_parallel(source: str, scanner_class: Type[Scanner] = Scanner,
+                  workers: Optional[int] = None) -> Tuple[List[Token], List[str]]:
+    workers = workers or os.cpu_count() or 1
+    parts = min(workers, max(1, len(source) // MIN_SEGMENT_SIZE))
+    points = find_split_points(source, parts)
+    if len(points) == 1:
+        scanner = scanner_class(source)
+        return scanner.scan_tokens(), scanner.errors
+
+    texts = []
+    for index, (start, line) in enumerate(points):
+        end = points[index + 1][0] if index + 1 < len(points) else len(source)
+        texts.append(source[start:end])
+    lines = [line for _, line in points]
+    classes = [scanner_class] * len(points)
+
+    with ProcessPoolExecutor(max_workers=len(points)) as executor:
+        results = list(executor.map(_scan_segment, classes, texts, lines))
+
+    # Склейка: лишние '}' сегмента сначала закрывают блоки, оставшиеся
+    # открытыми в предыдущих сегментах, и только потом считаются ошибкой
+    tokens: List[Token] = []
+    errors: List[str] = []
+    depth = 0
+    last = len(results) - 1
+    for index, (columns, segment_errors, brace_errors, open_blocks, unclosed_error) in enumerate(results):
+        matched = set()
+        for error_index in brace_errors:
+            if not depth:
+                break
+            matched.add(error_index)
+            depth -= 1
+        depth += open_blocks
+
+        errors.extend(error for i, error in enumerate(segment_errors) if i not in matched)
+        types, lexemes, token_lines, token_columns, literals = columns
+        if index < last:
+            # EOF сегмента
+            for column in columns:
+                column.pop()
+        elif depth:
+            errors.append(unclosed_error)
+        # Интернированные в рабочем процессе строки здесь снова разные объекты
+        lexemes = map(intern, lexemes)
+        tokens.extend(map(Token, map(_TYPES.__getitem__, types), lexemes, token_lines, token_columns, literals))
+
+    return tokens, errors
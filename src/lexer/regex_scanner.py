@@ -0,0 +1,287 @@
+import re
+from sys import intern
+from typing import Dict, Iterator, Optional, Type, Union
+
+from .scanner import COMPACT_THRESHOLD, ErrorLimitReached, Scanner
+from .source import SourceReader
+from .token import Token, TokenType
+from .token_buffer import TokenBuffer
+
+
+# Одно скомпилированное выражение на все «простые» лексемы: за один шаг
+# поглощаются целые идентификаторы, числа, серии пробелов и комментарии.
+# Всё, что требует диагностики (ошибки, escape-последовательности,
+# не-ASCII символы), передаётся посимвольному пути Scanner.scan_token,
+# поэтому токены и сообщения об ошибках совпадают с классическим движком.
+_MASTER_RE = re.compile(r"""
+    (?P<ws>(?:[ \t]|\r(?!\n))+)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<punct>[(){}\[\],;:.%])
+  | (?P<nl>\r?\n)
+  | (?P<line_comment>//[^\r\n]*)
+  | (?P<block_comment>/\*.*?\*/)
+  | (?P<open_comment>/\*)
+  | (?P<op>->|\+\+|--|\+=|-=|\*=|/=|==|!=|<=|>=|&&|\|\|)
+  | (?P<number>-?[0-9]+(?:\.[0-9]+)?)
+  | (?P<op1>[-+*/!=<>])
+  | (?P<string>"[^"\\\r\n]*")
+""", re.VERBOSE | re.DOTALL)
+
+_OPERATORS = {
+    '(': TokenType.LPAREN,
+    ')': TokenType.RPAREN,
+    '{': TokenType.LBRACE,
+    '}': TokenType.RBRACE,
+    '[': TokenType.LBRACKET,
+    ']': TokenType.RBRACKET,
+    ',': TokenType.COMMA,
+    ';': TokenType.SEMICOLON,
+    ':': TokenType.COLON,
+    '.': TokenType.DOT,
+    '%': TokenType.PERCENT,
+    '+': TokenType.PLUS,
+    '-': TokenType.MINUS,
+    '*': TokenType.STAR,
+    '/': TokenType.SLASH,
+    '!': TokenType.NOT,
+    '=': TokenType.ASSIGN,
+    '<': TokenType.LT,
+    '>': TokenType.GT,
+    '->': TokenType.ARROW,
+    '++': TokenType.INCREMENT,
+    '--': TokenType.DECREMENT,
+    '+=': TokenType.PLUS_ASSIGN,
+    '-=': TokenType.MINUS_ASSIGN,
+    '*=': TokenType.STAR_ASSIGN,
+    '/=': TokenType.SLASH_ASSIGN,
+    '==': TokenType.EQ,
+    '!=': TokenType.NEQ,
+    '<=': TokenType.LEQ,
+    '>=': TokenType.GEQ,
+    '&&': TokenType.AND,
+    '||': TokenType.OR,
+}
+
+INT_MIN = -2 ** 31
+INT_MAX = 2 ** 31 - 1
+
+
+class RegexScanner(Scanner):
+
+    def _scan(self) -> Iterator[None]:
+        source = self.source
+        length = len(source)
+        tokens = self.tokens
+        if tokens is None:
+            # Scanner.validate: токены не нужны
+            def add(*args):
+                pass
+        elif tokens.__class__ is TokenBuffer:
+            add = tokens.add
+        else:
+            def add(token_type, lexeme, line, column, literal, start, end, append=tokens.append):
+                append(Token(token_type, lexeme, line, column, literal))
+        keywords = self.KEYWORDS
+        operators = _OPERATORS
+        match_at = _MASTER_RE.match
+        block_stack = self.block_stack = ['{'] * self.enclosing_blocks
+        # Начала строк для LineIndex (см. Scanner._line_started)
+        add_line = self.line_index.add
+        self._line_started()
+
+        pos = self.current
+        line = self.line
+        column = self.column
+        # Начало последней «итерации» классического цикла: от него EOF
+        # получает свою лексему (см. Scanner.scan_tokens)
+        last_start = self.start
+
+        try:
+            while True:
+                if pos >= length:
+                    if self._reader is None:
+                        break
+                    pos, last_start = self._refill(pos, last_start)
+                    source = self.source
+                    length = len(source)
+                    continue
+
+                m = match_at(source, pos)
+                # Лексема у края окна может продолжиться в следующем фрагменте
+                if m is not None and m.end() + 2 > length and self._reader is not None:
+                    pos, last_start = self._refill(pos, last_start)
+                    source = self.source
+                    length = len(source)
+                    continue
+
+                kind = m.lastgroup if m is not None else None
+
+                if kind == 'ws':
+                    column += m.end() - pos
+                    pos = m.end()
+                    last_start = pos - 1
+                    continue
+
+                last_start = pos
+
+                if kind == 'nl':
+                    pos = m.end()
+                    line += 1
+                    column = 1
+                    add_line(self._base + pos, line)
+                    continue
+
+                if kind == 'line_comment':
+                    column += m.end() - pos
+                    pos = m.end()
+                    continue
+
+                if kind == 'block_comment':
+                    text = m.group()
+                    newlines = text.count('\n')
+                    if newlines:
+                        line += newlines
+                        last = text.rfind('\n')
+                        # Классический движок после '\n' (но не '\r\n') в
+                        # комментарии оставляет колонку на единицу больше
+                        column = (1 if text[last - 1] == '\r' else 2) + len(text) - last - 1
+                        add_line(self._base + m.end() - column + 1, line)
+                    else:
+                        column += len(text)
+                    pos = m.end()
+                    continue
+
+                if kind == 'open_comment':
+                    # Незакрытый комментарий: ошибку формирует Scanner.block_comment
+                    kind = None
+
+                end = m.end() if m is not None else pos
+                # Не-ASCII продолжение может изменить лексему (isalnum/isdigit
+                # понимают Unicode) — такие случаи разбирает классический путь
+                if kind is not None and kind != 'string' and end < length and (
+                        source[end] >= '\x80'
+                        or (source[end] == '.' and kind == 'number'
+                            and end + 1 < length and source[end + 1] >= '\x80')):
+                    kind = None
+
+                if kind == 'ident':
+                    lexeme = intern(m.group())
+                    if len(lexeme) > 255:
+                        kind = None
+                    else:
+                        token_type = keywords.get(lexeme, TokenType.IDENTIFIER)
+                        literal = None
+                        if token_type is TokenType.BOOL_LITERAL:
+                            literal = lexeme == 'true'
+                        add(token_type, lexeme, line, column, literal, pos, end)
+
+                elif kind == 'punct' or kind == 'op' or kind == 'op1':
+                    lexeme = intern(m.group())
+                    if lexeme == '{':
+                        block_stack.append('{')
+                    elif lexeme == '}':
+                        if block_stack:
+                            block_stack.pop()
+                        else:
+                            self.current = self.start = pos
+                            self.line = line
+                            self.column = column
+                            self._unmatched_brace()
+                    add(operators[lexeme], lexeme, line, column, None, pos, end)
+
+                elif kind == 'number':
+                    text = m.group()
+                    if text[0] == '-':
+                        lexeme = intern(text[1:])
+                        last_start = pos + 1
+                    else:
+                        lexeme = intern(text)
+                    if '.' in text:
+                        value = float(text)
+                        if abs(value) > 1e308:
+                            kind = None
+                        else:
+                            add(TokenType.FLOAT_LITERAL, lexeme, line, column, value, pos, end)
+                    else:
+                        value = int(text)
+                        if value < INT_MIN or value > INT_MAX:
+                            kind = None
+                        else:
+                            add(TokenType.INT_LITERAL, lexeme, line, column, value, pos, end)
+
+                elif kind == 'string':
+                    text = m.group()
+                    add(TokenType.STRING_LITERAL, text, line, column, text[1:-1], pos, end)
+
+                if kind is not None:
+                    column += end - pos
+                    pos = end
+                    self.current = pos
+                    self.line = line
+                    self.column = column
+                    yield
+                    continue
+
+                # Медленный путь: ровно одна итерация цикла Scanner.scan_tokens
+                self.current = self.start = self.token_start_offset = pos
+                self.line = self.token_start_line = line
+                self.column = self.token_start_column = column
+
+                c = source[pos]
+                if c == '{':
+                    block_stack.append('{')
+                elif c == '}':
+                    if block_stack:
+                        block_stack.pop()
+                    else:
+                        self._unmatched_brace()
+
+                self.scan_token()
+                yield
+
+                source = self.source
+                length = len(source)
+                pos = self.current
+                line = self.line
+                column = self.column
+                last_start = self.start
+
+            self.current = pos
+            self.start = last_start
+            self.line = line
+            self.column = column
+
+            self._unclosed_blocks(len(block_stack))
+        except ErrorLimitReached:
+            # Позиция последней ошибки уже записана в self
+            self.truncated = True
+            self.start = self.current
+
+        self.token_start_offset = self.current
+        self.token_start_line = self.line
+        self.token_start_column = self.column
+        self.add_token(TokenType.EOF, "")
+
+    def _refill(self, pos: int, last_start: int):
+        # Дочитывает окно на границе лексемы; возвращает позиции после сжатия
+        self.current = pos
+        self.start = last_start
+        if last_start >= COMPACT_THRESHOLD:
+            self._compact(last_start)
+        self._fill()
+        return self.current, self.start
+
+
+ENGINES: Dict[str, Type[Scanner]] = {
+    'classic': Scanner,
+    'regex': RegexScanner,
+}
+
+
+def create_scanner(source: Union[str, SourceReader], engine: str = 'classic',
+                   error_limit: Optional[int] = None, max_errors: Optional[int] = None) -> Scanner:
+    try:
+        scanner_class = ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Неизвестный движок лексера: {engine}") from None
+    return scanner_class(source, error_limit, max_errors)
@@ -1,5 +1,61 @@
-from typing import List, Optional, Any
+import re
+from bisect import bisect_left, bisect_right
+from collections import deque
+from sys import intern
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from .diagnostic import Diagnostic, DiagnosticList, Severity
+from .line_index import LineIndex
+from .source import SourceReader
 from .token import TokenType, Token
+from .token_buffer import TokenBuffer
+
+
+# Разобранная часть окна отбрасывается, когда превышает этот размер
+COMPACT_THRESHOLD = 1 << 16
+
+# Увеличивать при любом изменении токенов или сообщений об ошибках:
+# входит в ключ кэша токенов
+LEXER_VERSION = 1
+
+# Серия пробельных символов; '\r' перед '\n' — перевод строки, не пробел
+_WHITESPACE_RE = re.compile(r'(?:[ \t]|\r(?!\n))*')
+_LINE_END_RE = re.compile(r'[\r\n]')
+# Символы, на которых прерывается тело строкового литерала
+_STRING_STOP_RE = re.compile(r'["\\\r\n]')
+
+# Классы символов — битовые маски. Для ASCII берутся из таблицы по коду
+# символа, для остальных вычисляются через str.isdigit/isalpha/isalnum (как
+# раньше) и запоминаются
+_DIGIT = 1      # str.isdigit: начало и тело числа
+_ALPHA = 2      # str.isalpha или '_': начало идентификатора
+_IDENT = 4      # str.isalnum или '_': тело идентификатора
+
+_ASCII_CLASS = [0] * 128
+for _code in range(128):
+    _char = chr(_code)
+    _ASCII_CLASS[_code] = ((_DIGIT if _char.isdigit() else 0)
+                           | (_ALPHA if _char.isalpha() or _char == '_' else 0)
+                           | (_IDENT if _char.isalnum() or _char == '_' else 0))
+del _code, _char
+
+_UNICODE_CLASS: Dict[str, int] = {}
+
+
+def _char_class(c: str) -> int:
+    code = ord(c)
+    if code < 128:
+        return _ASCII_CLASS[code]
+    cls = _UNICODE_CLASS.get(c)
+    if cls is None:
+        cls = _UNICODE_CLASS[c] = ((_DIGIT if c.isdigit() else 0)
+                                   | (_ALPHA if c.isalpha() else 0)
+                                   | (_IDENT if c.isalnum() else 0))
+    return cls
+
+
+class ErrorLimitReached(Exception):
+    # Бросается из Scanner.error при достижении max_errors и прерывает цикл
+    pass
 
 
 class Scanner:
@@ -21,75 +77,299 @@ class Scanner:
         'false': TokenType.BOOL_LITERAL,
     }
 
-    def __init__(self, source: str):
+    def __init__(self, source: Union[str, SourceReader], error_limit: Optional[int] = None,
+                 max_errors: Optional[int] = None):
+        # При чтении фрагментами self.source — текущее окно входа, позиции
+        # отсчитываются от его начала
+        self._reader: Optional[SourceReader] = None
+        if not isinstance(source, str):
+            self._reader = source
+            source = ''
         self.source = source
         self.tokens: List[Token] = []
 
         self.start = 0
         self.current = 0
         self.line = 1
-        self.column = 1
+        # Колонка не считается посимвольно: это расстояние от line_start —
+        # позиции колонки 1 в окне. Начала строк копятся в line_index
+        # (смещения от начала входа; _base — смещение окна)
+        self.line_start = 0
+        self._base = 0
+        self.line_index = LineIndex()
+        self.token_start_offset = 0
         self.token_start_line = 1
         self.token_start_column = 1
 
-        self.errors: List[str] = []
+        # Сверх error_limit ошибки только считаются, 0 — только подсчёт
+        self.errors = DiagnosticList(error_limit)
+        # После max_errors ошибок сканирование останавливается: токены
+        # обрываются на месте последней ошибки и завершаются EOF
+        self.max_errors = max_errors
+        self.truncated = False
 
-        self._all_tokens: Optional[List[Token]] = None
-        self._token_position = 0
+        self.block_stack: List[str] = []
+        # Блоки, открытые до начала сканирования (см. relex)
+        self.enclosing_blocks = 0
+        self._stream: Optional[Iterator[Token]] = None
+        self._lookahead: Deque[Token] = deque()
 
     def scan_tokens(self) -> List[Token]:
-        block_stack = []
-
-        while not self.is_at_end():
-            self.start = self.current
-            self.token_start_line = self.line
-            self.token_start_column = self.column
-
-            c = self.peek()
-            match c:
-                case '{':
-                    block_stack.append('{')
-                case '}':
-                    if block_stack:
-                        block_stack.pop()
-                    else:
-                        self.error(f"Закрывающая фигурная скобка '}}' без открывающей")
+        for _ in self._scan():
+            pass
+        return self.tokens
 
-            self.scan_token()
+    def scan_buffer(self) -> TokenBuffer:
+        # Те же токены, но в компактном колоночном виде; лексемы берутся
+        # из исходника, поэтому он должен быть целиком в памяти
+        if self._reader is not None:
+            raise ValueError("TokenBuffer требует исходник в памяти")
+        self.tokens = TokenBuffer(self.source, self.line_index)
+        return self.scan_tokens()
+
+    def relex(self, previous_tokens: TokenBuffer, edit_range: Tuple[int, int], new_text: str) -> TokenBuffer:
+        # Повторное сканирование после правки self.source[start:end] = new_text.
+        # previous_tokens — результат scan_buffer (или relex) для self.source,
+        # self.errors — его ошибки: только буфер хранит точные смещения
+        # токенов. Сканируется участок от последнего незатронутого токена до
+        # первого токена после правки, совпадающего со старым по смещению;
+        # хвост переносится со сдвигом. Ошибки участка заменяются ошибками
+        # повторного сканирования, ошибки хвоста сдвигаются вместе с ним, а
+        # ошибки о фигурных скобках хвоста пересчитываются по глубине блоков
+        # на стыке
+        start, end = edit_range
+        old = previous_tokens
+        source = self.source[:start] + new_text + self.source[end:]
+        delta = len(new_text) - (end - start)
+
+        if self.max_errors is not None or self.errors.dropped:
+            # Без полного списка ошибок сдвигать нечего: сканируется всё
+            scanner = type(self)(source, self.errors.limit, self.max_errors)
+            buffer = scanner.scan_buffer()
+            self.source, self.tokens, self.line_index = source, buffer, scanner.line_index
+            self.errors, self.truncated = scanner.errors, scanner.truncated
+            return buffer
+
+        errors = [(old.line_index.offset(error.line, error.column), error) for error in self.errors]
+
+        # Scanner заглядывает не дальше двух символов за конец токена
+        keep = bisect_right(old.ends, start - 2)
+        scanner = type(self)(source)
+        resume = old.ends[keep - 1] if keep else 0
+        prefix = [error for offset, error in errors if _reported_before(offset, error, resume)]
+        unmatched = _unmatched(prefix)
+        scanner.enclosing_blocks = _block_depth(old.types[:keep], unmatched)
+        # Начала строк до места возобновления не меняются
+        scanner.line_index = old.line_index.prefix(resume)
+        scanner.tokens = buffer = old.copy_prefix(source, keep, scanner.line_index)
+        if keep:
+            scanner.current = scanner.start = resume
+            scanner.line = scanner.line_index.lines[-1]
+            scanner.line_start = scanner.line_index.starts[-1]
+
+        resync_from = start + len(new_text)
+        count = len(buffer)
+        tail = None
+        for _ in scanner._scan():
+            if len(buffer) == count:
+                continue
+            count = len(buffer)
+            token_start = buffer.starts[-1]
+            if token_start < resync_from:
+                continue
+            # С одинаковой позиции сканирование идёт одинаково, меняются
+            # только номера строк и колонки
+            index = bisect_left(old.starts, token_start - delta)
+            if index < len(old) - 1 and old.starts[index] == token_start - delta:
+                old_start = old.starts[index]
+                line_delta = scanner.line_index.position(token_start)[0] - old.line_index.position(old_start)[0]
+                buffer.extend_shifted(old, index + 1, delta)
+                scanner.line_index.extend_shifted(old.line_index, old_start, delta, line_delta)
+                # Глубина блоков в старом тексте после того же токена
+                head_unmatched = _unmatched(error for offset, error in errors
+                                            if _reported_before(offset, error, old.ends[index]))
+                old_depth = scanner.enclosing_blocks + _block_depth(old.types[keep:index + 1],
+                                                                    head_unmatched - unmatched)
+                tail = self._shifted_errors(errors, old, index, delta, len(scanner.block_stack), old_depth,
+                                            scanner.line_index)
+                break
+
+        self.errors = DiagnosticList(self.errors.limit)
+        for error in prefix + scanner.errors + (tail or []):
+            self.errors.report(error)
+        self.source = source
+        self.tokens = buffer
+        self.line_index = scanner.line_index
+        return buffer
+
+    def _shifted_errors(self, errors: list, old: TokenBuffer, index: int, delta: int,
+                        depth: int, old_depth: int, line_index: LineIndex) -> List[Diagnostic]:
+        # Ошибки старого хвоста после токена index на новых позициях. depth и
+        # old_depth — глубина блоков после этого токена в новом и старом
+        # тексте; если они разные, лишние '}' хвоста и незакрытый блок в
+        # конце пересчитываются
+        old_end = old.ends[index]
+        tail = [(offset, error) for offset, error in errors if not _reported_before(offset, error, old_end)]
+
+        if depth != old_depth:
+            braces = [offset for offset, error in tail if error.code == 'L013']
+            tail = [(offset, error) for offset, error in tail if error.code not in ('L013', 'L014')]
+            if depth > old_depth:
+                # Первые лишние '}' теперь закрывают блоки
+                braces = braces[depth - old_depth:]
+            else:
+                braces = _extra_braces(old, index + 1, depth, old_depth) + braces
+            blocks = depth + _block_depth(old.types[index + 1:], len(braces))
+            # Ошибка о '}' — после ошибок, сообщённых до её токена
+            merged = []
+            for offset, error in tail:
+                while braces and braces[0] < offset:
+                    merged.append((braces.pop(0), Diagnostic('L013', Severity.ERROR, None, None)))
+                merged.append((offset, error))
+            tail = merged + [(offset, Diagnostic('L013', Severity.ERROR, None, None)) for offset in braces]
+            if blocks:
+                tail.append((old.ends[-1], Diagnostic('L014', Severity.ERROR, None, None)))
+
+        shifted = []
+        for offset, error in tail:
+            line, column = line_index.position(offset + delta)
+            args = error.args
+            if error.code == 'L005':
+                # Позиция начала строки-литерала
+                args = line_index.position(old.line_index.offset(*args) + delta)
+            shifted.append(Diagnostic(error.code, error.severity, line, column, args))
+        return shifted
+
+    def scan_tokens_parallel(self, workers: Optional[int] = None) -> List[Token]:
+        # Исходник режется на сегменты, которые сканируются в отдельных
+        # процессах; токены и ошибки совпадают с scan_tokens.
+        # Импорт здесь: модуль parallel сам зависит от Scanner
+        from .parallel import scan_parallel
+
+        if self._reader is not None:
+            raise ValueError("Параллельный режим требует исходник в памяти")
+        if self.max_errors is not None:
+            # Сегменты не знают об ошибках друг друга: обрыв на max_errors
+            # возможен только в последовательном проходе
+            return self.scan_tokens()
+        self.tokens, errors = scan_parallel(self.source, type(self), workers)
+        for error in errors:
+            self.errors.report(error)
+        return self.tokens
 
-        if block_stack:
-            self.error("Незакрытый блок")
+    def validate(self) -> bool:
+        # Только проверка: токены не создаются. Вместе с max_errors=1
+        # время до первой ошибки пропорционально её позиции
+        self.tokens = None
+        for _ in self._scan():
+            pass
+        return not self.errors
+
+    def iter_tokens(self) -> Iterator[Token]:
+        # Токены выдаются по мере сканирования и нигде не накапливаются
+        self.tokens = pending = []
+        for _ in self._scan():
+            if pending:
+                yield from pending
+                pending.clear()
+        yield from pending
+        pending.clear()
+
+    def _scan(self) -> Iterator[None]:
+        # Основной цикл; уступает управление после каждого шага, чтобы
+        # iter_tokens мог забрать добавленные токены. Стек фигурных скобок
+        # доступен подклассам, выдающим токены не из окна исходника
+        block_stack = self.block_stack = ['{'] * self.enclosing_blocks
+        self._line_started()
+
+        try:
+            while not self.is_at_end():
+                if self._reader is not None and self.current >= COMPACT_THRESHOLD:
+                    self._compact(self.current)
+
+                current = self.current
+                self.start = current
+                self.token_start_offset = current
+                self.token_start_line = self.line
+                self.token_start_column = current - self.line_start + 1
+
+                c = self.source[current]
+                match c:
+                    case '{':
+                        block_stack.append('{')
+                    case '}':
+                        if block_stack:
+                            block_stack.pop()
+                        else:
+                            self._unmatched_brace()
+
+                self.scan_token()
+                yield
+
+            self._unclosed_blocks(len(block_stack))
+        except ErrorLimitReached:
+            # Оборванный токен не попадает и в лексему EOF
+            self.truncated = True
+            self.start = self.current
 
+        self.token_start_offset = self.current
         self.token_start_line = self.line
         self.token_start_column = self.column
         self.add_token(TokenType.EOF, "")
 
-        return self.tokens
-
     def next_token(self) -> Token:
-        if self._all_tokens is None:
-            self._all_tokens = self.scan_tokens()
-            self._token_position = 0
+        token = self.peek_token()
+        if token.token_type != TokenType.EOF:
+            self._lookahead.popleft()
+        return token
 
-        if self._token_position >= len(self._all_tokens):
-            return self._all_tokens[-1]
+    def peek_token(self, offset: int = 0) -> Token:
+        # Сканирует ровно столько, сколько нужно для просмотра вперёд;
+        # после EOF всегда возвращается EOF
+        if self._stream is None:
+            self._stream = self.iter_tokens()
 
-        token = self._all_tokens[self._token_position]
-        self._token_position += 1
-        return token
+        lookahead = self._lookahead
+        while len(lookahead) <= offset:
+            if lookahead and lookahead[-1].token_type == TokenType.EOF:
+                return lookahead[-1]
+            lookahead.append(next(self._stream))
+        return lookahead[offset]
+
+    def is_at_end(self) -> bool:
+        return self.current >= len(self.source) and not self._fill()
 
-    def peek_token(self) -> Token:
-        if self._all_tokens is None:
-            self._all_tokens = self.scan_tokens()
-            self._token_position = 0
+    def _fill(self) -> bool:
+        # Дочитывает следующий фрагмент в окно; False, если вход исчерпан
+        if self._reader is None:
+            return False
+        chunk = self._reader.read()
+        if not chunk:
+            self._reader = None
+            return False
+        self.source += chunk
+        return True
 
-        if self._token_position >= len(self._all_tokens):
-            return self._all_tokens[-1]
+    def _compact(self, keep: int) -> None:
+        # Отбрасывает разобранную часть окна перед позицией keep; вызывается
+        # только на границе токенов, пока никто не держит старые позиции
+        self.source = self.source[keep:]
+        self.current -= keep
+        self.start -= keep
+        self.line_start -= keep
+        self._base += keep
 
-        return self._all_tokens[self._token_position]
+    @property
+    def column(self) -> int:
+        return self.current - self.line_start + 1
 
-    def is_at_end(self) -> bool:
-        return self.current >= len(self.source)
+    @column.setter
+    def column(self, value: int) -> None:
+        # Задаётся после current
+        self.line_start = self.current - value + 1
+
+    def _line_started(self) -> None:
+        self.line_index.add(self._base + self.line_start, self.line)
 
     def get_line(self) -> int:
         return self.line
@@ -100,158 +380,154 @@ class Scanner:
     def scan_token(self) -> None:
         c = self.advance()
 
-        match c:
-            case '\r' if self.peek() == '\n':
-                self.advance()
-                self.line += 1
-                self.column = 1
-
-            # Разделители
-            case '(':
-                self.add_token(TokenType.LPAREN)
-            case ')':
-                self.add_token(TokenType.RPAREN)
-            case '{':
-                self.add_token(TokenType.LBRACE)
-            case '}':
-                self.add_token(TokenType.RBRACE)
-            case '[':
-                self.add_token(TokenType.LBRACKET)
-            case ']':
-                self.add_token(TokenType.RBRACKET)
-            case ',':
-                self.add_token(TokenType.COMMA)
-            case ';':
-                self.add_token(TokenType.SEMICOLON)
-            case ':':
-                self.add_token(TokenType.COLON)
-            case '.':
-                self.add_token(TokenType.DOT)  # Точка для доступа к полям
-
-            # Арифметические операторы
-            case '+':
-                if self.match('+'):
-                    self.add_token(TokenType.INCREMENT)  # ++
-                elif self.match('='):
-                    self.add_token(TokenType.PLUS_ASSIGN)  # +=
-                else:
-                    self.add_token(TokenType.PLUS)
-
-            case '-':
-                if self.match('>'):
-                    self.add_token(TokenType.ARROW)  # ->
-                elif self.match('='):
-                    self.add_token(TokenType.MINUS_ASSIGN)  # -=
-                elif self.match('-'):
-                    self.add_token(TokenType.DECREMENT)  # --
-                elif self.peek().isdigit():
-                    self.number()  # отрицательное число
-                else:
-                    self.add_token(TokenType.MINUS)
-
-            case '*':
-                if self.match('='):
-                    self.add_token(TokenType.STAR_ASSIGN)  # *=
-                else:
-                    self.add_token(TokenType.STAR)
-
-            case '/':
-                if self.match('/'):
-                    # Однострочный комментарий
-                    while not self.is_at_end() and self.peek() not in '\r\n':
-                        self.advance()
-                elif self.match('*'):
-                    self.block_comment()
-                elif self.match('='):
-                    self.add_token(TokenType.SLASH_ASSIGN)  # /=
-                else:
-                    self.add_token(TokenType.SLASH)
-
-            case '%':
-                self.add_token(TokenType.PERCENT)
-
-            # Логические операторы и сравнение
-            case '!':
-                if self.match('='):
-                    self.add_token(TokenType.NEQ)  # !=
-                else:
-                    self.add_token(TokenType.NOT)  # !
-
-            case '=':
-                if self.match('='):
-                    self.add_token(TokenType.EQ)  # ==
-                else:
-                    self.add_token(TokenType.ASSIGN)  # =
-
-            case '<':
-                if self.match('='):
-                    self.add_token(TokenType.LEQ)  # <=
-                else:
-                    self.add_token(TokenType.LT)  # <
-
-            case '>':
-                if self.match('='):
-                    self.add_token(TokenType.GEQ)  # >=
-                else:
-                    self.add_token(TokenType.GT)  # >
-
-            case '&':
-                if self.match('&'):
-                    self.add_token(TokenType.AND)  # &&
-                else:
-                    self.error(f"Ожидался '&', получен '{self.peek()}'")
-
-            case '|':
-                if self.match('|'):
-                    self.add_token(TokenType.OR)  # ||
-                else:
-                    self.error(f"Ожидался '|', получен '{self.peek()}'")
-
-            # Строковые литералы
-            case '"':
-                self.string()
-
-            # Числа
-            case _ if c.isdigit():
-                self.number()
-
-            # Идентификаторы и ключевые слова
-            case _ if c.isalpha() or c == '_':
-                self.identifier()
-
-            # Пробельные символы
-            case c if c in ' \t\r':
-                pass
-
-            case '\n':
-                self.line += 1
-                self.column = 1
-
-            # Неизвестные символы
-            case _:
-                self.error(f"Недопустимый символ: '{c}' (ASCII: {ord(c)})")
+        # Один поиск в таблице по первому символу вместо цепочки case
+        code = ord(c)
+        if code < 128:
+            handler = _DISPATCH[code]
+            if handler is not None:
+                handler(self)
+                return
+
+        # Не-ASCII символы и неизвестные управляющие
+        cls = _char_class(c)
+        if cls & _DIGIT:
+            self.number()
+        elif cls & _ALPHA:
+            self.identifier()
+        else:
+            self.error('L003', c, ord(c))
 
-    def block_comment(self) -> None:
-        while not self.is_at_end():
-            match (self.peek(), self.peek_next()):
-                case ('*', '/'):
-                    self.advance()
-                    self.advance()
-                    return
-                case ('\n', _):
-                    self.line += 1
-                    self.column = 1
-                    self.advance()
-                case ('\r', '\n'):
-                    self.advance()
-                    self.advance()
-                    self.line += 1
-                    self.column = 1
-                case _:
-                    self.advance()
+    def newline(self) -> None:
+        self.line += 1
+        self.line_start = self.current
+        self._line_started()
+
+    def carriage_return(self) -> None:
+        if self.peek() == '\n':
+            self.advance()
+            self.newline()
+        else:
+            self.skip_whitespace()
+
+    def plus(self) -> None:
+        if self.match('+'):
+            self.add_token(TokenType.INCREMENT)  # ++
+        elif self.match('='):
+            self.add_token(TokenType.PLUS_ASSIGN)  # +=
+        else:
+            self.add_token(TokenType.PLUS)
+
+    def minus(self) -> None:
+        if self.match('>'):
+            self.add_token(TokenType.ARROW)  # ->
+        elif self.match('='):
+            self.add_token(TokenType.MINUS_ASSIGN)  # -=
+        elif self.match('-'):
+            self.add_token(TokenType.DECREMENT)  # --
+        elif _char_class(self.peek()) & _DIGIT:
+            self.number()  # отрицательное число
+        else:
+            self.add_token(TokenType.MINUS)
+
+    def slash(self) -> None:
+        if self.match('/'):
+            # Однострочный комментарий
+            self.skip_to(_LINE_END_RE)
+        elif self.match('*'):
+            self.block_comment()
+        elif self.match('='):
+            self.add_token(TokenType.SLASH_ASSIGN)  # /=
+        else:
+            self.add_token(TokenType.SLASH)
 
-        self.error("Незакрытый многострочный комментарий")
+    def ampersand(self) -> None:
+        if self.match('&'):
+            self.add_token(TokenType.AND)  # &&
+        else:
+            self.error('L001', self.peek())
+
+    def pipe(self) -> None:
+        if self.match('|'):
+            self.add_token(TokenType.OR)  # ||
+        else:
+            self.error('L002', self.peek())
+
+    def skip_class(self, mask: int) -> None:
+        # Пропускает серию символов класса mask прямо по окну исходника,
+        # без peek/advance на каждый символ
+        source = self.source
+        i = self.current
+        while True:
+            length = len(source)
+            while i < length:
+                c = source[i]
+                code = ord(c)
+                if not (_ASCII_CLASS[code] if code < 128 else _char_class(c)) & mask:
+                    break
+                i += 1
+            if i < length or not self._fill():
+                break
+            source = self.source
+        self.current = i
+
+    def skip_whitespace(self) -> None:
+        # Вся серия пробелов за один шаг. Посимвольный проход начинал бы
+        # итерацию с каждого символа, поэтому start (от него EOF берёт
+        # лексему) ставится на последний пробел серии
+        while True:
+            end = _WHITESPACE_RE.match(self.source, self.current).end()
+            # '\r' на краю окна: решение зависит от следующего фрагмента
+            if end < len(self.source) or not self._fill():
+                break
+        self.current = end
+        self.start = end - 1
+
+    def skip_to(self, pattern) -> None:
+        # Пропускает символы до первого совпадения pattern (или до конца
+        # входа) без переводов строк внутри
+        search = self.current
+        while True:
+            m = pattern.search(self.source, search)
+            if m is not None:
+                end = m.start()
+                break
+            search = len(self.source)
+            if not self._fill():
+                end = search
+                break
+        self.current = end
+
+    def skip_span(self, end: int) -> None:
+        # Переход к end с учётом переводов строк внутри многострочного
+        # комментария: после '\n' колонка на единицу больше, чем после
+        # '\r\n' — как в посимвольной версии
+        start = self.current
+        self.current = end
+        newlines = self.source.count('\n', start, end)
+        if newlines:
+            last = self.source.rindex('\n', start, end)
+            self.line += newlines
+            crlf = last > start and self.source[last - 1] == '\r'
+            self.line_start = last + 1 if crlf else last
+            self._line_started()
+
+    def block_comment(self) -> None:
+        search = self.current
+        while True:
+            end = self.source.find('*/', search)
+            if end != -1:
+                self.skip_span(end)
+                self.current += 2
+                return
+            # '*' в конце окна может закрыться '/' из следующего фрагмента
+            search = max(self.current, len(self.source) - 1)
+            if not self._fill():
+                break
+
+        self.skip_span(len(self.source))
+        self.error('L004')
         self.start = self.current
+        self.token_start_offset = self.current
         self.token_start_line = self.line
         self.token_start_column = self.column
 
@@ -260,8 +536,19 @@ class Scanner:
         start_line = self.token_start_line
         start_column = self.token_start_column
 
-        while not self.is_at_end():
-            c = self.peek()
+        while True:
+            # Обычные символы копируются в значение целыми кусками
+            m = _STRING_STOP_RE.search(self.source, self.current)
+            end = m.start() if m is not None else len(self.source)
+            if end > self.current:
+                value.append(self.source[self.current:end])
+                self.current = end
+            if m is None:
+                if self._fill():
+                    continue
+                break
+
+            c = m.group()
             match c:
                 case '"':
                     self.advance()
@@ -272,8 +559,8 @@ class Scanner:
                 case '\\':
                     self.advance()
                     if self.is_at_end():
-                        self.error(f"Незавершенная строка, начатая в {start_line}:{start_column}")
-                        self.error("Неизвестная escape-последовательность: \\")
+                        self.error('L005', start_line, start_column)
+                        self.error('L006', '')
                         content = ''.join(value)
                         self.add_token(TokenType.STRING_LITERAL, content, lexeme_override=content)
                         return
@@ -297,20 +584,16 @@ class Scanner:
                         case 'f':
                             value.append('\f')
                         case _:
-                            self.error(f"Неизвестная escape-последовательность: \\{n}")
+                            self.error('L006', n)
                             value.append(n)
 
-                case c if c in '\r\n':
-                    self.error(f"Незавершенная строка, начатая в {start_line}:{start_column}")
+                case _:
+                    self.error('L005', start_line, start_column)
                     content = ''.join(value)
                     self.add_token(TokenType.STRING_LITERAL, content, lexeme_override=content)
                     return
 
-                case _:
-                    value.append(c)
-                    self.advance()
-
-        self.error(f"Незавершенная строка, начатая в {start_line}:{start_column}")
+        self.error('L005', start_line, start_column)
         content = ''.join(value)
         self.add_token(TokenType.STRING_LITERAL, content, lexeme_override=content)
 
@@ -321,23 +604,21 @@ class Scanner:
         if self.source[start_pos] == '-':
             self.start = start_pos + 1
 
-        while self.peek().isdigit():
-            self.advance()
+        self.skip_class(_DIGIT)
 
-        match (self.peek(), self.peek_next().isdigit()):
+        match (self.peek(), _char_class(self.peek_next()) & _DIGIT != 0):
             case ('.', True):
                 self.advance()
-                while self.peek().isdigit():
-                    self.advance()
+                self.skip_class(_DIGIT)
 
                 num_str = self.source[start_pos:self.current]
                 try:
                     value = float(num_str)
                     if abs(value) > 1e308:
-                        self.error(f"Литерал с плавающей точкой вне диапазона: {num_str}")
+                        self.error('L007', num_str)
                     self.add_token(TokenType.FLOAT_LITERAL, value)
                 except ValueError:
-                    self.error(f"Недопустимый литерал с плавающей точкой: {num_str}")
+                    self.error('L008', num_str)
                     self.add_token(TokenType.FLOAT_LITERAL, 0.0)
 
             case _:
@@ -347,38 +628,57 @@ class Scanner:
                     INT_MIN = -2 ** 31
                     INT_MAX = 2 ** 31 - 1
                     if value < INT_MIN or value > INT_MAX:
-                        self.error(
-                            f"Целочисленный литерал вне 32-битного диапазона: {value} (допустимо {INT_MIN}..{INT_MAX})")
+                        self.error('L009', value, INT_MIN, INT_MAX)
                     self.add_token(TokenType.INT_LITERAL, value)
                 except ValueError:
-                    self.error(f"Недопустимый целочисленный литерал: {num_str}")
+                    self.error('L010', num_str)
                     self.add_token(TokenType.INT_LITERAL, 0)
 
     def identifier(self) -> None:
-        while self.peek().isalnum() or self.peek() == '_':
-            self.advance()
+        self.skip_class(_IDENT)
 
-        lexeme = self.source[self.start:self.current]
+        # Одинаковые имена и ключевые слова разделяют один объект строки
+        lexeme = intern(self.source[self.start:self.current])
 
         if len(lexeme) > 255:
-            self.error(f"Идентификатор слишком длинный: {lexeme[:20]}... (максимум 255 символов)")
+            self.error('L011', lexeme[:20])
 
-        if lexeme[0].isdigit():
-            self.error(f"Идентификатор не может начинаться с цифры: '{lexeme}'")
+        if _char_class(lexeme[0]) & _DIGIT:
+            self.error('L012', lexeme)
 
         # Проверяем ключевые слова
         token_type = self.KEYWORDS.get(lexeme, TokenType.IDENTIFIER)
 
         if lexeme == 'true':
-            self.add_token(TokenType.BOOL_LITERAL, True)
+            self.add_token(TokenType.BOOL_LITERAL, True, lexeme_override=lexeme)
         elif lexeme == 'false':
-            self.add_token(TokenType.BOOL_LITERAL, False)
+            self.add_token(TokenType.BOOL_LITERAL, False, lexeme_override=lexeme)
         else:
-            self.add_token(token_type)
+            self.add_token(token_type, lexeme_override=lexeme)
 
     def add_token(self, token_type: TokenType, literal_value: Optional[Any] = None,
                   lexeme_override: Optional[str] = None) -> None:
-        lexeme = lexeme_override if lexeme_override is not None else self.source[self.start:self.current]
+        if self.tokens is None:
+            return
+        if lexeme_override is not None:
+            lexeme = lexeme_override
+        else:
+            lexeme = intern(self.source[self.start:self.current])
+        if self.tokens.__class__ is TokenBuffer:
+            self.tokens.add(
+                token_type,
+                lexeme,
+                self.token_start_line,
+                self.token_start_column,
+                literal_value,
+                self.token_start_offset,
+                self.current
+            )
+            return
+        # Token хранит line и column в полях: их читают парсер, вывод и кэш.
+        # Посимвольного счёта колонки нет и здесь (см. column) — на токен
+        # одно вычитание в _scan; позиции по смещениям через LineIndex
+        # вычисляет только TokenBuffer
         token = Token(
             token_type,
             lexeme,
@@ -391,7 +691,6 @@ class Scanner:
     def advance(self) -> str:
         c = self.source[self.current]
         self.current += 1
-        self.column += 1
         return c
 
     def match(self, expected: str) -> bool:
@@ -400,7 +699,6 @@ class Scanner:
         if self.source[self.current] != expected:
             return False
         self.current += 1
-        self.column += 1
         return True
 
     def peek(self) -> str:
@@ -409,12 +707,129 @@ class Scanner:
         return self.source[self.current]
 
     def peek_next(self) -> str:
-        if self.current + 1 >= len(self.source):
-            return '\0'
+        while self.current + 1 >= len(self.source):
+            if not self._fill():
+                return '\0'
         return self.source[self.current + 1]
 
-    def error(self, message: str) -> None:
-        self.errors.append(f"[Строка {self.line}, Колонка {self.column}] Ошибка: {message}")
+    def _unmatched_brace(self) -> None:
+        self.error('L013')
+
+    def _unclosed_blocks(self, depth: int) -> None:
+        if depth:
+            self.error('L014')
+
+    def error(self, code: str, *args: Any) -> None:
+        # Сообщение форматируется только при выводе (см. Diagnostic)
+        self.errors.report(Diagnostic(code, Severity.ERROR, self.line, self.column, args))
+        if self.errors.count == self.max_errors:
+            raise ErrorLimitReached
 
     def get_errors(self) -> List[str]:
-        return self.errors
\ No newline at end of file
+        return [str(error) for error in self.errors]
+
+
+def _reported_before(offset: int, error: Diagnostic, boundary: int) -> bool:
+    # Сообщена ли ошибка до того, как сканер прошёл смещение boundary на
+    # границе токенов: о лишней '}' сообщается в начале её токена, о
+    # незакрытом блоке — в конце входа, об остальном — не раньше конца токена
+    if error.code == 'L014':
+        return False
+    return offset < boundary or (offset == boundary and error.code != 'L013')
+
+
+def _unmatched(errors: Iterable[Diagnostic]) -> int:
+    return sum(1 for error in errors if error.code == 'L013')
+
+
+def _block_depth(types, unmatched: int) -> int:
+    # Глубина блоков после токенов types, среди которых unmatched лишних '}'
+    return types.count(TokenType.LBRACE.value) - types.count(TokenType.RBRACE.value) + unmatched
+
+
+def _extra_braces(old: TokenBuffer, first: int, depth: int, old_depth: int) -> List[int]:
+    # Смещения '}' начиная с токена first, которые при глубине depth вместо
+    # old_depth остаются без открывающей. Глубины сходятся, как только
+    # '}' закрывает последний блок при меньшей из них
+    braces = []
+    types = old.types
+    lbrace, rbrace = TokenType.LBRACE.value, TokenType.RBRACE.value
+    for index in range(first, len(types)):
+        if depth == old_depth:
+            break
+        token_type = types[index]
+        if token_type == lbrace:
+            depth += 1
+            old_depth += 1
+        elif token_type == rbrace:
+            if depth:
+                depth -= 1
+            else:
+                braces.append(old.starts[index])
+            old_depth -= 1
+    return braces
+
+
+def _simple(token_type: TokenType) -> Callable[[Scanner], None]:
+    def handler(scanner: Scanner) -> None:
+        scanner.add_token(token_type)
+    return handler
+
+
+def _with_assign(plain: TokenType, assign: TokenType) -> Callable[[Scanner], None]:
+    # Оператор из одного символа или он же с '='
+    def handler(scanner: Scanner) -> None:
+        scanner.add_token(assign if scanner.match('=') else plain)
+    return handler
+
+
+# Обработчик по коду первого символа токена (только ASCII). В таблице
+# функции Scanner, поэтому подклассы переопределяют scan_token целиком
+_DISPATCH: List[Optional[Callable[[Scanner], None]]] = [None] * 128
+
+for _char, _token_type in {
+    '(': TokenType.LPAREN,
+    ')': TokenType.RPAREN,
+    '{': TokenType.LBRACE,
+    '}': TokenType.RBRACE,
+    '[': TokenType.LBRACKET,
+    ']': TokenType.RBRACKET,
+    ',': TokenType.COMMA,
+    ';': TokenType.SEMICOLON,
+    ':': TokenType.COLON,
+    '.': TokenType.DOT,
+    '%': TokenType.PERCENT,
+}.items():
+    _DISPATCH[ord(_char)] = _simple(_token_type)
+
+for _char, (_plain, _assign) in {
+    '*': (TokenType.STAR, TokenType.STAR_ASSIGN),
+    '!': (TokenType.NOT, TokenType.NEQ),
+    '=': (TokenType.ASSIGN, TokenType.EQ),
+    '<': (TokenType.LT, TokenType.LEQ),
+    '>': (TokenType.GT, TokenType.GEQ),
+}.items():
+    _DISPATCH[ord(_char)] = _with_assign(_plain, _assign)
+
+for _char, _handler in {
+    '+': Scanner.plus,
+    '-': Scanner.minus,
+    '/': Scanner.slash,
+    '&': Scanner.ampersand,
+    '|': Scanner.pipe,
+    '"': Scanner.string,
+    ' ': Scanner.skip_whitespace,
+    '\t': Scanner.skip_whitespace,
+    '\r': Scanner.carriage_return,
+    '\n': Scanner.newline,
+}.items():
+    _DISPATCH[ord(_char)] = _handler
+
+for _code in range(128):
+    if _DISPATCH[_code] is None:
+        if _ASCII_CLASS[_code] & _DIGIT:
+            _DISPATCH[_code] = Scanner.number
+        elif _ASCII_CLASS[_code] & _ALPHA:
+            _DISPATCH[_code] = Scanner.identifier
+
+del _char, _code, _token_type, _plain, _assign, _handler
@@ -0,0 +1,188 @@
+import struct
+from sys import intern
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .token import Token, TokenType
+
+
+# Двоичный формат потока токенов:
+#   заголовок   MAGIC, версия формата, число строк, токенов и ошибок
+#   строки      длина + UTF-8; общая таблица для лексем, строковых
+#               литералов и сообщений об ошибках (повторы хранятся один раз)
+#   токены      записи фиксированной длины _RECORD
+#   ошибки      индексы в таблице строк
+MAGIC = b'TOKS'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<4sHIII')
+_LENGTH = struct.Struct('<I')
+# Тип, индекс лексемы, строка, колонка, тег литерала, значение литерала
+_RECORD = struct.Struct('<BIIIBq')
+_TYPE_FIELD = struct.Struct('<B')
+_FLOAT = struct.Struct('<d')
+_INT64 = struct.Struct('<q')
+
+_NONE, _INT, _FLOAT_BITS, _BOOL, _BIG_INT, _STRING = range(6)
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+_TYPES = {token_type.value: token_type for token_type in TokenType}
+
+
+class SerializationError(Exception):
+    pass
+
+
+def dump_tokens(tokens: Iterable[Token], errors: Iterable[Any]) -> bytes:
+    # tokens может быть генератором (Scanner.iter_tokens): errors читаются
+    # после того, как все токены получены
+    strings: List[str] = []
+    indexes: Dict[str, int] = {}
+
+    def string_index(text: str) -> int:
+        index = indexes.get(text)
+        if index is None:
+            index = indexes[text] = len(strings)
+            strings.append(text)
+        return index
+
+    records = []
+    pack = _RECORD.pack
+    for token in tokens:
+        value = token.literal_value
+        # bool проверяется раньше int: bool — подкласс int
+        if value is None:
+            tag, payload = _NONE, 0
+        elif value is True or value is False:
+            tag, payload = _BOOL, int(value)
+        elif isinstance(value, int):
+            if _INT64_MIN <= value <= _INT64_MAX:
+                tag, payload = _INT, value
+            else:
+                tag, payload = _BIG_INT, string_index(str(value))
+        elif isinstance(value, float):
+            tag, payload = _FLOAT_BITS, _INT64.unpack(_FLOAT.pack(value))[0]
+        elif isinstance(value, str):
+            tag, payload = _STRING, string_index(value)
+        else:
+            raise SerializationError(f"Неподдерживаемое значение литерала: {value!r}")
+        records.append(pack(token.token_type.value, string_index(token.lexeme),
+                            token.line, token.column, tag, payload))
+
+    # Диагностики сохраняются в отформатированном виде
+    error_indexes = [string_index(str(error)) for error in errors]
+
+    parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, len(strings), len(records), len(error_indexes))]
+    for text in strings:
+        data = text.encode('utf-8', 'surrogatepass')
+        parts.append(_LENGTH.pack(len(data)))
+        parts.append(data)
+    parts.extend(records)
+    parts.extend(_LENGTH.pack(index) for index in error_indexes)
+    return b''.join(parts)
+
+
+def load_tokens(data: bytes) -> Tuple[List[Token], List[str]]:
+    reader = TokenStreamReader(data)
+    return list(reader), reader.errors
+
+
+# Чтение без копирования: буфер оборачивается в memoryview, записи токенов
+# разбираются struct прямо из него при обращении, строки декодируются по
+# требованию. Поддерживает len() и индексацию, поэтому Parser принимает
+# его вместо списка токенов.
+class TokenStreamReader:
+
+    def __init__(self, data):
+        self.view = view = memoryview(data)
+        try:
+            magic, version, string_count, token_count, error_count = _HEADER.unpack_from(view, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise SerializationError("Неизвестный формат потока токенов")
+            offset = _HEADER.size
+
+            self._string_spans = []
+            for _ in range(string_count):
+                length, = _LENGTH.unpack_from(view, offset)
+                offset += _LENGTH.size
+                self._string_spans.append((offset, offset + length))
+                offset += length
+            self._strings: List[Optional[str]] = [None] * string_count
+
+            self._records = offset
+            self._count = token_count
+            # Parser обращается к текущему, предыдущему и следующему токену
+            # много раз подряд: недавние токены не разбираются повторно
+            self._recent: Dict[int, Token] = {}
+            offset += token_count * _RECORD.size
+            if offset + error_count * _LENGTH.size > len(view):
+                raise SerializationError("Поток токенов обрезан")
+            self.errors = [self._string(index)
+                           for index, in _LENGTH.iter_unpack(view[offset:offset + error_count * _LENGTH.size])]
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise SerializationError(f"Повреждённый поток токенов: {e}") from None
+
+    def _string(self, index: int) -> str:
+        text = self._strings[index]
+        if text is None:
+            start, end = self._string_spans[index]
+            if end > len(self.view):
+                raise SerializationError("Поток токенов обрезан")
+            text = self._strings[index] = intern(str(self.view[start:end], 'utf-8', 'surrogatepass'))
+        return text
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> Token:
+        if index < 0:
+            index += self._count
+        token = self._recent.get(index)
+        if token is not None:
+            return token
+        if not 0 <= index < self._count:
+            raise IndexError("Индекс токена вне диапазона")
+        record = _RECORD.unpack_from(self.view, self._records + index * _RECORD.size)
+        token = self._token(*record)
+        if len(self._recent) >= 8:
+            self._recent.clear()
+        self._recent[index] = token
+        return token
+
+    def token_type(self, index: int) -> TokenType:
+        # Тип токена без разбора остальной записи (см. Parser.advance)
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("Индекс токена вне диапазона")
+        type_value, = _TYPE_FIELD.unpack_from(self.view, self._records + index * _RECORD.size)
+        try:
+            return _TYPES[type_value]
+        except KeyError as e:
+            raise SerializationError(f"Повреждённый поток токенов: {e}") from None
+
+    def __iter__(self) -> Iterator[Token]:
+        records = self.view[self._records:self._records + self._count * _RECORD.size]
+        token = self._token
+        for record in _RECORD.iter_unpack(records):
+            yield token(*record)
+
+    def _token(self, type_value: int, lexeme: int, line: int, column: int, tag: int, payload: int) -> Token:
+        try:
+            if tag == _NONE:
+                value = None
+            elif tag == _INT:
+                value = payload
+            elif tag == _STRING:
+                value = self._string(payload)
+            elif tag == _BOOL:
+                value = bool(payload)
+            elif tag == _FLOAT_BITS:
+                value = _FLOAT.unpack(_INT64.pack(payload))[0]
+            elif tag == _BIG_INT:
+                value = int(self._string(payload))
+            else:
+                raise SerializationError(f"Неизвестный тег литерала: {tag}")
+            return Token(_TYPES[type_value], self._string(lexeme), line, column, value)
+        except (KeyError, IndexError, ValueError, UnicodeDecodeError) as e:
+            raise SerializationError(f"Повреждённый поток токенов: {e}") from None
@@ -0,0 +1,87 @@
+import codecs
+import io
+import mmap
+from typing import Dict, Optional, Type
+
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+# Источники входа для Scanner, который не держит весь файл в памяти.
+# read() возвращает следующий декодированный фрагмент или '' в конце.
+# Переводы строк нормализуются так же, как в Path.read_text, поэтому
+# токены совпадают с чтением файла целиком.
+class SourceReader:
+
+    def read(self) -> str:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ChunkedReader(SourceReader):
+    # Фрагменты фиксированного размера в символах через текстовый файл
+
+    def __init__(self, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: str = 'utf-8'):
+        self.chunk_size = chunk_size
+        self.file = open(path, 'r', encoding=encoding)
+
+    def read(self) -> str:
+        return self.file.read(self.chunk_size)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class MmapReader(SourceReader):
+    # Файл отображается в память, фрагменты декодируются инкрементально:
+    # многобайтовые символы и '\r\n' на границе фрагментов не разрываются
+
+    def __init__(self, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: str = 'utf-8'):
+        self.chunk_size = chunk_size
+        self.position = 0
+        self.decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(encoding)(), translate=True)
+
+        self.map: Optional[mmap.mmap] = None
+        with open(path, 'rb') as file:
+            # Пустой файл отобразить нельзя
+            if file.seek(0, io.SEEK_END):
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self.map) if self.map is not None else 0
+
+    def read(self) -> str:
+        while self.position < self.size:
+            end = min(self.position + self.chunk_size, self.size)
+            data = self.map[self.position:end]
+            self.position = end
+            text = self.decoder.decode(data, final=end == self.size)
+            if text:
+                return text
+        return self.decoder.decode(b'', final=True)
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+READERS: Dict[str, Type[SourceReader]] = {
+    'chunked': ChunkedReader,
+    'mmap': MmapReader,
+}
+
+
+def open_reader(path: str, mode: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> SourceReader:
+    try:
+        reader_class = READERS[mode]
+    except KeyError:
+        raise ValueError(f"Неизвестный способ чтения: {mode}") from None
+    return reader_class(path, chunk_size)
@@ -77,6 +77,8 @@ class TokenType(Enum):
 
 class Token:
 
+    __slots__ = ('token_type', 'lexeme', 'line', 'column', 'literal_value')
+
     def __init__(
             self,
             token_type: TokenType,
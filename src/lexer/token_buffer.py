@@ -0,0 +1,160 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from sys import intern
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .line_index import LineIndex
+from .token import Token, TokenType
+
+
+_TYPES = {token_type.value: token_type for token_type in TokenType}
+
+
+# Колоночное хранилище токенов: параллельные массивы чисел вместо списка
+# объектов Token, лексемы и значения литералов вычисляются по требованию из
+# исходника, строка и колонка — по смещению через LineIndex сканера.
+# Поддерживает len() и индексацию, поэтому Parser принимает его вместо
+# списка токенов.
+class TokenBuffer:
+
+    def __init__(self, source: str, line_index: LineIndex):
+        self.source = source
+        self.line_index = line_index
+        self.types = array('i')
+        # Смещения 64-битные: исходники бывают больше 2 ГБ
+        self.starts = array('q')
+        self.ends = array('q')
+        # Редкие исключения: лексема не совпадает со срезом исходника
+        # (отрицательные числа, незакрытые строки, EOF) или значение
+        # строкового литерала отличается от текста между кавычками
+        self._lexemes: Dict[int, str] = {}
+        self._literals: Dict[int, Any] = {}
+
+        self._cached_index = -1
+        self._cached_token: Optional[Token] = None
+
+    def add(self, token_type: TokenType, lexeme: str, line: int, column: int,
+            literal_value: Any, start: int, end: int) -> None:
+        # line и column не хранятся: их восстанавливает line_index по start
+        index = len(self.types)
+        source = self.source
+
+        self.types.append(token_type.value)
+        self.starts.append(start)
+        self.ends.append(end)
+
+        if len(lexeme) != end - start or not source.startswith(lexeme, start):
+            self._lexemes[index] = lexeme
+
+        if token_type is TokenType.STRING_LITERAL:
+            if (index in self._lexemes or len(literal_value) != end - start - 2
+                    or not source.startswith(literal_value, start + 1)):
+                self._literals[index] = literal_value
+        elif token_type is TokenType.EOF:
+            self._literals[index] = literal_value
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> Token:
+        if index < 0:
+            index += len(self.types)
+        if index == self._cached_index:
+            return self._cached_token
+
+        token_type = _TYPES[self.types[index]]
+        start = self.starts[index]
+        end = self.ends[index]
+        lexeme = self._lexemes.get(index)
+        if lexeme is None:
+            lexeme = intern(self.source[start:end])
+
+        line, column = self.line_index.position(start)
+        token = Token(
+            token_type,
+            lexeme,
+            line,
+            column,
+            self._literal(index, token_type, start, end)
+        )
+        self._cached_index = index
+        self._cached_token = token
+        return token
+
+    def __iter__(self) -> Iterator[Token]:
+        for index in range(len(self.types)):
+            yield self[index]
+
+    def copy_prefix(self, source: str, count: int, line_index: LineIndex) -> 'TokenBuffer':
+        # Первые count токенов в новом буфере над изменённым исходником
+        buffer = TokenBuffer(source, line_index)
+        buffer.types = self.types[:count]
+        buffer.starts = self.starts[:count]
+        buffer.ends = self.ends[:count]
+        buffer._lexemes = {i: v for i, v in self._lexemes.items() if i < count}
+        buffer._literals = {i: v for i, v in self._literals.items() if i < count}
+        return buffer
+
+    def extend_shifted(self, other: 'TokenBuffer', first: int, offset_delta: int) -> None:
+        # Дописывает токены other начиная с first, сдвинутые после правки;
+        # строки и колонки следуют из line_index
+        base = len(self.types) - first
+        self.types.extend(other.types[first:])
+        self.starts.extend(map(offset_delta.__add__, other.starts[first:]))
+        self.ends.extend(map(offset_delta.__add__, other.ends[first:]))
+
+        for i, v in other._lexemes.items():
+            if i >= first:
+                self._lexemes[i + base] = v
+        for i, v in other._literals.items():
+            if i >= first:
+                self._literals[i + base] = v
+
+    def position(self, index: int) -> Tuple[int, int]:
+        return self.line_index.position(self.starts[index])
+
+    def index_at(self, offset: int) -> Optional[int]:
+        # Токен, которому принадлежит символ offset; None между токенами
+        index = bisect_right(self.starts, offset) - 1
+        if index >= 0 and offset < self.ends[index]:
+            return index
+        return None
+
+    def indices_between(self, start: int, end: int) -> range:
+        # Токены, пересекающие смещения [start, end)
+        return range(bisect_right(self.ends, start), bisect_left(self.starts, end))
+
+    def indices_on_line(self, line: int) -> range:
+        bounds = self.line_index.line_bounds(line)
+        if bounds is None:
+            return range(0)
+        start, end = bounds
+        first = bisect_left(self.starts, start)
+        last = len(self.starts) if end is None else bisect_left(self.starts, end)
+        return range(first, last)
+
+    def token_type(self, index: int) -> TokenType:
+        # Тип токена без создания Token (см. Parser.advance)
+        return _TYPES[self.types[index]]
+
+    def _literal(self, index: int, token_type: TokenType, start: int, end: int) -> Any:
+        if index in self._literals:
+            return self._literals[index]
+
+        # Значения чисел вычисляются из того же среза, что и в Scanner.number
+        match token_type:
+            case TokenType.INT_LITERAL:
+                try:
+                    return int(self.source[start:end])
+                except ValueError:
+                    return 0
+            case TokenType.FLOAT_LITERAL:
+                try:
+                    return float(self.source[start:end])
+                except ValueError:
+                    return 0.0
+            case TokenType.BOOL_LITERAL:
+                return self.source[start:end] == 'true'
+            case TokenType.STRING_LITERAL:
+                return self.source[start + 1:end - 1]
+        return None
@@ -1,4 +1,51 @@
 import json
+from types import GeneratorType
+
+
+# Обходы дерева не рекурсивны: глубина вложенности узлов ограничена только
+# памятью. Текст строится из частей на явном стеке (render), обход
+# посетителем — генераторами (walk)
+
+
+def walk(walker, dispatch):
+    # walker — генератор, который отдаёт (yield) узел-потомок и получает
+    # результат его обхода; dispatch(node) — результат обхода узла:
+    # значение или такой же генератор. Потомок None даёт None
+    stack = [walker]
+    value = None
+    while True:
+        try:
+            child = stack[-1].send(value)
+        except StopIteration as stop:
+            stack.pop()
+            if not stack:
+                return stop.value
+            value = stop.value
+            continue
+
+        value = None if child is None else dispatch(child)
+        if isinstance(value, GeneratorType):
+            stack.append(value)
+            value = None
+
+
+def render(root, expand):
+    # Текст дерева: expand(item) -> части текста по порядку; строки
+    # выводятся как есть, остальные части раскрываются тем же expand
+    out = []
+    stack = [root]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            out.append(item)
+        else:
+            stack.extend(reversed(expand(item)))
+    return "".join(out)
+
+
+def visit_method(visitor, node):
+    method_name = f'visit_{node.__class__.__name__}'
+    return getattr(visitor, method_name, visitor.generic_visit)
 
 
 class ASTNode:
@@ -8,36 +55,51 @@ class ASTNode:
         self.column = column
 
     def accept(self, visitor):
-        method_name = f'visit_{self.__class__.__name__}'
-        visitor_method = getattr(visitor, method_name, visitor.generic_visit)
-        return visitor_method(self)
+        # У ASTVisitor выбор метода — dispatch, у прочих посетителей —
+        # visit_* или generic_visit
+        dispatch = getattr(visitor, 'dispatch', None)
+        if dispatch is None:
+            def dispatch(node):
+                return visit_method(visitor, node)(node)
+        result = dispatch(self)
+        if isinstance(result, GeneratorType):
+            # Метод-генератор обходит потомков через yield (см. walk)
+            return walk(result, dispatch)
+        return result
 
     def to_dict(self):
-        result = {
-            "type": self.__class__.__name__,
-            "line": self.line,
-            "column": self.column
-        }
-
-        for name, value in self.__dict__.items():
-            if name in ("line", "column"):
-                continue
-
-            if isinstance(value, ASTNode):
-                result[name] = value.to_dict()
-            elif isinstance(value, list):
-                result[name] = [
-                    item.to_dict() if isinstance(item, ASTNode) else item
-                    for item in value
-                ]
-            elif hasattr(value, "lexeme"):
-                result[f"{name}"] = value.lexeme
-            elif hasattr(value, "value") and hasattr(value, "token_type"):
-                result[f"{name}"] = value.lexeme
-            else:
-                result[name] = value
-
-        return result
+        # Словари вложенных узлов заполняются со стека: (узел, его словарь)
+        root = {}
+        stack = [(self, root)]
+        while stack:
+            node, result = stack.pop()
+            result["type"] = node.__class__.__name__
+            result["line"] = node.line
+            result["column"] = node.column
+
+            for name, value in node.__dict__.items():
+                if name in ("line", "column"):
+                    continue
+
+                if isinstance(value, ASTNode):
+                    child = result[name] = {}
+                    stack.append((value, child))
+                elif isinstance(value, list):
+                    items = result[name] = []
+                    for item in value:
+                        if isinstance(item, ASTNode):
+                            child = {}
+                            stack.append((item, child))
+                            item = child
+                        items.append(item)
+                elif hasattr(value, "lexeme"):
+                    result[f"{name}"] = value.lexeme
+                elif hasattr(value, "value") and hasattr(value, "token_type"):
+                    result[f"{name}"] = value.lexeme
+                else:
+                    result[name] = value
+
+        return root
 
 
 class DeclarationNode(ASTNode):
@@ -206,138 +268,211 @@ class StructAccessExprNode(ExpressionNode):
         self.field = field  # Токен идентификатора
 
 def expr_to_str(expr):
+    return render(expr, _expr_parts)
+
+
+def literal_to_str(value):
+    if isinstance(value, str):
+        return f'"{value}"'
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _expr_parts(expr):
     if expr is None:
-        return ""
+        return []
 
     if isinstance(expr, LiteralExprNode):
-        if isinstance(expr.value, str):
-            return f'"{expr.value}"'
-        if isinstance(expr.value, bool):
-            return "true" if expr.value else "false"
-        return str(expr.value)
+        return [literal_to_str(expr.value)]
 
     if isinstance(expr, IdentifierExprNode):
-        return expr.name.lexeme if hasattr(expr.name, 'lexeme') else str(expr.name)
+        return [expr.name.lexeme if hasattr(expr.name, 'lexeme') else str(expr.name)]
 
     if isinstance(expr, BinaryExprNode):
-        return f"({expr_to_str(expr.left)} {expr.operator.lexeme} {expr_to_str(expr.right)})"
+        return ["(", expr.left, f" {expr.operator.lexeme} ", expr.right, ")"]
 
     if isinstance(expr, UnaryExprNode):
         if hasattr(expr, 'is_postfix') and expr.is_postfix:
-            return f"({expr_to_str(expr.operand)}{expr.operator.lexeme})"
+            return ["(", expr.operand, expr.operator.lexeme, ")"]
         else:
-            return f"({expr.operator.lexeme}{expr_to_str(expr.operand)})"
+            return ["(", expr.operator.lexeme, expr.operand, ")"]
 
     if isinstance(expr, AssignmentExprNode):
-        return f"({expr_to_str(expr.target)} {expr.operator.lexeme} {expr_to_str(expr.value)})"
+        return ["(", expr.target, f" {expr.operator.lexeme} ", expr.value, ")"]
 
     if isinstance(expr, CallExprNode):
-        args = ", ".join(expr_to_str(a) for a in expr.arguments)
-        return f"{expr_to_str(expr.callee)}({args})"
+        return [expr.callee, "("] + joined(expr.arguments, ", ") + [")"]
 
     if isinstance(expr, StructAccessExprNode):
-        return f"{expr_to_str(expr.primary)}.{expr.field.lexeme}"
+        return [expr.primary, f".{expr.field.lexeme}"]
 
     if isinstance(expr, ExprStmtNode):
-        return expr_to_str(expr.expression)
+        return [expr.expression]
+
+    return [str(expr)]
+
 
-    return str(expr)
+def joined(items, separator, prefix=None):
+    # Части для separator.join: элементы раскрываются при выводе
+    parts = []
+    for index, item in enumerate(items):
+        if index:
+            parts.append(separator)
+        if prefix is not None:
+            parts.append(prefix)
+        parts.append(item)
+    return parts
 
 
 def pretty_print(node, indent=0):
+    # Части — строки, (узел, отступ) и позиция в out: там начинается текст
+    # узла, от конца которого отбрасываются пробельные символы (rstrip)
+    out = []
+    stack = [(node, indent)]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            out.append(item)
+        elif isinstance(item, int):
+            while len(out) > item:
+                text = out[-1].rstrip()
+                if text:
+                    out[-1] = text
+                    break
+                out.pop()
+        else:
+            if isinstance(item[0], _STRIPPED):
+                stack.append(len(out))
+            stack.extend(reversed(_pretty_parts(*item)))
+    return "".join(out)
+
+
+def _pretty_parts(node, indent):
     pad = "  " * indent
 
     if isinstance(node, ProgramNode):
-        result = f"{pad}Program:\n"
+        parts = [f"{pad}Program:\n"]
         for decl in node.declarations:
-            result += pretty_print(decl, indent + 1) + "\n"
-        return result.rstrip()
+            parts += [(decl, indent + 1), "\n"]
+        return parts
 
     if isinstance(node, FunctionDeclNode):
         ret = node.return_type.lexeme if node.return_type else "void"
-        result = f"{pad}FunctionDecl: {node.name.lexeme} -> {ret}\n"
-        result += f"{pad}  Parameters:\n"
+        parts = [f"{pad}FunctionDecl: {node.name.lexeme} -> {ret}\n"]
+        parts.append(f"{pad}  Parameters:\n")
         if node.parameters:
             for p in node.parameters:
-                result += pretty_print(p, indent + 2) + "\n"
+                parts += [(p, indent + 2), "\n"]
         else:
-            result += f"{pad}    []\n"
-        result += f"{pad}  Body:\n"
-        result += pretty_print(node.body, indent + 2)
-        return result
+            parts.append(f"{pad}    []\n")
+        parts.append(f"{pad}  Body:\n")
+        parts.append((node.body, indent + 2))
+        return parts
 
     if isinstance(node, ParamNode):
-        return f"{pad}{node.type.lexeme} {node.name.lexeme}"
+        return [f"{pad}{node.type.lexeme} {node.name.lexeme}"]
 
     if isinstance(node, StructDeclNode):
-        result = f"{pad}StructDecl: {node.name.lexeme}\n"
+        parts = [f"{pad}StructDecl: {node.name.lexeme}\n"]
         for field in node.fields:
-            result += pretty_print(field, indent + 1) + "\n"
-        return result.rstrip()
+            parts += [(field, indent + 1), "\n"]
+        return parts
 
     if isinstance(node, BlockStmtNode):
-        result = f"{pad}Block:\n"
+        parts = [f"{pad}Block:\n"]
         for stmt in node.statements:
             if isinstance(stmt, ExprStmtNode):
-                result += f"{pad}  {expr_to_str(stmt.expression)}\n"
+                parts.append(f"{pad}  {expr_to_str(stmt.expression)}\n")
             else:
-                result += pretty_print(stmt, indent + 1) + "\n"
-        return result.rstrip()
+                parts += [(stmt, indent + 1), "\n"]
+        return parts
 
     if isinstance(node, VarDeclStmtNode):
         init = ""
         if node.initializer:
             init = f" = {expr_to_str(node.initializer)}"
-        return f"{pad}VarDecl: {node.type.lexeme} {node.name.lexeme}{init}"
+        return [f"{pad}VarDecl: {node.type.lexeme} {node.name.lexeme}{init}"]
 
     if isinstance(node, ReturnStmtNode):
         if node.value:
-            return f"{pad}Return: {expr_to_str(node.value)}"
-        return f"{pad}Return"
+            return [f"{pad}Return: {expr_to_str(node.value)}"]
+        return [f"{pad}Return"]
 
     if isinstance(node, ExprStmtNode):
-        return f"{pad}{expr_to_str(node.expression)}"
+        return [f"{pad}{expr_to_str(node.expression)}"]
 
     if isinstance(node, IfStmtNode):
-        result = f"{pad}IfStmt\n"
-        result += f"{pad}  Condition:\n"
-        result += f"{pad}    {expr_to_str(node.condition)}\n"
-        result += f"{pad}  Then:\n"
-        result += pretty_print(node.then_branch, indent + 2)
+        parts = [f"{pad}IfStmt\n"]
+        parts.append(f"{pad}  Condition:\n")
+        parts.append(f"{pad}    {expr_to_str(node.condition)}\n")
+        parts.append(f"{pad}  Then:\n")
+        parts.append((node.then_branch, indent + 2))
         if node.else_branch:
-            result += "\n"
-            result += f"{pad}  Else:\n"
-            result += pretty_print(node.else_branch, indent + 2)
-        return result
+            parts.append("\n")
+            parts.append(f"{pad}  Else:\n")
+            parts.append((node.else_branch, indent + 2))
+        return parts
 
     if isinstance(node, WhileStmtNode):
-        result = f"{pad}WhileStmt\n"
-        result += f"{pad}  Condition:\n"
-        result += f"{pad}    {expr_to_str(node.condition)}\n"
-        result += f"{pad}  Body:\n"
-        result += pretty_print(node.body, indent + 2)
-        return result
+        parts = [f"{pad}WhileStmt\n"]
+        parts.append(f"{pad}  Condition:\n")
+        parts.append(f"{pad}    {expr_to_str(node.condition)}\n")
+        parts.append(f"{pad}  Body:\n")
+        parts.append((node.body, indent + 2))
+        return parts
 
     if isinstance(node, ForStmtNode):
-        result = f"{pad}ForStmt\n"
+        parts = [f"{pad}ForStmt\n"]
         if node.init:
-            result += f"{pad}  Init:\n"
-            result += f"{pad}    {expr_to_str(node.init)}\n"
+            parts.append(f"{pad}  Init:\n")
+            parts.append(f"{pad}    {expr_to_str(node.init)}\n")
         if node.condition:
-            result += f"{pad}  Condition:\n"
-            result += f"{pad}    {expr_to_str(node.condition)}\n"
+            parts.append(f"{pad}  Condition:\n")
+            parts.append(f"{pad}    {expr_to_str(node.condition)}\n")
         if node.update:
-            result += f"{pad}  Update:\n"
-            result += f"{pad}    {expr_to_str(node.update)}\n"
-        result += f"{pad}  Body:\n"
-        result += pretty_print(node.body, indent + 2)
-        return result
+            parts.append(f"{pad}  Update:\n")
+            parts.append(f"{pad}    {expr_to_str(node.update)}\n")
+        parts.append(f"{pad}  Body:\n")
+        parts.append((node.body, indent + 2))
+        return parts
+
+    return [str(node)]
 
-    return str(node)
+
+# Узлы, текст которых pretty_print обрезает справа
+_STRIPPED = (ProgramNode, StructDeclNode, BlockStmtNode)
 
 
 def ast_to_json(ast):
-    return json.dumps(ast.to_dict(), indent=2, ensure_ascii=False)
+    # Тот же текст, что json.dumps(ast.to_dict(), indent=2,
+    # ensure_ascii=False), без рекурсии по вложенным словарям
+    return render((ast.to_dict(), 0), _json_parts)
+
+
+_json_scalar = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def _json_parts(item):
+    value, level = item
+    if isinstance(value, dict):
+        items = [(_json_scalar(key) + ": ", child) for key, child in value.items()]
+        brackets = "{}"
+    elif isinstance(value, (list, tuple)):
+        items = [("", child) for child in value]
+        brackets = "[]"
+    else:
+        return [_json_scalar(value)]
+
+    if not items:
+        return [brackets]
+    inner = "\n" + "  " * (level + 1)
+    parts = [brackets[0]]
+    for index, (key, child) in enumerate(items):
+        parts.append(("," if index else "") + inner + key)
+        parts.append((child, level + 1))
+    parts.append("\n" + "  " * level + brackets[1])
+    return parts
 
 
 def generate_dot(ast):
@@ -392,116 +527,118 @@ def generate_dot(ast):
 
         return escape(label)
 
-    def visit(node):
-        if node is None:
-            return
-
-        node_id = f"n{id(node)}"
-        if node_id in visited:
-            return
-        visited.add(node_id)
-
-        lines.append(
-            f'  {node_id} [label="{make_label(node)}", fillcolor="{node_style(node)}"];'
-        )
-
+    def children(node):
         for attr_name, attr in node.__dict__.items():
             if attr_name in ("line", "column"):
                 continue
 
             if isinstance(attr, ASTNode):
-                child_id = f"n{id(attr)}"
-                visit(attr)
-                lines.append(f'  {node_id} -> {child_id} [label="{attr_name}"];')
+                yield attr_name, attr
 
             elif isinstance(attr, list):
                 for idx, item in enumerate(attr):
                     if isinstance(item, ASTNode):
-                        child_id = f"n{id(item)}"
-                        visit(item)
-                        lines.append(f'  {node_id} -> {child_id} [label="{attr_name}[{idx}]"];')
+                        yield f"{attr_name}[{idx}]", item
+
+    def enter(node, stack, edge):
+        node_id = f"n{id(node)}"
+        visited.add(node_id)
+        lines.append(
+            f'  {node_id} [label="{make_label(node)}", fillcolor="{node_style(node)}"];'
+        )
+        stack.append((node_id, children(node), edge))
+
+    # Обход в глубину явным стеком: (id узла, его потомки, ребро от
+    # родителя). Ребро выводится после поддерева потомка
+    stack = []
+    if ast is not None:
+        enter(ast, stack, None)
+    while stack:
+        node_id, node_children, edge = stack[-1]
+        child = next(node_children, None)
+        if child is None:
+            stack.pop()
+            if edge is not None:
+                lines.append(edge)
+            continue
+
+        attr_name, attr = child
+        child_id = f"n{id(attr)}"
+        edge = f'  {node_id} -> {child_id} [label="{attr_name}"];'
+        if child_id in visited:
+            lines.append(edge)
+        else:
+            enter(attr, stack, edge)
 
-    visit(ast)
     lines.append("}")
     return "\n".join(lines)
 
 
 def ast_to_code(ast):
+    return render(ast, _code_parts)
+
+
+def _code_parts(ast):
     if isinstance(ast, ProgramNode):
-        result = []
-        for decl in ast.declarations:
-            result.append(ast_to_code(decl))
-        return "\n".join(result)
+        return joined(ast.declarations, "\n")
 
     if isinstance(ast, FunctionDeclNode):
         params = ", ".join([f"{p.type.lexeme} {p.name.lexeme}" for p in ast.parameters])
         ret = f" -> {ast.return_type.lexeme}" if ast.return_type else ""
-        body = ast_to_code(ast.body)
-        return f"fn {ast.name.lexeme}({params}){ret} {body}"
+        return [f"fn {ast.name.lexeme}({params}){ret} ", ast.body]
 
     if isinstance(ast, StructDeclNode):
-        fields = "\n".join([f"    {ast_to_code(f)}" for f in ast.fields])
-        return f"struct {ast.name.lexeme} {{\n{fields}\n}}"
+        return [f"struct {ast.name.lexeme} {{\n"] + joined(ast.fields, "\n", "    ") + ["\n}"]
 
     if isinstance(ast, BlockStmtNode):
-        stmts = "\n".join([f"    {ast_to_code(s)}" for s in ast.statements])
-        return f"{{\n{stmts}\n}}"
+        return ["{\n"] + joined(ast.statements, "\n", "    ") + ["\n}"]
 
     if isinstance(ast, VarDeclStmtNode):
-        init = f" = {ast_to_code(ast.initializer)}" if ast.initializer else ""
-        return f"{ast.type.lexeme} {ast.name.lexeme}{init};"
+        if ast.initializer:
+            return [f"{ast.type.lexeme} {ast.name.lexeme} = ", ast.initializer, ";"]
+        return [f"{ast.type.lexeme} {ast.name.lexeme};"]
 
     if isinstance(ast, ReturnStmtNode):
-        val = f" {ast_to_code(ast.value)}" if ast.value else ""
-        return f"return{val};"
+        if ast.value:
+            return ["return ", ast.value, ";"]
+        return ["return;"]
 
     if isinstance(ast, ExprStmtNode):
-        return f"{ast_to_code(ast.expression)};"
+        return [ast.expression, ";"]
 
     if isinstance(ast, IfStmtNode):
-        cond = ast_to_code(ast.condition)
-        then_branch = ast_to_code(ast.then_branch)
-        else_branch = f" else {ast_to_code(ast.else_branch)}" if ast.else_branch else ""
-        return f"if ({cond}) {then_branch}{else_branch}"
+        parts = ["if (", ast.condition, ") ", ast.then_branch]
+        if ast.else_branch:
+            parts += [" else ", ast.else_branch]
+        return parts
 
     if isinstance(ast, WhileStmtNode):
-        cond = ast_to_code(ast.condition)
-        body = ast_to_code(ast.body)
-        return f"while ({cond}) {body}"
+        return ["while (", ast.condition, ") ", ast.body]
 
     if isinstance(ast, ForStmtNode):
-        init = ast_to_code(ast.init) if ast.init else ""
-        cond = ast_to_code(ast.condition) if ast.condition else ""
-        update = ast_to_code(ast.update) if ast.update else ""
-        body = ast_to_code(ast.body)
-        return f"for ({init}; {cond}; {update}) {body}"
+        return ["for (", ast.init or "", "; ", ast.condition or "", "; ", ast.update or "", ") ", ast.body]
 
     if isinstance(ast, BinaryExprNode):
-        return f"({ast_to_code(ast.left)} {ast.operator.lexeme} {ast_to_code(ast.right)})"
+        return ["(", ast.left, f" {ast.operator.lexeme} ", ast.right, ")"]
 
     if isinstance(ast, UnaryExprNode):
         if hasattr(ast, 'is_postfix') and ast.is_postfix:
-            return f"({ast_to_code(ast.operand)}{ast.operator.lexeme})"
-        return f"({ast.operator.lexeme}{ast_to_code(ast.operand)})"
+            return ["(", ast.operand, ast.operator.lexeme, ")"]
+        return ["(", ast.operator.lexeme, ast.operand, ")"]
 
     if isinstance(ast, AssignmentExprNode):
-        return f"({ast_to_code(ast.target)} {ast.operator.lexeme} {ast_to_code(ast.value)})"
+        return ["(", ast.target, f" {ast.operator.lexeme} ", ast.value, ")"]
 
     if isinstance(ast, CallExprNode):
-        args = ", ".join([ast_to_code(a) for a in ast.arguments])
-        return f"{ast_to_code(ast.callee)}({args})"
+        return [ast.callee, "("] + joined(ast.arguments, ", ") + [")"]
 
     if isinstance(ast, LiteralExprNode):
-        if isinstance(ast.value, str):
-            return f'"{ast.value}"'
-        if isinstance(ast.value, bool):
-            return "true" if ast.value else "false"
-        return str(ast.value)
+        return [literal_to_str(ast.value)]
 
     if isinstance(ast, IdentifierExprNode):
-        return ast.name.lexeme
+        return [ast.name.lexeme]
 
     if isinstance(ast, StructAccessExprNode):
-        return f"{ast_to_code(ast.primary)}.{ast.field.lexeme}"
+        return [ast.primary, f".{ast.field.lexeme}"]
 
-    return ""
\ No newline at end of file
+    return []
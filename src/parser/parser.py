@@ -1,3 +1,6 @@
+from types import GeneratorType
+
+from src.lexer.diagnostic import Diagnostic, DiagnosticList, Severity
 from src.lexer.token import TokenType
 from src.parser.ast import *
 
@@ -6,12 +9,94 @@ class ParseError(Exception):
     pass
 
 
+# Классы типов токенов: проверка токена — одна проверка вхождения в
+# множество. EOF не входит ни в один класс
+ASSIGNMENT_OPERATORS = frozenset({
+    TokenType.ASSIGN,
+    TokenType.PLUS_ASSIGN,
+    TokenType.MINUS_ASSIGN,
+    TokenType.STAR_ASSIGN,
+    TokenType.SLASH_ASSIGN,
+})
+TYPE_KEYWORDS = frozenset({
+    TokenType.KW_INT,
+    TokenType.KW_FLOAT,
+    TokenType.KW_BOOL,
+    TokenType.KW_VOID,
+    TokenType.KW_STRING,
+})
+# Токены, на которых synchronize заканчивает пропуск
+SYNC_POINTS = frozenset({
+    TokenType.KW_FN,
+    TokenType.KW_STRUCT,
+    TokenType.KW_IF,
+    TokenType.KW_WHILE,
+    TokenType.KW_FOR,
+    TokenType.KW_RETURN,
+    TokenType.LBRACE,
+    TokenType.RBRACE,
+})
+POSTFIX_OPERATORS = frozenset({
+    TokenType.INCREMENT,
+    TokenType.DECREMENT,
+})
+
+# Приоритеты операторов выражения: больше — связывает сильнее.
+# Присваивание — правоассоциативное, сравнения — неассоциативные,
+# остальные — левоассоциативные
+ASSIGNMENT_PRECEDENCE = 0
+BINARY_PRECEDENCE = {
+    **dict.fromkeys(ASSIGNMENT_OPERATORS, ASSIGNMENT_PRECEDENCE),
+    TokenType.OR: 1,
+    TokenType.AND: 2,
+    TokenType.EQ: 3,
+    TokenType.NEQ: 3,
+    TokenType.LT: 4,
+    TokenType.LEQ: 4,
+    TokenType.GT: 4,
+    TokenType.GEQ: 4,
+    TokenType.PLUS: 5,
+    TokenType.MINUS: 5,
+    TokenType.STAR: 6,
+    TokenType.SLASH: 6,
+    TokenType.PERCENT: 6,
+}
+MAX_PRECEDENCE = 6
+NON_ASSOCIATIVE = frozenset({3, 4})
+
+# Состояния кадров разбора выражения (см. Parser.parseExpression): кадр
+# оператора ждёт левый операнд, правый операнд, операнд после лишнего
+# сравнения или значение присваивания; кадры скобок и аргумента вызова
+_LEFT, _RIGHT, _EXTRA, _VALUE, _PAREN, _ARGUMENT = range(6)
+# Разбор операнда остановился на открытом кадре аргументов вызова
+_NESTED = object()
+
+PREFIX_OPERATORS = frozenset({
+    TokenType.NOT,
+    TokenType.MINUS,
+    TokenType.INCREMENT,
+    TokenType.DECREMENT,
+})
+LITERAL_TYPES = frozenset({
+    TokenType.INT_LITERAL,
+    TokenType.FLOAT_LITERAL,
+    TokenType.STRING_LITERAL,
+    TokenType.BOOL_LITERAL,
+})
+
+
 class Parser:
 
-    def __init__(self, tokens):
+    def __init__(self, tokens, error_limit=None):
         self.tokens = tokens
         self.current = 0
-        self.errors = []
+        self.errors = DiagnosticList(error_limit)
+        # Тип peek(): меняется только при сдвиге позиции, проверки типа
+        # текущего токена не обращаются к tokens. TokenBuffer и
+        # TokenStreamReader отдают тип по индексу без создания Token
+        self._count = len(tokens)
+        self._token_type = getattr(tokens, 'token_type', None)
+        self.current_type = self._type_at(0) if self._count else None
 
     def peek(self):
         if self.current >= len(self.tokens):
@@ -22,17 +107,24 @@ class Parser:
         return self.tokens[self.current - 1]
 
     def isAtEnd(self):
-        return self.peek().token_type == TokenType.EOF
+        return self.current_type == TokenType.EOF
 
     def advance(self):
-        if not self.isAtEnd():
-            self.current += 1
+        self._step()
         return self.previous()
 
+    def _step(self):
+        if self.current_type != TokenType.EOF:
+            self.current += 1
+            self.current_type = self._type_at(self.current if self.current < self._count else -1)
+
+    def _type_at(self, index):
+        if self._token_type is not None:
+            return self._token_type(index)
+        return self.tokens[index].token_type
+
     def check(self, type_):
-        if self.isAtEnd():
-            return False
-        return self.peek().token_type == type_
+        return self.current_type == type_ and type_ != TokenType.EOF
 
     def checkNext(self, type_):
         if self.current + 1 >= len(self.tokens):
@@ -40,10 +132,16 @@ class Parser:
         return self.tokens[self.current + 1].token_type == type_
 
     def match(self, *types):
-        for t in types:
-            if self.check(t):
-                self.advance()
-                return True
+        if self.current_type in types and self.current_type != TokenType.EOF:
+            self._step()
+            return True
+        return False
+
+    def matchClass(self, token_class):
+        # token_class — одно из множеств типов выше
+        if self.current_type in token_class:
+            self._step()
+            return True
         return False
 
     def consume(self, type_, message):
@@ -53,33 +151,23 @@ class Parser:
         return None
 
     def error(self, token, message):
-        error_msg = f"[Строка {token.line}, Колонка {token.column}] Ошибка: {message}"
-        self.errors.append(error_msg)
+        self.errors.report(Diagnostic('S001', Severity.ERROR, token.line, token.column, (message,)))
 
     def get_errors(self):
-        return self.errors
+        return [str(error) for error in self.errors]
 
     def synchronize(self):
         if not self.isAtEnd():
-            self.advance()
+            self._step()
 
         while not self.isAtEnd():
             if self.previous().token_type == TokenType.SEMICOLON:
                 return
 
-            if self.peek().token_type in [
-                TokenType.KW_FN,
-                TokenType.KW_STRUCT,
-                TokenType.KW_IF,
-                TokenType.KW_WHILE,
-                TokenType.KW_FOR,
-                TokenType.KW_RETURN,
-                TokenType.LBRACE,
-                TokenType.RBRACE,
-            ]:
+            if self.current_type in SYNC_POINTS:
                 return
 
-            self.advance()
+            self._step()
 
     def parse(self):
         try:
@@ -255,20 +343,40 @@ class Parser:
         return ParamNode(type_token, name, type_token.line, type_token.column)
 
     def parseStatement(self):
-        if self.match(TokenType.LBRACE):
-            return self.parseBlockBody()
-
-        if self.match(TokenType.KW_IF):
-            return self.parseIfStmt()
-
-        if self.match(TokenType.KW_WHILE):
-            return self.parseWhileStmt()
-
-        if self.match(TokenType.KW_FOR):
-            return self.parseForStmt()
-
-        if self.match(TokenType.KW_RETURN):
-            return self.parseReturnStmt()
+        statement = self.beginStatement()
+        if isinstance(statement, GeneratorType):
+            return self.runStatements(statement)
+        return statement
+
+    def runStatements(self, statement):
+        # Вложенные операторы без рекурсии: разбор '{', if, while и for —
+        # генератор, который на месте вложенного оператора отдаёт
+        # управление (yield) и получает его узел. Генераторы ждут на явном
+        # стеке, глубина вложенности ограничена только памятью
+        stack = [statement]
+        value = None
+        while True:
+            try:
+                stack[-1].send(value)
+            except StopIteration as stop:
+                stack.pop()
+                if not stack:
+                    return stop.value
+                value = stop.value
+                continue
+
+            value = self.beginStatement()
+            if isinstance(value, GeneratorType):
+                stack.append(value)
+                value = None
+
+    def beginStatement(self):
+        # Узел оператора или генератор разбора составного оператора
+        # ('{', if, while, for — по таблице STATEMENT_PARSERS)
+        parse_statement = STATEMENT_PARSERS.get(self.current_type)
+        if parse_statement is not None:
+            self._step()
+            return parse_statement(self)
 
         if self.isVarDeclStart():
             return self.parseVarDecl()
@@ -283,13 +391,15 @@ class Parser:
         if not self.match(TokenType.LBRACE):
             self.error(self.peek(), "Ожидалась '{'")
             return None
-        return self.parseBlockBody()
+        return self.runStatements(self.parseBlockBody())
 
     def parseBlockBody(self):
+        # Как и разбор if, while и for — генератор: yield на месте каждого
+        # вложенного оператора (см. runStatements)
         statements = []
 
         while not self.check(TokenType.RBRACE) and not self.isAtEnd():
-            stmt = self.parseStatement()
+            stmt = yield
             if stmt is not None:
                 statements.append(stmt)
             else:
@@ -307,11 +417,11 @@ class Parser:
         condition = self.parseExpression()
         self.consume(TokenType.RPAREN, "Ожидалась ')' после условия")
 
-        then_branch = self.parseStatement()
+        then_branch = yield
 
         else_branch = None
         if self.match(TokenType.KW_ELSE):
-            else_branch = self.parseStatement()
+            else_branch = yield
 
         token = self.previous()
         return IfStmtNode(condition, then_branch, else_branch, token.line, token.column)
@@ -321,7 +431,7 @@ class Parser:
         condition = self.parseExpression()
         self.consume(TokenType.RPAREN, "Ожидалась ')' после условия")
 
-        body = self.parseStatement()
+        body = yield
 
         token = self.previous()
         return WhileStmtNode(condition, body, token.line, token.column)
@@ -357,7 +467,7 @@ class Parser:
         self.consume(TokenType.RPAREN, "Ожидалась ')' после заголовка цикла")
 
         # Разбор тела
-        body = self.parseStatement()
+        body = yield
 
         token = self.previous()
         return ForStmtNode(init, condition, update, body, token.line, token.column)
@@ -386,180 +496,196 @@ class Parser:
         return ExprStmtNode(expr, semi.line, semi.column)
 
     def parseExpression(self):
-        return self.parseAssignment()
-
-    def parseAssignment(self):
-        expr = self.parseLogicalOr()
-
-        if self.match(
-                TokenType.ASSIGN,
-                TokenType.PLUS_ASSIGN,
-                TokenType.MINUS_ASSIGN,
-                TokenType.STAR_ASSIGN,
-                TokenType.SLASH_ASSIGN
-        ):
-            operator = self.previous()
-            value = self.parseAssignment()
-
-            # Проверка, что левая часть - допустимая цель присваивания
-            if not isinstance(expr, IdentifierExprNode) and not isinstance(expr, StructAccessExprNode):
-                self.error(operator, "Недопустимая цель присваивания")
+        # Разбор подъёмом по приоритетам (см. BINARY_PRECEDENCE) без
+        # рекурсии: вложенные подвыражения — кадры явного стека, глубина
+        # скобок, операторов и вызовов ограничена только памятью.
+        # Кадр оператора: [состояние, min_precedence, limit, выражение,
+        # оператор, приоритет оператора] — операторы с приоритетом не ниже
+        # min_precedence; limit — наибольший приоритет, допустимый для
+        # следующего оператора: после левоассоциативного оператора — его
+        # приоритет, после сравнения — ниже, чтобы цепочку сравнений не
+        # продолжить. Кадры скобок и аргументов вызова: [_PAREN, префиксные
+        # операторы] и [_ARGUMENT, префиксные операторы, вызываемое,
+        # аргументы]. value — готовое значение для верхнего кадра
+        stack = [[_LEFT, ASSIGNMENT_PRECEDENCE, MAX_PRECEDENCE, None, None, None]]
+        value = self.parseUnary(stack)
+        if len(stack) == 1 and self.current_type not in BINARY_PRECEDENCE:
+            # Выражение из одного операнда
+            return value
 
-            return AssignmentExprNode(
-                expr,
-                operator,
-                value,
-                operator.line,
-                operator.column
-            )
-
-        return expr
-
-    def parseLogicalOr(self):
-        expr = self.parseLogicalAnd()
-
-        while self.match(TokenType.OR):
-            operator = self.previous()
-            right = self.parseLogicalAnd()
-            expr = BinaryExprNode(expr, operator, right, operator.line, operator.column)
-
-        return expr
-
-    def parseLogicalAnd(self):
-        expr = self.parseEquality()
-
-        while self.match(TokenType.AND):
-            operator = self.previous()
-            right = self.parseEquality()
-            expr = BinaryExprNode(expr, operator, right, operator.line, operator.column)
-
-        return expr
-
-    def parseEquality(self):
-        expr = self.parseRelational()
+        while True:
+            frame = stack[-1]
+            state = frame[0]
+
+            if state == _PAREN:
+                stack.pop()
+                self.consume(TokenType.RPAREN, "Ожидалась ')' после выражения")
+                value = self.parsePostfix(value, frame[1], stack) if value is not None else self.applyPrefix(None, frame[1])
+                if value is _NESTED:
+                    value = self.parseUnary(stack)
+                continue
+
+            if state == _ARGUMENT:
+                if value is not None:
+                    frame[3].append(value)
+                if self.match(TokenType.COMMA):
+                    stack.append([_LEFT, ASSIGNMENT_PRECEDENCE, MAX_PRECEDENCE, None, None, None])
+                    value = self.parseUnary(stack)
+                    continue
+
+                stack.pop()
+                paren = self.consume(TokenType.RPAREN, "Ожидалась ')' после аргументов")
+                if paren is None:
+                    paren = self.peek()
+                expr = CallExprNode(frame[2], frame[3], paren.line, paren.column)
+                value = self.parsePostfix(expr, frame[1], stack)
+                if value is _NESTED:
+                    value = self.parseUnary(stack)
+                continue
+
+            if state == _LEFT:
+                frame[3] = value
+
+            elif state == _RIGHT:
+                operator = frame[4]
+                precedence = frame[5]
+                frame[3] = BinaryExprNode(frame[3], operator, value, operator.line, operator.column)
+
+                if precedence in NON_ASSOCIATIVE:
+                    # Проверка на неассоциативность
+                    if BINARY_PRECEDENCE.get(self.current_type) == precedence:
+                        bad = self.advance()
+                        self.error(
+                            bad,
+                            "Операторы сравнения неассоциативны; используйте скобки"
+                        )
+                        # Продолжаем разбор для восстановления: левоассоциативная
+                        # структура из обоих сравнений
+                        frame[0] = _EXTRA
+                        frame[4] = bad
+                        value = self.parseOperand(precedence, stack)
+                        continue
+                    frame[2] = precedence - 1
+                else:
+                    frame[2] = precedence
 
-        if self.match(TokenType.EQ, TokenType.NEQ):
-            operator = self.previous()
-            right = self.parseRelational()
+            elif state == _EXTRA:
+                bad = frame[4]
+                frame[3] = BinaryExprNode(frame[3], bad, value, bad.line, bad.column)
+                frame[2] = frame[5] - 1
 
-            # Проверка на неассоциативность
-            if self.match(TokenType.EQ, TokenType.NEQ):
-                bad = self.previous()
-                self.error(
-                    bad,
-                    "Операторы сравнения неассоциативны; используйте скобки"
-                )
-                # Продолжаем разбор для восстановления
-                extra_right = self.parseRelational()
-                # Создаем левоассоциативную структуру для восстановления
-                temp = BinaryExprNode(expr, operator, right, operator.line, operator.column)
-                expr = BinaryExprNode(temp, bad, extra_right, bad.line, bad.column)
             else:
-                expr = BinaryExprNode(expr, operator, right, operator.line, operator.column)
-
-        return expr
-
-    def parseRelational(self):
-        expr = self.parseAdditive()
-
-        if self.match(TokenType.LT, TokenType.LEQ, TokenType.GT, TokenType.GEQ):
-            operator = self.previous()
-            right = self.parseAdditive()
-
-            # Проверка на неассоциативность
-            if self.match(TokenType.LT, TokenType.LEQ, TokenType.GT, TokenType.GEQ):
-                bad = self.previous()
-                self.error(
-                    bad,
-                    "Операторы сравнения неассоциативны; используйте скобки"
+                # Правоассоциативное присваивание: цель проверяется после
+                # разбора значения
+                stack.pop()
+                target = frame[3]
+                operator = frame[4]
+
+                # Проверка, что левая часть - допустимая цель присваивания
+                if not isinstance(target, IdentifierExprNode) and not isinstance(target, StructAccessExprNode):
+                    self.error(operator, "Недопустимая цель присваивания")
+
+                value = AssignmentExprNode(
+                    target,
+                    operator,
+                    value,
+                    operator.line,
+                    operator.column
                 )
-                # Продолжаем разбор для восстановления
-                extra_right = self.parseAdditive()
-                # Создаем левоассоциативную структуру для восстановления
-                temp = BinaryExprNode(expr, operator, right, operator.line, operator.column)
-                expr = BinaryExprNode(temp, bad, extra_right, bad.line, bad.column)
+                if not stack:
+                    return value
+                continue
+
+            precedence = BINARY_PRECEDENCE.get(self.current_type)
+            if precedence is None or precedence < frame[1] or precedence > frame[2]:
+                stack.pop()
+                value = frame[3]
+                if not stack:
+                    return value
+                continue
+
+            frame[4] = self.advance()
+            frame[5] = precedence
+            if precedence == ASSIGNMENT_PRECEDENCE:
+                frame[0] = _VALUE
+                stack.append([_LEFT, ASSIGNMENT_PRECEDENCE, MAX_PRECEDENCE, None, None, None])
+                value = self.parseUnary(stack)
             else:
-                expr = BinaryExprNode(expr, operator, right, operator.line, operator.column)
-
-        return expr
+                frame[0] = _RIGHT
+                value = self.parseOperand(precedence, stack)
+
+    def parseOperand(self, precedence, stack):
+        # Правый операнд оператора: всё, что связывает сильнее него
+        if precedence < MAX_PRECEDENCE:
+            stack.append([_LEFT, precedence + 1, MAX_PRECEDENCE, None, None, None])
+        return self.parseUnary(stack)
+
+    def parseUnary(self, stack):
+        # Префиксные операторы и первичное выражение с постфиксной частью.
+        # Скобки и аргументы вызова открывают на стеке кадр и новое
+        # подвыражение; тогда разбирается его первый операнд
+        while True:
+            prefix = ()
+            if self.current_type in PREFIX_OPERATORS:
+                prefix = []
+                while self.current_type in PREFIX_OPERATORS:
+                    prefix.append(self.advance())
 
-    def parseAdditive(self):
-        expr = self.parseMultiplicative()
+            token_type = self.current_type
 
-        while self.match(TokenType.PLUS, TokenType.MINUS):
-            operator = self.previous()
-            right = self.parseMultiplicative()
-            expr = BinaryExprNode(expr, operator, right, operator.line, operator.column)
+            if token_type in LITERAL_TYPES:
+                token = self.advance()
+                expr = LiteralExprNode(token.literal_value, token.line, token.column)
 
-        return expr
+            elif token_type == TokenType.IDENTIFIER:
+                token = self.advance()
+                expr = IdentifierExprNode(token, token.line, token.column)
 
-    def parseMultiplicative(self):
-        expr = self.parseUnary()
-
-        while self.match(TokenType.STAR, TokenType.SLASH, TokenType.PERCENT):
-            operator = self.previous()
-            right = self.parseUnary()
-            expr = BinaryExprNode(expr, operator, right, operator.line, operator.column)
-
-        return expr
-
-    def parseUnary(self):
-        if self.match(
-                TokenType.NOT,
-                TokenType.MINUS,
-                TokenType.INCREMENT,
-                TokenType.DECREMENT
-        ):
-            operator = self.previous()
-            operand = self.parseUnary()
-            node = UnaryExprNode(operator, operand, operator.line, operator.column)
-            node.is_prefix = True
-            return node
+            elif token_type == TokenType.LPAREN:
+                self._step()
+                stack.append([_PAREN, prefix])
+                stack.append([_LEFT, ASSIGNMENT_PRECEDENCE, MAX_PRECEDENCE, None, None, None])
+                continue
 
-        return self.parsePostfix()
+            else:
+                self.error(self.peek(), "Ожидалось выражение")
+                return self.applyPrefix(None, prefix)
 
-    def parsePostfix(self):
-        expr = self.parsePrimary()
-        if expr is None:
-            return None
+            expr = self.parsePostfix(expr, prefix, stack)
+            if expr is not _NESTED:
+                return expr
 
+    def parsePostfix(self, expr, prefix, stack):
+        # Вызовы и доступ к полям после первичного выражения expr, затем
+        # постфиксный оператор и префиксные операторы prefix. _NESTED —
+        # на стеке открыт кадр аргументов вызова
         while True:
             if self.match(TokenType.LPAREN):
                 # CallSuffix
-                arguments = []
-
                 if not self.check(TokenType.RPAREN):
-                    arg = self.parseExpression()
-                    if arg is not None:
-                        arguments.append(arg)
-
-                    while self.match(TokenType.COMMA):
-                        arg = self.parseExpression()
-                        if arg is not None:
-                            arguments.append(arg)
-
-                paren = self.consume(TokenType.RPAREN, "Ожидалась ')' после аргументов")
-                if paren is None:
-                    paren = self.peek()
+                    stack.append([_ARGUMENT, prefix, expr, []])
+                    stack.append([_LEFT, ASSIGNMENT_PRECEDENCE, MAX_PRECEDENCE, None, None, None])
+                    return _NESTED
 
-                expr = CallExprNode(expr, arguments, paren.line, paren.column)
+                paren = self.advance()
+                expr = CallExprNode(expr, [], paren.line, paren.column)
 
             elif self.match(TokenType.DOT):
                 # FieldAccess
                 name = self.consume(TokenType.IDENTIFIER, "Ожидалось имя поля после '.'")
                 if name is None:
-                    return expr
+                    return self.applyPrefix(expr, prefix)
                 expr = StructAccessExprNode(expr, name, name.line, name.column)
 
             else:
                 break
 
-        if self.match(TokenType.INCREMENT, TokenType.DECREMENT):
+        if self.matchClass(POSTFIX_OPERATORS):
             operator = self.previous()
             node = UnaryExprNode(operator, expr, operator.line, operator.column)
             node.is_postfix = True
 
-            if self.match(TokenType.INCREMENT, TokenType.DECREMENT):
+            if self.matchClass(POSTFIX_OPERATORS):
                 bad = self.previous()
                 self.error(
                     bad,
@@ -568,45 +694,20 @@ class Parser:
 
             expr = node
 
-        return expr
-
-    def parsePrimary(self):
-        if self.match(TokenType.INT_LITERAL):
-            token = self.previous()
-            return LiteralExprNode(token.literal_value, token.line, token.column)
-
-        if self.match(TokenType.FLOAT_LITERAL):
-            token = self.previous()
-            return LiteralExprNode(token.literal_value, token.line, token.column)
-
-        if self.match(TokenType.STRING_LITERAL):
-            token = self.previous()
-            return LiteralExprNode(token.literal_value, token.line, token.column)
-
-        if self.match(TokenType.BOOL_LITERAL):
-            token = self.previous()
-            return LiteralExprNode(token.literal_value, token.line, token.column)
-
-        if self.match(TokenType.IDENTIFIER):
-            token = self.previous()
-            return IdentifierExprNode(token, token.line, token.column)
-
-        if self.match(TokenType.LPAREN):
-            expr = self.parseExpression()
-            self.consume(TokenType.RPAREN, "Ожидалась ')' после выражения")
-            return expr
+        return self.applyPrefix(expr, prefix)
 
-        self.error(self.peek(), "Ожидалось выражение")
-        return None
+    def applyPrefix(self, operand, prefix):
+        # Ближайший к операнду оператор — самый внутренний узел
+        if not prefix:
+            return operand
+        for operator in reversed(prefix):
+            node = UnaryExprNode(operator, operand, operator.line, operator.column)
+            node.is_prefix = True
+            operand = node
+        return operand
 
     def consumeType(self):
-        if self.match(
-                TokenType.KW_INT,
-                TokenType.KW_FLOAT,
-                TokenType.KW_BOOL,
-                TokenType.KW_VOID,
-                TokenType.KW_STRING,  # Добавлено
-        ):
+        if self.matchClass(TYPE_KEYWORDS):
             return self.previous()
 
         # Пользовательский тип: просто Identifier
@@ -617,25 +718,23 @@ class Parser:
         return None
 
     def isVarDeclStart(self):
-        if self.isAtEnd():
-            return False
-
         # Базовые типы
-        if self.check(
-                TokenType.KW_INT
-        ) or self.check(
-            TokenType.KW_FLOAT
-        ) or self.check(
-            TokenType.KW_BOOL
-        ) or self.check(
-            TokenType.KW_VOID
-        ) or self.check(
-            TokenType.KW_STRING  # Добавлено
-        ):
+        if self.current_type in TYPE_KEYWORDS:
             return True
 
         # Пользовательский тип: Identifier Identifier ...
-        if self.check(TokenType.IDENTIFIER) and self.checkNext(TokenType.IDENTIFIER):
+        if self.current_type == TokenType.IDENTIFIER and self.checkNext(TokenType.IDENTIFIER):
             return True
 
-        return False
\ No newline at end of file
+        return False
+
+
+# Операторы, начинающиеся с ключевого токена: токен -> генератор разбора
+# после него (см. Parser.runStatements)
+STATEMENT_PARSERS = {
+    TokenType.LBRACE: Parser.parseBlockBody,
+    TokenType.KW_IF: Parser.parseIfStmt,
+    TokenType.KW_WHILE: Parser.parseWhileStmt,
+    TokenType.KW_FOR: Parser.parseForStmt,
+    TokenType.KW_RETURN: Parser.parseReturnStmt,
+}
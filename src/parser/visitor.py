@@ -1,26 +1,62 @@
+from types import GeneratorType
+
+from src.lexer.diagnostic import Diagnostic, DiagnosticList, Severity
 from src.parser.ast import *
 
 
+def stepped(name):
+    # Публичный visit_* поверх генератора-шага: вызов обходит узел целиком,
+    # как обычный метод, в том числе через super() из подкласса. dispatch
+    # вместо него берёт сам шаг, пока visit_* не переопределён
+    def visit(self, node):
+        return walk(getattr(self, name)(node), self.dispatch)
+    visit.step = name
+    return visit
+
+
+# Шаг _step_* — генератор: вместо self.visit(child) он отдаёт yield child
+# и получает результат обхода потомка. dispatch передаёт шаги в walk, и
+# обход идёт явным стеком, глубина дерева ограничена только памятью.
+# visit_* без шага вызываются как есть: с self.visit и
+# self.generic_visit(node) внутри; visit_*, который сам генератор,
+# обходится так же, как шаг. Узел без visit_* обходится генератором
+# generic_children, пока generic_visit не переопределён в подклассе
 class ASTVisitor:
 
     def visit(self, node):
         if node is None:
             return None
-        method_name = f"visit_{node.__class__.__name__}"
-        visitor = getattr(self, method_name, self.generic_visit)
-        return visitor(node)
+        result = self.dispatch(node)
+        if isinstance(result, GeneratorType):
+            return walk(result, self.dispatch)
+        return result
+
+    def dispatch(self, node):
+        method = getattr(self, f"visit_{node.__class__.__name__}", None)
+        if method is not None:
+            step = getattr(method, "step", None)
+            if step is not None:
+                return getattr(self, step)(node)
+            return method(node)
+        if type(self).generic_visit is ASTVisitor.generic_visit:
+            return self.generic_children(node)
+        return self.generic_visit(node)
 
     def generic_visit(self, node):
+        for child in self.generic_children(node):
+            self.visit(child)
+
+    def generic_children(self, node):
         for attr_name in dir(node):
             if attr_name.startswith("_") or attr_name in ("line", "column"):
                 continue
             attr = getattr(node, attr_name)
             if isinstance(attr, ASTNode):
-                self.visit(attr)
+                yield attr
             elif isinstance(attr, list):
                 for item in attr:
                     if isinstance(item, ASTNode):
-                        self.visit(item)
+                        yield item
 
 
 class ASTPrettyPrinter(ASTVisitor):
@@ -35,14 +71,16 @@ class ASTPrettyPrinter(ASTVisitor):
     def get_result(self):
         return "\n".join(self.lines)
 
-    def visit_ProgramNode(self, node):
+    def _step_ProgramNode(self, node):
         self.print("Program:")
         self.indent += 1
         for decl in node.declarations:
-            self.visit(decl)
+            yield decl
         self.indent -= 1
 
-    def visit_FunctionDeclNode(self, node):
+    visit_ProgramNode = stepped("_step_ProgramNode")
+
+    def _step_FunctionDeclNode(self, node):
         ret = node.return_type.lexeme if node.return_type else "void"
         self.print(f"FunctionDecl: {node.name.lexeme} -> {ret}")
         self.indent += 1
@@ -51,40 +89,46 @@ class ASTPrettyPrinter(ASTVisitor):
         self.indent += 1
         if node.parameters:
             for p in node.parameters:
-                self.visit(p)
+                yield p
         else:
             self.print("[]")
         self.indent -= 1
 
         self.print("Body:")
         self.indent += 1
-        self.visit(node.body)
+        yield node.body
         self.indent -= 1
 
         self.indent -= 1
 
-    def visit_StructDeclNode(self, node):
+    visit_FunctionDeclNode = stepped("_step_FunctionDeclNode")
+
+    def _step_StructDeclNode(self, node):
         self.print(f"StructDecl: {node.name.lexeme}")
         self.indent += 1
         self.print("Fields:")
         self.indent += 1
         if node.fields:
             for field in node.fields:
-                self.visit(field)
+                yield field
         else:
             self.print("[]")
         self.indent -= 2
 
+    visit_StructDeclNode = stepped("_step_StructDeclNode")
+
     def visit_ParamNode(self, node):
         self.print(f"{node.type.lexeme} {node.name.lexeme}")
 
-    def visit_BlockStmtNode(self, node):
+    def _step_BlockStmtNode(self, node):
         self.print("Block:")
         self.indent += 1
         for stmt in node.statements:
-            self.visit(stmt)
+            yield stmt
         self.indent -= 1
 
+    visit_BlockStmtNode = stepped("_step_BlockStmtNode")
+
     def visit_VarDeclStmtNode(self, node):
         init = f" = {self._expr_to_str(node.initializer)}" if node.initializer is not None else ""
         self.print(f"VarDecl: {node.type.lexeme} {node.name.lexeme}{init}")
@@ -101,7 +145,7 @@ class ASTPrettyPrinter(ASTVisitor):
     def visit_EmptyStmtNode(self, node):
         self.print("EmptyStmt: ;")
 
-    def visit_IfStmtNode(self, node):
+    def _step_IfStmtNode(self, node):
         self.print("IfStmt")
         self.indent += 1
 
@@ -112,18 +156,20 @@ class ASTPrettyPrinter(ASTVisitor):
 
         self.print("Then:")
         self.indent += 1
-        self.visit(node.then_branch)
+        yield node.then_branch
         self.indent -= 1
 
         if node.else_branch is not None:
             self.print("Else:")
             self.indent += 1
-            self.visit(node.else_branch)
+            yield node.else_branch
             self.indent -= 1
 
         self.indent -= 1
 
-    def visit_WhileStmtNode(self, node):
+    visit_IfStmtNode = stepped("_step_IfStmtNode")
+
+    def _step_WhileStmtNode(self, node):
         self.print("WhileStmt")
         self.indent += 1
 
@@ -134,19 +180,21 @@ class ASTPrettyPrinter(ASTVisitor):
 
         self.print("Body:")
         self.indent += 1
-        self.visit(node.body)
+        yield node.body
         self.indent -= 1
 
         self.indent -= 1
 
-    def visit_ForStmtNode(self, node):
+    visit_WhileStmtNode = stepped("_step_WhileStmtNode")
+
+    def _step_ForStmtNode(self, node):
         self.print("ForStmt")
         self.indent += 1
 
         self.print("Init:")
         self.indent += 1
         if node.init is not None:
-            self.visit(node.init)
+            yield node.init
         else:
             self.print("None")
         self.indent -= 1
@@ -169,71 +217,70 @@ class ASTPrettyPrinter(ASTVisitor):
 
         self.print("Body:")
         self.indent += 1
-        self.visit(node.body)
+        yield node.body
         self.indent -= 1
 
         self.indent -= 1
 
+    visit_ForStmtNode = stepped("_step_ForStmtNode")
+
     def _expr_to_str(self, expr):
+        return render(expr, self._expr_parts)
+
+    def _expr_parts(self, expr):
         if expr is None:
-            return "None"
+            return ["None"]
 
         if isinstance(expr, LiteralExprNode):
             if expr.value is None:
-                return "null"
-            if isinstance(expr.value, str):
-                return f'"{expr.value}"'
-            if isinstance(expr.value, bool):
-                return "true" if expr.value else "false"
-            return str(expr.value)
+                return ["null"]
+            return [literal_to_str(expr.value)]
 
         elif isinstance(expr, IdentifierExprNode):
-            return expr.name.lexeme if hasattr(expr.name, "lexeme") else str(expr.name)
+            return [expr.name.lexeme if hasattr(expr.name, "lexeme") else str(expr.name)]
 
         elif isinstance(expr, BinaryExprNode):
-            return f"({self._expr_to_str(expr.left)} {expr.operator.lexeme} {self._expr_to_str(expr.right)})"
+            return ["(", expr.left, f" {expr.operator.lexeme} ", expr.right, ")"]
 
         elif isinstance(expr, UnaryExprNode):
             if hasattr(expr, "is_postfix") and expr.is_postfix:
-                return f"({self._expr_to_str(expr.operand)}{expr.operator.lexeme})"
-            return f"({expr.operator.lexeme}{self._expr_to_str(expr.operand)})"
+                return ["(", expr.operand, expr.operator.lexeme, ")"]
+            return ["(", expr.operator.lexeme, expr.operand, ")"]
 
         elif isinstance(expr, AssignmentExprNode):
-            return f"({self._expr_to_str(expr.target)} {expr.operator.lexeme} {self._expr_to_str(expr.value)})"
+            return ["(", expr.target, f" {expr.operator.lexeme} ", expr.value, ")"]
 
         elif isinstance(expr, CallExprNode):
-            args = ", ".join(self._expr_to_str(a) for a in expr.arguments)
-            return f"{self._expr_to_str(expr.callee)}({args})"
+            return [expr.callee, "("] + joined(expr.arguments, ", ") + [")"]
 
         elif isinstance(expr, StructAccessExprNode):
-            return f"{self._expr_to_str(expr.primary)}.{expr.field.lexeme}"
+            return [expr.primary, f".{expr.field.lexeme}"]
 
-        return str(expr)
+        return [str(expr)]
 
 
 class ASTSemanticAnalyzer(ASTVisitor):
 
-    def __init__(self):
-        self.errors = []
+    def __init__(self, error_limit=None):
+        self.errors = DiagnosticList(error_limit)
         self.current_function = None
         self.variables = []  # Scope stack
         self.functions = {}  # Function table
 
-    def visit_ProgramNode(self, node):
+    def _step_ProgramNode(self, node):
         for decl in node.declarations:
             if isinstance(decl, FunctionDeclNode):
                 name = decl.name.lexeme
                 if name in self.functions:
-                    self.errors.append(
-                        f"[Строка {decl.line}, Колонка {decl.column}] Ошибка: "
-                        f"Повторное объявление функции '{name}'"
-                    )
+                    self.error(decl, 'E001', name)
                 self.functions[name] = decl
 
         for decl in node.declarations:
-            self.visit(decl)
+            yield decl
+
+    visit_ProgramNode = stepped("_step_ProgramNode")
 
-    def visit_FunctionDeclNode(self, node):
+    def _step_FunctionDeclNode(self, node):
         old_function = self.current_function
         self.current_function = node
 
@@ -242,37 +289,37 @@ class ASTSemanticAnalyzer(ASTVisitor):
         for param in node.parameters:
             name = param.name.lexeme
             if name in self.variables[-1]:
-                self.errors.append(
-                    f"[Строка {param.line}, Колонка {param.column}] Ошибка: "
-                    f"Повторное объявление параметра '{name}'"
-                )
+                self.error(param, 'E002', name)
             self.variables[-1][name] = param.type
 
-        self.visit(node.body)
+        yield node.body
 
         self.variables.pop()
         self.current_function = old_function
 
-    def visit_BlockStmtNode(self, node):
+    visit_FunctionDeclNode = stepped("_step_FunctionDeclNode")
+
+    def _step_BlockStmtNode(self, node):
         self.variables.append({})
         for stmt in node.statements:
-            self.visit(stmt)
+            yield stmt
         self.variables.pop()
 
-    def visit_VarDeclStmtNode(self, node):
+    visit_BlockStmtNode = stepped("_step_BlockStmtNode")
+
+    def _step_VarDeclStmtNode(self, node):
         name = node.name.lexeme
 
         if self.variables and name in self.variables[-1]:
-            self.errors.append(
-                f"[Строка {node.line}, Колонка {node.column}] Ошибка: "
-                f"Переменная '{name}' уже объявлена в этой области видимости"
-            )
+            self.error(node, 'E003', name)
 
         if self.variables:
             self.variables[-1][name] = node.type
 
         if node.initializer:
-            self.visit(node.initializer)
+            yield node.initializer
+
+    visit_VarDeclStmtNode = stepped("_step_VarDeclStmtNode")
 
     def visit_IdentifierExprNode(self, node):
         name = node.name.lexeme
@@ -290,56 +337,50 @@ class ASTSemanticAnalyzer(ASTVisitor):
                     break
 
         if not found:
-            self.errors.append(
-                f"[Строка {node.line}, Колонка {node.column}] Ошибка: "
-                f"Переменная '{name}' не объявлена"
-            )
+            self.error(node, 'E004', name)
 
-    def visit_AssignmentExprNode(self, node):
-        self.visit(node.target)
-        self.visit(node.value)
+    def _step_AssignmentExprNode(self, node):
+        yield node.target
+        yield node.value
 
-    def visit_ReturnStmtNode(self, node):
+    visit_AssignmentExprNode = stepped("_step_AssignmentExprNode")
+
+    def _step_ReturnStmtNode(self, node):
         if not self.current_function:
-            self.errors.append(
-                f"[Строка {node.line}, Колонка {node.column}] Ошибка: "
-                f"Оператор return вне функции"
-            )
+            self.error(node, 'E005')
             return
 
         if node.value:
-            self.visit(node.value)
+            yield node.value
+
+    visit_ReturnStmtNode = stepped("_step_ReturnStmtNode")
 
-    def visit_CallExprNode(self, node):
+    def _step_CallExprNode(self, node):
         if isinstance(node.callee, IdentifierExprNode):
             name = node.callee.name.lexeme
             if name not in self.functions:
-                self.errors.append(
-                    f"[Строка {node.line}, Колонка {node.column}] Ошибка: "
-                    f"Функция '{name}' не объявлена"
-                )
+                self.error(node, 'E006', name)
             else:
                 func = self.functions[name]
                 expected = len(func.parameters)
                 got = len(node.arguments)
                 if expected != got:
-                    self.errors.append(
-                        f"[Строка {node.line}, Колонка {node.column}] Ошибка: "
-                        f"Функция '{name}' ожидает {expected} аргументов, получено {got}"
-                    )
+                    self.error(node, 'E007', name, expected, got)
 
         for arg in node.arguments:
-            self.visit(arg)
+            yield arg
+
+    visit_CallExprNode = stepped("_step_CallExprNode")
 
     def visit_LiteralExprNode(self, node):
         if isinstance(node.value, int):
             INT_MIN = -(2 ** 31)
             INT_MAX = 2 ** 31 - 1
             if node.value < INT_MIN or node.value > INT_MAX:
-                self.errors.append(
-                    f"[Строка {node.line}, Колонка {node.column}] Ошибка: "
-                    f"Целое число {node.value} вне диапазона 32-бит ({INT_MIN}..{INT_MAX})"
-                )
+                self.error(node, 'E008', node.value, INT_MIN, INT_MAX)
+
+    def error(self, node, code, *args):
+        self.errors.report(Diagnostic(code, Severity.ERROR, node.line, node.column, args))
 
     def get_errors(self):
-        return self.errors
+        return [str(error) for error in self.errors]
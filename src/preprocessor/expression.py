@@ -0,0 +1,309 @@
+import re
+from typing import Dict, List, Tuple, Union
+
+
+# Выражения условий #if/#elif: целые константы, defined(X) и defined X,
+# унарные ! ~ - +, арифметика, сдвиги, сравнения, побитовые операции,
+# && || и ?: с приоритетами C. Имена макросов раскрываются по токенам,
+# как в C: значение макроса вставляется вместо имени, имя внутри
+# собственного раскрытия и имена без макроса дают 0. Арифметика — 64-битная
+# со знаком, деление с отбрасыванием дробной части
+
+_SPACE = re.compile(r'(?:\s+|/\*.*?\*/|//.*)*', re.DOTALL)
+_TOKEN = re.compile(r'(\d\w*)|([A-Za-z_]\w*)|(&&|\|\||<<|>>|<=|>=|==|!=|[-+*/%<>!~&|^?:()])')
+_SUFFIX = re.compile(r'[uUlL]*$')
+
+# Токен: int — число, str — имя или оператор
+ExprToken = Union[int, str]
+
+# Приоритеты бинарных операторов: больше — связывает сильнее
+_BINARY = {
+    '*': 11, '/': 11, '%': 11,
+    '+': 10, '-': 10,
+    '<<': 9, '>>': 9,
+    '<': 8, '<=': 8, '>': 8, '>=': 8,
+    '==': 7, '!=': 7,
+    '&': 6,
+    '^': 5,
+    '|': 4,
+    '&&': 3,
+    '||': 2,
+}
+# Унарные операторы в программе отличаются от бинарных с тем же знаком
+_UNARY = {'-': 'neg', '+': 'pos', '!': '!', '~': '~'}
+_UNARY_PRIORITY = 12
+_TERNARY_PRIORITY = 1
+
+_MASK = (1 << 64) - 1
+_SIGN = 1 << 63
+
+
+class ExpressionError(Exception):
+    # kind: 'syntax' — выражение не разбирается, 'division' — деление на ноль
+    # в вычисляемой части выражения
+
+    def __init__(self, kind: str):
+        super().__init__(kind)
+        self.kind = kind
+
+
+def _wrap(value: int) -> int:
+    return ((value + _SIGN) & _MASK) - _SIGN
+
+
+def _number(text: str) -> int:
+    digits = _SUFFIX.sub('', text)
+    try:
+        if digits[:2] in ('0x', '0X'):
+            return _wrap(int(digits[2:], 16))
+        if len(digits) > 1 and digits[0] == '0':
+            return _wrap(int(digits, 8))
+        return _wrap(int(digits, 10))
+    except ValueError:
+        raise ExpressionError('syntax') from None
+
+
+def tokenize(text: str) -> Tuple[ExprToken, ...]:
+    # Комментарии внутри выражения пропускаются как пробелы
+    tokens: List[ExprToken] = []
+    position = _SPACE.match(text).end()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise ExpressionError('syntax')
+        number, name, operator = match.groups()
+        tokens.append(_number(number) if number is not None else name or operator)
+        position = _SPACE.match(text, match.end()).end()
+    return tuple(tokens)
+
+
+def compile_tokens(tokens: Tuple[ExprToken, ...]) -> list:
+    # Токены без имён (см. ExpressionEvaluator._expand) -> программа в
+    # обратной польской записи, разбор сортировочной станцией без рекурсии.
+    # ?: — правоассоциативный оператор: '?' на стеке ждёт ':', после чего
+    # становится оператором с тремя операндами
+    program = []
+    operators: List[str] = []
+    expect_operand = True
+
+    def reduce(priority, right):
+        while operators and operators[-1] not in ('(', '?'):
+            top = operators[-1]
+            top_priority = (_UNARY_PRIORITY if top in _UNARY.values() else
+                            _TERNARY_PRIORITY if top == '?:' else _BINARY[top])
+            if top_priority < priority or (top_priority == priority and right):
+                break
+            program.append(operators.pop())
+
+    for token in tokens:
+        if expect_operand:
+            if isinstance(token, int):
+                program.append(token)
+                expect_operand = False
+            elif token == '(':
+                operators.append(token)
+            elif token in _UNARY:
+                operators.append(_UNARY[token])
+            else:
+                raise ExpressionError('syntax')
+        elif token == ')':
+            reduce(0, False)
+            if not operators or operators[-1] != '(':
+                raise ExpressionError('syntax')
+            operators.pop()
+        elif token == '?':
+            reduce(_TERNARY_PRIORITY, True)
+            operators.append('?')
+            expect_operand = True
+        elif token == ':':
+            reduce(0, False)
+            if not operators or operators[-1] != '?':
+                raise ExpressionError('syntax')
+            operators[-1] = '?:'
+            expect_operand = True
+        elif token in _BINARY:
+            reduce(_BINARY[token], False)
+            operators.append(token)
+            expect_operand = True
+        else:
+            raise ExpressionError('syntax')
+
+    if expect_operand:
+        raise ExpressionError('syntax')
+    reduce(0, False)
+    if operators:
+        raise ExpressionError('syntax')
+    return program
+
+
+def run_program(program: list) -> int:
+    # Ошибка деления на ноль — значение None: && || ?: отбрасывают
+    # невычисляемый операнд вместе с его ошибкой, как C его не вычисляет
+    stack: list = []
+    for item in program:
+        if isinstance(item, int):
+            stack.append(item)
+        elif item == '?:':
+            otherwise = stack.pop()
+            then = stack.pop()
+            condition = stack[-1]
+            stack[-1] = None if condition is None else then if condition else otherwise
+        elif item in ('neg', 'pos', '!', '~'):
+            value = stack[-1]
+            if value is not None:
+                stack[-1] = (_wrap(-value) if item == 'neg' else value if item == 'pos' else
+                             int(not value) if item == '!' else ~value)
+        else:
+            right = stack.pop()
+            left = stack[-1]
+            if item == '&&':
+                stack[-1] = 0 if left == 0 else None if left is None or right is None else int(right != 0)
+            elif item == '||':
+                stack[-1] = (None if left is None else 1 if left else
+                             None if right is None else int(right != 0))
+            elif left is None or right is None:
+                stack[-1] = None
+            else:
+                stack[-1] = _binary(item, left, right)
+
+    result = stack[0]
+    if result is None:
+        raise ExpressionError('division')
+    return result
+
+
+def _binary(operator: str, left: int, right: int):
+    if operator in ('/', '%'):
+        if right == 0:
+            return None
+        quotient = abs(left) // abs(right)
+        if (left < 0) != (right < 0):
+            quotient = -quotient
+        return _wrap(quotient) if operator == '/' else _wrap(left - right * quotient)
+    if operator == '*':
+        return _wrap(left * right)
+    if operator == '+':
+        return _wrap(left + right)
+    if operator == '-':
+        return _wrap(left - right)
+    if operator == '<<':
+        # Число разрядов сдвига берётся по модулю 64
+        return _wrap(left << (right & 63))
+    if operator == '>>':
+        return left >> (right & 63)
+    if operator == '<':
+        return int(left < right)
+    if operator == '<=':
+        return int(left <= right)
+    if operator == '>':
+        return int(left > right)
+    if operator == '>=':
+        return int(left >= right)
+    if operator == '==':
+        return int(left == right)
+    if operator == '!=':
+        return int(left != right)
+    if operator == '&':
+        return left & right
+    if operator == '^':
+        return left ^ right
+    return left | right
+
+
+# Вычислитель условий с кэшами трёх уровней: токены текста (выражения или
+# значения макроса) не зависят от макросов и хранятся всегда; значение
+# выражения после раскрытия имён зависит только от токенов и тоже хранится
+# всегда; значение текста условия хранится до изменения таблицы макросов
+# (invalidate). Ошибки кэшируются так же, как значения, — строкой вида
+# ошибки (см. ExpressionError)
+class ExpressionEvaluator:
+
+    def __init__(self):
+        self._tokens: Dict[str, Union[Tuple[ExprToken, ...], str]] = {}
+        self._values: Dict[Tuple[ExprToken, ...], Union[int, str]] = {}
+        self._results: Dict[str, Union[int, str]] = {}
+
+    def invalidate(self) -> None:
+        self._results = {}
+
+    def fork(self) -> 'ExpressionEvaluator':
+        # Вычислитель для другой таблицы макросов с общими кэшами токенов
+        # и значений
+        evaluator = ExpressionEvaluator()
+        evaluator._tokens = self._tokens
+        evaluator._values = self._values
+        return evaluator
+
+    def evaluate(self, text: str, macros: Dict[str, str]) -> int:
+        result = self._results.get(text)
+        if result is None:
+            try:
+                result = self._value(self._expand(self._tokenize(text), macros))
+            except ExpressionError as error:
+                result = error.kind
+            self._results[text] = result
+        if isinstance(result, str):
+            raise ExpressionError(result)
+        return result
+
+    def _tokenize(self, text: str) -> Tuple[ExprToken, ...]:
+        tokens = self._tokens.get(text)
+        if tokens is None:
+            try:
+                tokens = tokenize(text)
+            except ExpressionError as error:
+                tokens = error.kind
+            self._tokens[text] = tokens
+        if isinstance(tokens, str):
+            raise ExpressionError(tokens)
+        return tokens
+
+    def _value(self, tokens: Tuple[ExprToken, ...]) -> int:
+        value = self._values.get(tokens)
+        if value is None:
+            try:
+                value = run_program(compile_tokens(tokens))
+            except ExpressionError as error:
+                value = error.kind
+            self._values[tokens] = value
+        if isinstance(value, str):
+            raise ExpressionError(value)
+        return value
+
+    def _expand(self, tokens: Tuple[ExprToken, ...], macros: Dict[str, str]) -> Tuple[ExprToken, ...]:
+        # Имена -> числа. Раскрытия вложены стеком кадров [токены, позиция,
+        # имя макроса]; defined и его операнд берутся из одного кадра
+        result: List[ExprToken] = []
+        active = set()
+        frames = [[tokens, 0, None]]
+        while frames:
+            frame = frames[-1]
+            frame_tokens, index, name = frame
+            if index == len(frame_tokens):
+                frames.pop()
+                active.discard(name)
+                continue
+
+            token = frame_tokens[index]
+            frame[1] = index + 1
+            if isinstance(token, int) or not (token[0].isalpha() or token[0] == '_'):
+                result.append(token)
+            elif token == 'defined':
+                operand = frame_tokens[index + 1:index + 2]
+                if operand == ('(',):
+                    operand = frame_tokens[index + 2:index + 4]
+                    if operand[1:] != (')',):
+                        raise ExpressionError('syntax')
+                    frame[1] = index + 4
+                else:
+                    frame[1] = index + 2
+                if not operand or not isinstance(operand[0], str) or not (
+                        operand[0][0].isalpha() or operand[0][0] == '_'):
+                    raise ExpressionError('syntax')
+                result.append(int(operand[0] in macros))
+            elif token in macros and token not in active:
+                active.add(token)
+                frames.append([self._tokenize(macros[token]), 0, token])
+            else:
+                result.append(0)
+        return tuple(result)
@@ -0,0 +1,204 @@
+import re
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from src.lexer.diagnostic import Diagnostic, DiagnosticList, Severity
+from src.lexer.line_index import LineIndex
+from src.lexer.scanner import _IDENT, COMPACT_THRESHOLD, ErrorLimitReached, Scanner
+from src.lexer.source import SourceReader
+from src.lexer.token import TokenType
+from .preprocessor import Preprocessor
+from .source_map import chain_names
+
+
+_LINE_END_RE = re.compile(r'[\r\n]')
+
+# Токен раскрытия: (тип, лексема, значение, цепочка раскрытий);
+# ошибка раскрытия: (код, аргументы, цепочка раскрытий)
+ExpansionToken = Tuple[TokenType, str, Any, Tuple[str, ...]]
+ExpansionError = Tuple[str, Tuple[Any, ...], Tuple[str, ...]]
+
+
+class _ExpansionScanner(Scanner):
+    # Фигурные скобки раскрытия учитываются в стеке внешнего сканера
+
+    def _unmatched_brace(self) -> None:
+        pass
+
+    def _unclosed_blocks(self, depth: int) -> None:
+        pass
+
+
+def lex_expansion(text: str, runs: list) -> Tuple[List[ExpansionToken], List[ExpansionError]]:
+    # Раскрытие макроса (см. Preprocessor._expansion) -> токены и ошибки;
+    # цепочка раскрытий берётся по смещению внутри раскрытия
+    scanner = _ExpansionScanner(text)
+    tokens = scanner.scan_tokens()
+    offsets = [offset for offset, _ in runs]
+
+    def chain_at(line, column):
+        offset = scanner.line_index.offset(line, column)
+        return chain_names(runs[bisect_right(offsets, offset) - 1][1])
+
+    return (
+        [(token.token_type, token.lexeme, token.literal_value, chain_at(token.line, token.column))
+         for token in tokens[:-1]],
+        [(error.code, error.args, chain_at(error.line, error.column)) for error in scanner.errors],
+    )
+
+
+# Места вызова макросов в совмещённом режиме. Токены раскрытия стоят на
+# позиции вызова, поэтому диагностика парсера на этой позиции относится
+# к раскрытию. remap — как у SourceMap: позиции уже исходные, добавляется
+# только имя макроса
+class ExpansionSites:
+
+    def __init__(self):
+        self.names: Dict[Tuple[int, int], str] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def remap(self, errors: DiagnosticList, line_index: Optional[LineIndex] = None) -> DiagnosticList:
+        remapped = DiagnosticList(errors.limit)
+        remapped.dropped = errors.dropped
+        for error in errors:
+            name = None if error.expansion else self.names.get((error.line, error.column))
+            if name is not None:
+                error = Diagnostic(error.code, error.severity, error.line, error.column, error.args, (name,))
+            remapped.append(error)
+        return remapped
+
+
+# Препроцессор внутри сканера: директиву разбирает сам сканер, встретив
+# '#' первым непробельным символом строки, а имя макроса заменяется
+# токенами его раскрытия. Промежуточного текста и второго прохода по
+# комментариям нет, позиции токенов — сразу позиции исходника, токены
+# раскрытия стоят на месте вызова.
+# Отличия от Preprocessor + Scanner: директива внутри многострочного
+# комментария остаётся комментарием; макросы не раскрываются в строковых
+# литералах; раскрытие не склеивается с соседними символами и не
+# закомментирует остаток строки; имена макросов не из символов слова не
+# раскрываются; незакрытый комментарий — L004 сканера вместо P001;
+# #include не поддерживается (P006).
+# Ошибки директив попадают в preprocessor.errors
+class FusedScanner(Scanner):
+
+    def __init__(self, source: Union[str, SourceReader], preprocessor: Optional[Preprocessor] = None,
+                 error_limit: Optional[int] = None, max_errors: Optional[int] = None):
+        super().__init__(source, error_limit, max_errors)
+        self.preprocessor = preprocessor if preprocessor is not None else Preprocessor()
+        # Токены включаемого файла не имеют позиций в этом исходнике
+        self.preprocessor.allow_include = False
+        # Стек условной компиляции, как в Preprocessor.process_lines
+        self.conditions: List[Optional[bool]] = []
+        self.expansion_sites = ExpansionSites()
+        # До текущей позиции в строке только пробелы
+        self._line_blank = True
+        # Токены раскрытий: имя -> (раскрытие, токены, ошибки). Раскрытие
+        # сравнивается по идентичности: препроцессор пересчитывает его при
+        # изменении таблицы макросов
+        self._expansion_tokens: Dict[str, tuple] = {}
+
+    def scan_buffer(self):
+        raise ValueError("TokenBuffer не поддерживается в совмещённом режиме")
+
+    def scan_tokens_parallel(self, workers: Optional[int] = None):
+        raise ValueError("Параллельный режим не поддерживается в совмещённом режиме")
+
+    def scan_token(self) -> None:
+        # Пробелы и переводы строк — как в Scanner.scan_token, без лишнего вызова
+        c = self.source[self.current]
+        if c == ' ' or c == '\t':
+            self.current += 1
+            self.skip_whitespace()
+            return
+        if c == '\n':
+            self.current += 1
+            self.newline()
+            self._line_blank = True
+            return
+        if c == '\r':
+            line = self.line
+            self.current += 1
+            self.carriage_return()
+            if self.line != line:
+                self._line_blank = True
+            return
+        if c == '#' and self._line_blank:
+            self.directive()
+            return
+        self._line_blank = False
+        if self.preprocessor.macros and (c.isalpha() or c == '_'):
+            self.current += 1
+            self.identifier()
+            return
+        super().scan_token()
+
+    def identifier(self) -> None:
+        self.skip_class(_IDENT)
+        name = self.source[self.start:self.current]
+        expansion = None
+        if name in self.preprocessor.macros:
+            expansion = self.preprocessor.expansion(name)
+        if expansion is None:
+            # Имя уже пропущено, Scanner.identifier только добавит токен
+            super().identifier()
+            return
+        self.expand(name, expansion)
+
+    def expand(self, name: str, expansion: Tuple[str, list]) -> None:
+        cached = self._expansion_tokens.get(name)
+        if cached is None or cached[0] is not expansion:
+            cached = self._expansion_tokens[name] = (expansion,) + lex_expansion(*expansion)
+        _, tokens, errors = cached
+
+        for code, args, chain in errors:
+            self.expansion_error(code, args, chain)
+        block_stack = self.block_stack
+        for token_type, lexeme, literal_value, chain in tokens:
+            if token_type is TokenType.LBRACE:
+                block_stack.append('{')
+            elif token_type is TokenType.RBRACE:
+                if block_stack:
+                    block_stack.pop()
+                else:
+                    self.expansion_error('L013', (), chain)
+            self.add_token(token_type, literal_value, lexeme_override=lexeme)
+        if tokens:
+            self.expansion_sites.names[(self.token_start_line, self.token_start_column)] = name
+
+    def expansion_error(self, code: str, args: Tuple[Any, ...], chain: Tuple[str, ...]) -> None:
+        # Ошибка внутри раскрытия — на месте вызова, с цепочкой раскрытий
+        self.errors.report(Diagnostic(code, Severity.ERROR, self.token_start_line,
+                                      self.token_start_column, args, chain))
+        if self.errors.count == self.max_errors:
+            raise ErrorLimitReached
+
+    def directive(self) -> None:
+        # Директива до конца строки; строки неактивной ветки пропускаются
+        # без разбора на токены, кроме директив, которые могут её закончить
+        self._read_directive()
+        conditions = self.conditions
+        while conditions and not conditions[-1]:
+            self.skip_to(_LINE_END_RE)
+            if self.is_at_end():
+                break
+            if self.advance() == '\r' and not self.match('\n'):
+                # Одиночный '\r' строку не заканчивает
+                continue
+            self.newline()
+            if self._reader is not None and self.current >= COMPACT_THRESHOLD:
+                self._compact(self.current)
+            self.skip_whitespace()
+            if self.peek() == '#':
+                self._read_directive()
+
+        self.start = self.current
+        self._line_blank = False
+
+    def _read_directive(self) -> None:
+        start = self.current
+        self.skip_to(_LINE_END_RE)
+        text = self.source[start:self.current].strip()
+        self.preprocessor.handle_directive(text, self.line, self.conditions)
@@ -0,0 +1,153 @@
+import os
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.lexer.diagnostic import Diagnostic
+from .source_map import SourceMap
+
+
+def file_mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+# #if !defined(X) и #if !defined X — то же, что #ifndef X
+_NOT_DEFINED = re.compile(r'#if\s*!\s*defined(?:\s*\(\s*(\w+)\s*\)|\s+(\w+))\s*$')
+
+
+def find_guard(lines: List[str]) -> Optional[str]:
+    # Имя макроса-стража, если файл целиком внутри #ifndef X (или
+    # #if !defined(X)) / #define X ... #endif без других ветвей. Пустые
+    # строки и однострочные комментарии вокруг не мешают. Повторное
+    # включение при определённом X можно пропустить, не читая файл
+    significant = []
+    for line in lines:
+        stripped = line.strip()
+        if stripped and not stripped.startswith('//'):
+            significant.append(stripped)
+    if len(significant) < 3:
+        return None
+    if significant[0].startswith('#ifndef'):
+        guard = significant[0][7:].strip()
+    else:
+        match = _NOT_DEFINED.match(significant[0])
+        if match is None:
+            return None
+        guard = match.group(1) or match.group(2)
+    definition = significant[1][7:].split() if significant[1].startswith('#define') else []
+    if not guard or definition[:1] != [guard]:
+        return None
+
+    depth = 0
+    for number, line in enumerate(significant):
+        if line.startswith('#if'):
+            depth += 1
+        elif line.startswith('#endif'):
+            depth -= 1
+            if depth == 0:
+                return guard if number == len(significant) - 1 else None
+        elif depth == 1 and line.startswith(('#else', '#elif')):
+            return None
+    return None
+
+
+# Что включаемый файл прочитал и изменил при обработке. Для каждого имени
+# запоминается значение (None — не определён) до первого обращения файла
+# к нему: проверка или слово в тексте — чтение, #define/#undef — запись.
+# Слова в значениях макросов тоже читаются: от них зависит раскрытие
+class HeaderRecorder:
+
+    def __init__(self, macros: Dict[str, str]):
+        # Порядок таблицы на входе: при равной длине имён от него зависит
+        # очередь раскрытия
+        self.entry_order = list(macros)
+        self.macros: Dict[str, Optional[str]] = {}
+        # Изменения таблицы по порядку: ('define', имя, значение) или ('undef', имя)
+        self.effects: List[tuple] = []
+        # Файлы, отмеченные #pragma once, и состояние проверенных отметок
+        self.once: List[str] = []
+        self.once_state: Dict[str, bool] = {}
+        # Прочитанные файлы (сам файл и вложенные) -> mtime
+        self.files: Dict[str, int] = {}
+        # Таблица с именами не из символов слова раскрывается по очереди,
+        # и результат зависит от всех макросов — такой файл не кэшируется
+        self.cacheable = True
+
+
+class HeaderEntry:
+
+    def __init__(self, lines: List[str], source_map: SourceMap, errors: List[Diagnostic],
+                 recorder: HeaderRecorder, include_dirs: Tuple[str, ...]):
+        self.lines = lines
+        self.length = sum(map(len, lines))
+        self.source_map = source_map
+        self.errors = errors
+        self.effects = recorder.effects
+        self.once = recorder.once
+        self.once_state = recorder.once_state
+        self.files = recorder.files
+        self.macros = recorder.macros
+        self.order = tuple(name for name in recorder.entry_order if name in recorder.macros)
+        self.include_dirs = include_dirs
+
+    def matches(self, macros: Dict[str, str], once: Set[str], include_stack: List[str],
+                include_dirs: Tuple[str, ...]) -> bool:
+        # Повторная обработка дала бы тот же результат
+        if include_dirs != self.include_dirs:
+            return False
+        for name, value in self.macros.items():
+            if macros.get(name) != value:
+                return False
+        for path, marked in self.once_state.items():
+            if (path in once) != marked:
+                return False
+        if any(path in self.files for path in include_stack):
+            return False
+        if len(self.order) > 1:
+            if tuple(name for name in macros if name in self.macros) != self.order:
+                return False
+        return all(file_mtime(path) == mtime for path, mtime in self.files.items())
+
+
+# Кэш обработанных включаемых файлов на всю сборку: один объект передаётся
+# всем препроцессорам, и файл, включённый сотней единиц трансляции,
+# читается и обрабатывается один раз на каждое различимое состояние
+# макросов. Ключ — реальный путь, варианты проверяются HeaderEntry.matches
+class HeaderCache:
+
+    def __init__(self):
+        self.entries: Dict[str, List[HeaderEntry]] = {}
+        # Путь -> (mtime, имя стража или None)
+        self.guards: Dict[str, Tuple[int, Optional[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def guard(self, path: str, mtime: int) -> Optional[str]:
+        cached = self.guards.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        return None
+
+    def set_guard(self, path: str, mtime: int, guard: Optional[str]) -> None:
+        self.guards[path] = (mtime, guard)
+
+    def lookup(self, path: str, macros: Dict[str, str], once: Set[str], include_stack: List[str],
+               include_dirs: Tuple[str, ...]) -> Optional[HeaderEntry]:
+        for entry in self.entries.get(path, ()):
+            if entry.matches(macros, once, include_stack, include_dirs):
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def store(self, path: str, entry: HeaderEntry) -> None:
+        variants = self.entries.setdefault(path, [])
+        # Вариант с изменившимися файлами больше не подойдёт
+        mtime = entry.files[path]
+        variants[:] = [variant for variant in variants if variant.files[path] == mtime]
+        variants.append(entry)
+
+    def stats(self) -> str:
+        return f"Кэш заголовков: попаданий {self.hits}, промахов {self.misses}"
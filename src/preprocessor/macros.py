@@ -1,162 +1,282 @@
 
-class MacroProcessor:
-    def __init__(self):
-        self.macros = {}
-        self.conditional_stack = []
-        self.errors = []
-        self.recursion_depth = {}
-        self.max_recursion_depth = 100
+import re
+
+from src.lexer.diagnostic import Diagnostic, Severity
+from .preprocessor import Preprocessor
+from .source_map import add_run
+
+
+WORD = re.compile(r'\w+')
+
+
+def identifiers(text: str):
+    # Идентификаторы (начало, конец, имя): с буквы или '_', дальше буквы,
+    # цифры и '_'. Цифры в начале слова идентификатору не принадлежат
+    for match in WORD.finditer(text):
+        start, end = match.span()
+        while not (text[start].isalpha() or text[start] == '_'):
+            start += 1
+            if start == end:
+                break
+        else:
+            yield start, end, text[start:end]
+
+
+# Раскрытие макроса: части по порядку — строки значения и раскрытия
+# вложенных макросов (общие для всех, кто на них ссылается) и имена,
+# оставленные как есть из-за цикла. Текст и отрезки цепочек (см.
+# add_run) собираются при первом использовании в строке
+class Expansion:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.parts = []
+        self.cycles = []
+        self.text = None
+        self.runs = None
+
+
+# Препроцессор без удаления комментариев: тот же построчный проход и стек
+# условий, что у Preprocessor, но директивы разбираются по словам, макросы
+# раскрываются полностью, а ошибки имеют коды M
+class MacroProcessor(Preprocessor):
+    def __init__(self, error_limit=None):
+        super().__init__("", error_limit)
+        # Готовые раскрытия макросов и обратные зависимости: имя -> макросы,
+        # в значениях которых оно встречается. (Пере)определение имени
+        # сбрасывает раскрытия всех макросов, зависящих от него.
+        # Раскрытие с циклом зависит от того, какие макросы уже
+        # раскрываются, и хранится отдельно — только для использования в
+        # строке, где выше по цепочке никого нет
+        self._expansions = {}
+        self._cyclic = {}
+        self._dependents = {}
 
     def define(self, name: str, value: str = ""):
         if not self._is_valid_identifier(name):
-            self.errors.append(f"[Ошибка] Некорректное имя макроса: {name}")
+            self.errors.report(Diagnostic('M001', Severity.ERROR, None, None, (name,)))
             return
 
         if name in self.macros:
-            self.errors.append(f"[Предупреждение] Переопределение макроса: {name}")
+            self.errors.report(Diagnostic('M002', Severity.WARNING, None, None, (name,)))
 
         self.macros[name] = value
-        self.recursion_depth[name] = 0
+        self._invalidate(name)
 
     def undefine(self, name: str):
         if name in self.macros:
             del self.macros[name]
-            del self.recursion_depth[name]
+            self._invalidate(name)
+
+    def _invalidate(self, name: str):
+        self.evaluator.invalidate()
+        self._expansions.pop(name, None)
+        self._cyclic.pop(name, None)
+        pending = list(self._dependents.get(name, ()))
+        while pending:
+            current = pending.pop()
+            dropped = self._expansions.pop(current, None)
+            if self._cyclic.pop(current, None) is not None or dropped is not None:
+                pending.extend(self._dependents.get(current, ()))
 
     def is_defined(self, name: str) -> bool:
         return name in self.macros
 
     def process_directives(self, source: str) -> str:
-        lines = source.splitlines(keepends=True)
-        result_lines = []
-        skip_block = False
-        skip_depth = 0
+        return ''.join(self.process_lines(source.splitlines(keepends=True)))
+
+    def _conditional(self, line: str, line_num: int, active: bool):
+        parts = line.split()
+        directive = parts[0].lower()
 
-        for line_num, line in enumerate(lines, 1):
-            stripped = line.strip()
+        if directive in ('#ifdef', '#ifndef'):
+            if len(parts) != 2:
+                if active:
+                    self.errors.report(Diagnostic('M003', Severity.ERROR, line_num, None, (directive,)))
+                return directive, None
+            return directive, parts[1]
 
-            if skip_block and not stripped.startswith('#endif'):
-                continue
+        elif directive in ('#if', '#elif'):
+            # Пустое выражение — синтаксическая ошибка при вычислении
+            return directive, line[len(parts[0]):].strip()
 
-            if stripped.startswith('#'):
-                processed, skip_block, skip_depth = self._process_directive(
-                    stripped, line_num, skip_block, skip_depth
-                )
-                if processed is not None:
-                    result_lines.append(processed + '\n')
-                continue
+        elif directive in ('#else', '#endif'):
+            return directive, None
 
-            if not skip_block:
-                processed_line = self._expand_macros(line, line_num)
-                result_lines.append(processed_line)
-            else:
-                result_lines.append(line)
+        return None
 
-        return ''.join(result_lines)
+    def _condition_error(self, kind: str, directive: str, expression: str, line_num: int) -> None:
+        code = {'syntax': 'M003', 'division': 'M006', 'unmatched': 'M007'}[kind]
+        self.errors.report(Diagnostic(code, Severity.ERROR, line_num, None, (directive,)))
 
-    def _process_directive(self, line: str, line_num: int,
-                           skip_block: bool, skip_depth: int):
+    def _process_directive(self, line: str, line_num: int) -> None:
         parts = line.split()
         directive = parts[0].lower()
 
         if directive == '#define':
             if len(parts) < 2:
-                self.errors.append(f"[Строка {line_num}] Ошибка: синтаксическая ошибка в #define")
-                return None, skip_block, skip_depth
+                self.errors.report(Diagnostic('M003', Severity.ERROR, line_num, None, ('#define',)))
+                return
 
             name = parts[1]
             value = ' '.join(parts[2:]) if len(parts) > 2 else ""
             self.define(name, value)
-            return None, skip_block, skip_depth
 
         elif directive == '#undef':
             if len(parts) != 2:
-                self.errors.append(f"[Строка {line_num}] Ошибка: синтаксическая ошибка в #undef")
-                return None, skip_block, skip_depth
+                self.errors.report(Diagnostic('M003', Severity.ERROR, line_num, None, ('#undef',)))
+                return
 
             name = parts[1]
             self.undefine(name)
-            return None, skip_block, skip_depth
-
-        elif directive == '#ifdef':
-            if len(parts) != 2:
-                self.errors.append(f"[Строка {line_num}] Ошибка: синтаксическая ошибка в #ifdef")
-                return None, skip_block, skip_depth
-
-            name = parts[1]
-            condition_met = self.is_defined(name)
-
-            if skip_block:
-                skip_depth += 1
-            elif not condition_met:
-                skip_block = True
-                skip_depth = 1
-
-            return None, skip_block, skip_depth
-
-        elif directive == '#ifndef':
-            if len(parts) != 2:
-                self.errors.append(f"[Строка {line_num}] Ошибка: синтаксическая ошибка в #ifndef")
-                return None, skip_block, skip_depth
-
-            name = parts[1]
-            condition_met = not self.is_defined(name)
-
-            if skip_block:
-                skip_depth += 1
-            elif not condition_met:
-                skip_block = True
-                skip_depth = 1
-
-            return None, skip_block, skip_depth
-
-        elif directive == '#endif':
-            if skip_depth > 0:
-                skip_depth -= 1
-                if skip_depth == 0:
-                    skip_block = False
-
-            return None, skip_block, skip_depth
 
         else:
-            self.errors.append(f"[Строка {line_num}] Ошибка: неизвестная директива: {directive}")
-            return None, skip_block, skip_depth
-
-    def _expand_macros(self, line: str, line_num: int) -> str:
-        result = []
-        i = 0
-
-        while i < len(line):
-            if line[i].isalpha() or line[i] == '_':
-                start = i
-                while i < len(line) and (line[i].isalnum() or line[i] == '_'):
-                    i += 1
-
-                name = line[start:i]
-
-                if name in self.macros:
-                    if self.recursion_depth.get(name, 0) >= self.max_recursion_depth:
-                        self.errors.append(
-                            f"[Строка {line_num}] Ошибка: обнаружена рекурсия в макросе: {name}"
-                        )
-                        result.append(name)
-                        continue
-
-                    self.recursion_depth[name] += 1
-                    value = self.macros[name]
-                    expanded_value = self._expand_macros(value, line_num)
-                    self.recursion_depth[name] -= 1
-
-                    result.append(expanded_value)
-                else:
-                    result.append(name)
-
+            self.errors.report(Diagnostic('M004', Severity.ERROR, line_num, None, (directive,)))
+
+    def _process_text(self, line: str, line_num: int):
+        segments = [(0, 0, ())]
+        return self._expand_macros(line, line_num, segments), segments
+
+    def _expand_macros(self, line: str, line_num: int, segments=None) -> str:
+        # segments собирает отрезки карты исходника (см. SourceMap). О
+        # каждом цикле сообщается один раз на строку
+        pieces = []
+        last = 0
+        shift = 0
+        reported = set()
+        macros = self.macros
+        for start, end, name in identifiers(line):
+            if name not in macros:
                 continue
-
-            result.append(line[i])
-            i += 1
-
-        return ''.join(result)
+            expansion = self._expansion(name)
+            for cycle in expansion.cycles:
+                if cycle not in reported:
+                    reported.add(cycle)
+                    self.errors.report(Diagnostic('M005', Severity.ERROR, line_num, None, (cycle,)))
+            text, runs = self._assemble(expansion)
+
+            if segments is not None:
+                out = start + shift
+                for offset, chain in runs:
+                    segments.append((out + offset, start, chain))
+                segments.append((out + len(text), end, ()))
+            pieces.append(line[last:start])
+            pieces.append(text)
+            shift += len(text) - (end - start)
+            last = end
+
+        if not pieces:
+            return line
+        pieces.append(line[last:])
+        return ''.join(pieces)
+
+    def _expansion(self, name: str) -> Expansion:
+        # Раскрытие макроса, использованного в строке. Обход в глубину с
+        # явным стеком кадров [раскрытие, значение, идентификаторы значения,
+        # конец уже разобранной части]; имена на текущем пути не
+        # раскрываются — повтор имени на пути это цикл. Раскрытие без
+        # циклов не зависит от пути и хранится для всех, кто на него
+        # ссылается
+        expansions = self._expansions
+        cached = expansions.get(name) or self._cyclic.get(name)
+        if cached is not None:
+            return cached
+
+        macros = self.macros
+        dependents = self._dependents
+        # Имена из значений всех пройденных макросов: раскрытие с циклом
+        # зависит от каждого из них напрямую
+        mentioned = set()
+        path = {name}
+        frames = [[Expansion(name), macros[name], identifiers(macros[name]), 0]]
+        while True:
+            frame = frames[-1]
+            expansion, value, words, last = frame
+            for start, end, inner in words:
+                dependents.setdefault(inner, set()).add(expansion.name)
+                mentioned.add(inner)
+                if inner not in macros:
+                    continue
+                if inner in path:
+                    if inner not in expansion.cycles:
+                        expansion.cycles.append(inner)
+                    continue
+                expansion.parts.append(value[last:start])
+                frame[3] = end
+                child = expansions.get(inner)
+                if child is None:
+                    path.add(inner)
+                    frames.append([Expansion(inner), macros[inner], identifiers(macros[inner]), 0])
+                    break
+                self._attach(expansion, child)
+                last = end
+            else:
+                expansion.parts.append(value[last:])
+                frames.pop()
+                path.discard(expansion.name)
+                if not expansion.cycles:
+                    expansions[expansion.name] = expansion
+                if not frames:
+                    break
+                self._attach(frames[-1][0], expansion)
+
+        if expansion.cycles:
+            for inner in mentioned:
+                dependents.setdefault(inner, set()).add(name)
+            self._cyclic[name] = expansion
+        return expansion
+
+    def _attach(self, expansion: Expansion, child: Expansion) -> None:
+        expansion.parts.append(child)
+        for cycle in child.cycles:
+            if cycle not in expansion.cycles:
+                expansion.cycles.append(cycle)
+
+    def _assemble(self, expansion: Expansion):
+        # Текст раскрытия и отрезки цепочек (смещение, имена макросов от
+        # внешнего к внутреннему). Отрезок нулевой длины заменяется
+        # следующим (см. add_run), поэтому отрезок получает кортеж имён
+        # текущего пути, только когда в нём появляется текст; кортеж
+        # строится один раз на вложенное раскрытие
+        if expansion.text is not None:
+            return expansion.text, expansion.runs
+
+        pieces = []
+        length = 0
+        path = [expansion.name]
+        # Кадр: [части раскрытия, кортеж имён пути или None]
+        stack = [[iter(expansion.parts), None]]
+        runs = [(0, stack[0])]
+        while stack:
+            frame = stack[-1]
+            for part in frame[0]:
+                if not isinstance(part, str):
+                    path.append(part.name)
+                    stack.append([iter(part.parts), None])
+                    add_run(runs, length, stack[-1])
+                    break
+                if part:
+                    offset, owner = runs[-1]
+                    if isinstance(owner, list):
+                        if owner[1] is None:
+                            owner[1] = tuple(path)
+                        runs[-1] = offset, owner[1]
+                    pieces.append(part)
+                    length += len(part)
+            else:
+                stack.pop()
+                path.pop()
+                if stack:
+                    add_run(runs, length, stack[-1])
+
+        text = ''.join(pieces)
+        if len(runs) > 1 and runs[-1][0] == len(text):
+            runs.pop()
+        if isinstance(runs[-1][1], list):
+            # Пустое раскрытие: единственный отрезок самого макроса
+            runs[-1] = 0, (expansion.name,)
+        expansion.text, expansion.runs = text, runs
+        return text, runs
 
     def _is_valid_identifier(self, name: str) -> bool:
         if not name or not (name[0].isalpha() or name[0] == '_'):
@@ -169,4 +289,4 @@ class MacroProcessor:
         return True
 
     def get_errors(self):
-        return self.errors
\ No newline at end of file
+        return [str(error) for error in self.errors]
\ No newline at end of file
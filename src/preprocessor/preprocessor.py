@@ -1,68 +1,253 @@
+import os
 import re
-from typing import List, Tuple, Dict, Optional
+from bisect import bisect_right
+from typing import Iterable, Iterator, List, Tuple, Dict, Optional, Sequence, Set
+
+from src.lexer.diagnostic import Diagnostic, DiagnosticList, Severity
+from src.lexer.source import DEFAULT_CHUNK_SIZE, SourceReader
+from .expression import ExpressionError, ExpressionEvaluator
+from .include import HeaderCache, HeaderEntry, HeaderRecorder, file_mtime, find_guard
+from .source_map import Segment, SourceMap, add_run, chain_names
+
+
+# Слово в смысле \b: имена макросов из таких символов раскрываются за один
+# проход по строке
+WORD = re.compile(r'\w+')
+
+
+def split_lines(chunks: Iterable[str]) -> Iterator[str]:
+    # Строки с окончаниями, как str.splitlines(keepends=True) от всего
+    # текста, но из фрагментов. Строка, оканчивающаяся на '\r', ждёт
+    # следующего фрагмента: это может быть половина '\r\n'
+    pending = ''
+    for chunk in chunks:
+        lines = (pending + chunk).splitlines(keepends=True)
+        pending = lines.pop() if lines else ''
+        yield from lines
+        if pending and pending[-1] != '\r' and pending.splitlines()[0] != pending:
+            # Последняя строка фрагмента уже с окончанием
+            yield pending
+            pending = ''
+    if pending:
+        yield pending
+
+
+def read_chunks(reader: SourceReader) -> Iterator[str]:
+    chunk = reader.read()
+    while chunk:
+        yield chunk
+        chunk = reader.read()
+
+
+class PreprocessedReader(SourceReader):
+    # Результат препроцессора как вход Scanner: строки собираются во
+    # фрагменты по мере чтения, целиком текст не хранится
+
+    def __init__(self, lines: Iterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.lines = iter(lines)
+        self.chunk_size = chunk_size
+
+    def read(self) -> str:
+        pieces = []
+        size = 0
+        for line in self.lines:
+            pieces.append(line)
+            size += len(line)
+            if size >= self.chunk_size:
+                break
+        return ''.join(pieces)
 
 
 class Preprocessor:
 
-    def __init__(self, source: str):
+    def __init__(self, source: str = "", error_limit: Optional[int] = None, path: Optional[str] = None,
+                 include_dirs: Sequence[str] = (), header_cache: Optional[HeaderCache] = None):
         self.source = source
-        self.errors: List[Tuple[int, int, str]] = []  # (line, col, message)
+        self.errors = DiagnosticList(error_limit)
         self.macros: Dict[str, str] = {}
         self.defines: Dict[str, bool] = {}
         self.in_block_comment = False
+        # Порядок раскрытия и готовые раскрытия макросов; сбрасываются при
+        # изменении таблицы макросов
+        self._order: Optional[Dict[str, int]] = None
+        self._expansions: Dict[str, Tuple[str, list]] = {}
+        # Значения условий #if/#elif; результаты сбрасываются при изменении
+        # таблицы макросов
+        self.evaluator = ExpressionEvaluator()
+        # Позиции результата в исходнике; заполняется при обработке
+        self.source_map = SourceMap()
+
+        # #include "файл" ищется рядом с включающим файлом (для основного —
+        # рядом с path или в текущем каталоге), затем в include_dirs;
+        # #include <файл> — только в include_dirs. Кэш заголовков можно
+        # разделить между препроцессорами всей сборки
+        self.path = path
+        self.include_dirs = tuple(include_dirs)
+        self.header_cache = header_cache if header_cache is not None else HeaderCache()
+        # Сбрасывается сканером, который не может вставить текст файла
+        self.allow_include = True
+        self._once: Set[str] = set()
+        self._include_stack: List[str] = []
+        self._include_dirs_stack: List[str] = []
+        # Записи зависимостей обрабатываемых сейчас файлов, от внешнего к
+        # вложенному; пусто вне #include
+        self._recorders: List[HeaderRecorder] = []
 
     def define(self, name: str, value: str = "1"):
+        if self._recorders:
+            self._record_effect(name, ('define', name, value))
 
         self.macros[name] = value
         self.defines[name] = True
+        self._order = None
+        self.evaluator.invalidate()
 
     def undefine(self, name: str):
+        if self._recorders:
+            self._record_effect(name, ('undef', name))
 
         if name in self.macros:
             del self.macros[name]
+            self._order = None
+            self.evaluator.invalidate()
         self.defines[name] = False
 
-    def process(self) -> str:
-
-        lines = self.source.splitlines(keepends=True)
-        result_lines = []
-
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            line_idx = i + 1
-
+    def is_defined(self, name: str) -> bool:
+        if self._recorders:
+            self._touch(name)
+        return self.defines.get(name, False)
 
-            if line.lstrip().startswith('#'):
-                processed_line, skip_rest = self._process_directive(line, line_idx, lines, i)
-                if skip_rest:
-
-                    i = self._find_endif(lines, i)
-                    continue
+    def process(self) -> str:
+        return ''.join(self.process_lines(self.source.splitlines(keepends=True)))
+
+    def process_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        # Строки входа -> строки результата, по одной: память не растёт с
+        # размером входа. Условная компиляция — один стек: на каждое
+        # открытое условие (#if, #ifdef, #ifndef) хранится состояние его
+        # текущей ветки: True — активна, False — неактивна, но следующая
+        # #elif/#else ещё может быть выбрана, None — неактивна до #endif
+        # (ветка уже выбрана или всё условие внутри неактивной ветки).
+        # Строки неактивной ветки не разбираются, учитываются только
+        # вложенные условия и #elif/#else
+        self._start(SourceMap())
+        out_lines = yield from self._process_file(lines, self.source_map)
+        self._finish(out_lines)
+
+    def process_variants(self, configurations: Sequence[Dict[str, str]], workers: Optional[int] = None):
+        # source под каждым набором макросов (поверх уже определённых) ->
+        # список VariantResult, как от отдельных препроцессоров. Разбор
+        # исходника общий, с workers > 1 варианты делятся между процессами.
+        # Импорт здесь: модуль variants сам зависит от Preprocessor
+        from .variants import process_variants
+
+        return process_variants(self, configurations, workers)
+
+    def _start(self, source_map: SourceMap) -> None:
+        self.source_map = source_map
+        self._once = set()
+        self._include_stack = [os.path.realpath(self.path)] if self.path else []
+
+    def _process_file(self, lines: Iterable[str], source_map: SourceMap) -> Iterator[str]:
+        # Строки одного файла; возвращает число строк результата
+        conditions: List[Optional[bool]] = []
+        src_offset = 0
+        out_offset = 0
+        out_lines = 0
+
+        for line_idx, line in enumerate(lines, 1):
+            source_map.add_source(src_offset, line)
+            stripped = line.strip()
+
+            if stripped.startswith('#'):
+                header = self.handle_directive(stripped, line_idx, conditions)
+                if header is not None:
+                    source_map.include(header.source_map, out_offset)
+                    out_offset += header.length
+                    out_lines += len(header.lines)
+                    yield from header.lines
+            elif not conditions or conditions[-1]:
+                processed_line, segments = self._process_text(line, line_idx)
                 if processed_line is not None:
-                    result_lines.append(processed_line)
-                i += 1
-                continue
-
-            # Обработка комментариев и подстановка макросов
-            processed_line = self._process_line(line, line_idx)
-            if processed_line is not None:
-
-                processed_line = self._expand_macros(processed_line)
-                result_lines.append(processed_line)
-
-            i += 1
-
-
-        if self.in_block_comment:
-            self.errors.append((len(result_lines), 1, "Unterminated block comment"))
-
-        return ''.join(result_lines)
+                    source_map.extend(segments, out_offset, src_offset)
+                    out_offset += len(processed_line)
+                    out_lines += 1
+                    yield processed_line
+
+            src_offset += len(line)
+
+        return out_lines
+
+    def handle_directive(self, line: str, line_idx: int, conditions: List[Optional[bool]]) -> Optional[HeaderEntry]:
+        # Директива line (без пробелов по краям) со стеком условий
+        # вызывающего. Для #include возвращает обработанный файл, текст
+        # которого вызывающий вставляет вместо директивы
+        active = not conditions or conditions[-1]
+        conditional = self._conditional(line, line_idx, active)
+        if conditional is None:
+            if active:
+                return self._process_directive(line, line_idx)
+            return None
+
+        kind, argument = conditional
+        if kind == '#endif':
+            if conditions:
+                conditions.pop()
+        elif kind in ('#elif', '#else'):
+            if not conditions:
+                self._condition_error('unmatched', kind, '', line_idx)
+            elif conditions[-1] is False:
+                # Ни одна ветка ещё не выбрана: условие #elif вычисляется
+                # только здесь
+                conditions[-1] = kind == '#else' or self._evaluate(kind, argument, line_idx)
+            else:
+                conditions[-1] = None
+        elif not active or argument is None:
+            # Вложенное условие неактивной ветки или ошибочное условие без
+            # имени: уровень всё равно открывается, чтобы #endif закрыл
+            # именно его, и наследует активность внешнего
+            conditions.append(True if active else None)
+        elif kind == '#if':
+            conditions.append(self._evaluate(kind, argument, line_idx))
+        else:
+            conditions.append(self.is_defined(argument) == (kind == '#ifdef'))
+        return None
 
-    def _process_directive(self, line: str, line_idx: int, all_lines: List[str], current_idx: int) -> Tuple[
-        Optional[str], bool]:
+    def _conditional(self, line: str, line_idx: int, active: bool) -> Optional[Tuple[str, Optional[str]]]:
+        # (директива, аргумент) для условных директив, иначе None. Аргумент
+        # #ifdef/#ifndef — имя, #if/#elif — текст выражения
 
-        line = line.strip()
+        if line.startswith('#ifdef'):
+            return '#ifdef', line[6:].strip()
+        elif line.startswith('#ifndef'):
+            return '#ifndef', line[7:].strip()
+        elif line.startswith('#if') and not WORD.match(line, 3):
+            return '#if', line[3:].strip()
+        elif line.startswith('#elif') and not WORD.match(line, 5):
+            return '#elif', line[5:].strip()
+        elif line.startswith('#else') and not WORD.match(line, 5):
+            return '#else', None
+        elif line.startswith('#endif'):
+            return '#endif', None
+        return None
+
+    def _evaluate(self, directive: str, expression: str, line_idx: int) -> bool:
+        # Значение условия #if/#elif; ошибочное условие ложно
+        if self._recorders:
+            # Условие читает свои имена и имена в значениях их макросов
+            self._record_text(expression)
+        try:
+            return self.evaluator.evaluate(expression, self.macros) != 0
+        except ExpressionError as error:
+            self._condition_error(error.kind, directive, expression, line_idx)
+            return False
+
+    def _condition_error(self, kind: str, directive: str, expression: str, line_idx: int) -> None:
+        # kind: 'syntax' и 'division' — см. ExpressionError, 'unmatched' —
+        # #elif/#else без открытого условия
+        code = {'syntax': 'P007', 'division': 'P008', 'unmatched': 'P009'}[kind]
+        self.errors.report(Diagnostic(code, Severity.ERROR, line_idx, 1, (directive, expression)))
+
+    def _process_directive(self, line: str, line_idx: int) -> Optional[HeaderEntry]:
 
         # #define NAME VALUE
         if line.startswith('#define'):
@@ -71,60 +256,374 @@ class Preprocessor:
                 name = parts[0]
                 value = parts[1] if len(parts) > 1 else "1"
                 self.define(name, value)
-            return (None, False)
 
 
         elif line.startswith('#undef'):
             name = line[6:].strip()
             self.undefine(name)
-            return (None, False)
 
+        elif line.startswith('#include'):
+            return self._include(line[8:].strip(), line_idx)
 
-        elif line.startswith('#ifdef'):
-            name = line[6:].strip()
-            if not self.defines.get(name, False):
-                # Пропускаем до #endif
-                return (None, True)
-            return (None, False)
+        elif line.startswith('#pragma') and line[7:].strip() == 'once':
+            if self._include_stack:
+                self._mark_once(self._include_stack[-1])
 
+        else:
+            self.errors.report(Diagnostic('P002', Severity.ERROR, line_idx, 1, (line,)))
+        return None
+
+    def _include(self, argument: str, line_idx: int) -> Optional[HeaderEntry]:
+        # Обработанный включаемый файл или None, если включать нечего:
+        # ошибка, #pragma once или страж уже определён
+        if not self.allow_include:
+            self.errors.report(Diagnostic('P006', Severity.ERROR, line_idx, 1, (argument,)))
+            return None
+        if len(argument) < 3 or (argument[0], argument[-1]) not in (('"', '"'), ('<', '>')):
+            self.errors.report(Diagnostic('P003', Severity.ERROR, line_idx, 1, (argument,)))
+            return None
+
+        name = argument[1:-1]
+        path = self._resolve(name, argument[0] == '"')
+        if path is None:
+            self.errors.report(Diagnostic('P004', Severity.ERROR, line_idx, 1, (name,)))
+            return None
+        key = os.path.realpath(path)
+        mtime = file_mtime(key)
+
+        if self._recorders:
+            for recorder in self._recorders:
+                recorder.once_state.setdefault(key, key in self._once)
+                recorder.files.setdefault(key, mtime)
+        if key in self._once:
+            return None
+        guard = self.header_cache.guard(key, mtime)
+        if guard is not None and self.is_defined(guard):
+            return None
+        if key in self._include_stack:
+            # Результат файлов, вложенных в key, зависит от того, кто их
+            # включил, — их нельзя кэшировать
+            nested = len(self._include_stack) - self._include_stack.index(key) - 1
+            for recorder in self._recorders[len(self._recorders) - nested:]:
+                recorder.cacheable = False
+            self.errors.report(Diagnostic('P005', Severity.ERROR, line_idx, 1, (name,)))
+            return None
+
+        entry = self.header_cache.lookup(key, self.macros, self._once, self._include_stack, self.include_dirs)
+        if entry is None:
+            entry = self._process_header(path, key, mtime)
+            if entry is None:
+                self.errors.report(Diagnostic('P004', Severity.ERROR, line_idx, 1, (name,)))
+                return None
+        else:
+            self._replay(entry)
 
-        elif line.startswith('#ifndef'):
-            name = line[7:].strip()
-            if self.defines.get(name, False):
-                return (None, True)
-            return (None, False)
+        for error in entry.errors:
+            self.errors.report(error)
+        return entry
 
+    def _resolve(self, name: str, quoted: bool) -> Optional[str]:
+        directories = list(self.include_dirs)
+        if quoted:
+            if self._include_dirs_stack:
+                directories.insert(0, self._include_dirs_stack[-1])
+            else:
+                directories.insert(0, os.path.dirname(self.path) if self.path else '')
+        for directory in directories:
+            path = os.path.normpath(os.path.join(directory, name))
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def _process_header(self, path: str, key: str, mtime: int) -> Optional[HeaderEntry]:
+        # Файл обрабатывается с теми же макросами, но своими стеком
+        # условий, состоянием комментария и картой; ошибки помечаются путём
+        try:
+            with open(path, encoding='utf-8') as file:
+                lines = file.read().splitlines(keepends=True)
+        except (OSError, UnicodeDecodeError):
+            return None
+        self.header_cache.set_guard(key, mtime, find_guard(lines))
+
+        recorder = HeaderRecorder(self.macros)
+        recorder.files[key] = mtime
+        source_map = SourceMap(path)
+        errors = self.errors
+        in_block_comment = self.in_block_comment
+        self.errors = DiagnosticList()
+        self.in_block_comment = False
+        self._recorders.append(recorder)
+        self._include_stack.append(key)
+        self._include_dirs_stack.append(os.path.dirname(path))
+        try:
+            output = list(self._process_file(lines, source_map))
+            if self.in_block_comment:
+                self.errors.report(Diagnostic('P001', Severity.ERROR, len(output), 1))
+            header_errors = [
+                error if error.file is not None else Diagnostic(
+                    error.code, error.severity, error.line, error.column, error.args, error.expansion, path)
+                for error in self.errors
+            ]
+        finally:
+            self.errors = errors
+            self.in_block_comment = in_block_comment
+            self._recorders.pop()
+            self._include_stack.pop()
+            self._include_dirs_stack.pop()
+
+        # Текст после директивы начинается с новой строки
+        if output and not output[-1].endswith(('\n', '\r')):
+            output[-1] += '\n'
+        entry = HeaderEntry(output, source_map, header_errors, recorder, self.include_dirs)
+        if recorder.cacheable:
+            self.header_cache.store(key, entry)
+        for outer in self._recorders:
+            outer.cacheable = outer.cacheable and recorder.cacheable
+        return entry
+
+    def _replay(self, entry: HeaderEntry) -> None:
+        # Готовый файл: его зависимости становятся зависимостями внешних
+        # обрабатываемых файлов, изменения таблицы повторяются
+        for recorder in self._recorders:
+            for name, value in entry.macros.items():
+                recorder.macros.setdefault(name, value)
+            for path, marked in entry.once_state.items():
+                recorder.once_state.setdefault(path, marked)
+            for path, mtime in entry.files.items():
+                recorder.files.setdefault(path, mtime)
+        for effect in entry.effects:
+            if effect[0] == 'define':
+                self.define(effect[1], effect[2])
+            else:
+                self.undefine(effect[1])
+        for path in entry.once:
+            self._mark_once(path)
+
+    def _mark_once(self, key: str) -> None:
+        self._once.add(key)
+        for recorder in self._recorders:
+            recorder.once.append(key)
+
+    def _touch(self, name: str) -> None:
+        value = self.macros.get(name)
+        for recorder in self._recorders:
+            if name not in recorder.macros:
+                recorder.macros[name] = value
+
+    def _record_effect(self, name: str, effect: tuple) -> None:
+        self._touch(name)
+        for recorder in self._recorders:
+            recorder.effects.append(effect)
+
+    def _record_text(self, text: str) -> None:
+        # Результат строки зависит от всех её слов и слов в значениях
+        # макросов, которые раскрываются
+        order = self._order
+        if order is None:
+            order = self._refresh_order()
+        if len(order) < len(self.macros):
+            for recorder in self._recorders:
+                recorder.cacheable = False
+
+        pending = WORD.findall(text)
+        seen = set()
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            self._touch(name)
+            value = self.macros.get(name)
+            if value is not None:
+                pending.extend(WORD.findall(value))
+
+    def _process_text(self, line: str, line_idx: int) -> Tuple[Optional[str], List[Segment]]:
+        # Обработка комментариев и подстановка макросов. Комментарии
+        # заменяются пробелами той же длины, поэтому до раскрытия макросов
+        # строка посимвольно совпадает с исходной
+        processed_line = self._process_line(line, line_idx)
+        if processed_line is None:
+            return None, []
+        if self._recorders:
+            self._record_text(processed_line)
+        return self._expand_macros(processed_line)
+
+    def _finish(self, out_lines: int) -> None:
+        if self.in_block_comment:
+            self.errors.report(Diagnostic('P001', Severity.ERROR, out_lines, 1))
+
+    def _expand_macros(self, line: str) -> Tuple[str, List[Segment]]:
+        # Макросы подставляются по очереди от длинных имён к коротким, и
+        # подстановка видна только макросам дальше по очереди. Для имён из
+        # символов слова это значит: слово строки заменяется раскрытием
+        # своего макроса, а внутри раскрытия — только слова с большим
+        # номером в очереди. Такие раскрытия не зависят от строки и
+        # вычисляются один раз на таблицу макросов
+        segments: List[Segment] = [(0, 0, ())]
+        if not self.macros:
+            return line, segments
+
+        order = self._order
+        if order is None:
+            order = self._refresh_order()
+        if len(order) < len(self.macros):
+            return self._expand_sequential(line)
+
+        pieces = []
+        last = 0
+        shift = 0
+        for match in WORD.finditer(line):
+            name = match.group()
+            if name not in order:
+                continue
+            start, end = match.span()
+            text, runs = self._expansion(name)
+            out = start + shift
+            for offset, chain in runs:
+                segments.append((out + offset, start, chain_names(chain)))
+            segments.append((out + len(text), end, ()))
+            pieces.append(line[last:start])
+            pieces.append(text)
+            shift += len(text) - (end - start)
+            last = end
+
+        if not pieces:
+            return line, [(0, 0, ())]
+        pieces.append(line[last:])
+        return ''.join(pieces), segments
+
+    def _refresh_order(self) -> Dict[str, int]:
+        self._expansions = {}
+        names = sorted(self.macros, key=len, reverse=True)
+        # В очередь попадают только имена-слова. Имя с другими символами
+        # может совпасть с частью слова или захватить соседей — строки с
+        # такими таблицами раскрываются по очереди
+        self._order = {name: number for number, name in enumerate(names) if WORD.fullmatch(name)}
+        return self._order
+
+    def expansion(self, name: str) -> Optional[Tuple[str, list]]:
+        # Раскрытие макроса с именем-словом без учёта макросов с другими
+        # именами; None, если такого макроса нет
+        order = self._order
+        if order is None:
+            order = self._refresh_order()
+        if name not in order:
+            return None
+        return self._expansion(name)
+
+    def _expansion(self, name: str) -> Tuple[str, list]:
+        # Раскрытие макроса и цепочки раскрытий по смещениям внутри него
+        # (см. add_run). Раскрытие зависит только от макросов дальше по
+        # очереди, поэтому цепочки любой длины считаются явным стеком от
+        # зависимостей
+        expansions = self._expansions
+        cached = expansions.get(name)
+        if cached is not None:
+            return cached
+
+        order = self._order
+        values = {}
+        stack = [name]
+        while stack:
+            current = stack[-1]
+            if current in expansions:
+                stack.pop()
+                continue
 
-        elif line.startswith('#endif'):
-            return (None, False)
+            value = values.get(current)
+            if value is None:
+                # Значение — шаблон подстановки re.sub, как при раскрытии по очереди
+                pattern = r'\b' + re.escape(current) + r'\b'
+                value = values[current] = re.sub(pattern, self.macros[current], current)
+
+            number = order[current]
+            inner = [
+                match for match in WORD.finditer(value)
+                if order.get(match.group(), -1) > number
+            ]
+            missing = [match.group() for match in inner if match.group() not in expansions]
+            if missing:
+                stack.extend(missing)
+                continue
 
-        else:
-            self.errors.append((line_idx, 1, f"Unknown preprocessor directive: {line}"))
-            return (None, False)
-
-    def _find_endif(self, lines: List[str], start_idx: int) -> int:
-
-        depth = 1
-        i = start_idx + 1
-        while i < len(lines):
-            line = lines[i].strip()
-            if line.startswith('#ifdef') or line.startswith('#ifndef'):
-                depth += 1
-            elif line.startswith('#endif'):
-                depth -= 1
-                if depth == 0:
-                    return i
-            i += 1
-        return len(lines)
-
-    def _expand_macros(self, line: str) -> str:
+            chain = (current, None)
+            runs = [(0, chain)]
+            pieces = []
+            last = 0
+            length = 0
+            for match in inner:
+                start, end = match.span()
+                text, inner_runs = expansions[match.group()]
+                length += start - last
+                for offset, inner_chain in inner_runs:
+                    add_run(runs, length + offset, (current, inner_chain))
+                length += len(text)
+                add_run(runs, length, chain)
+                pieces.append(value[last:start])
+                pieces.append(text)
+                last = end
+            pieces.append(value[last:])
+
+            text = ''.join(pieces)
+            if len(runs) > 1 and runs[-1][0] == len(text):
+                runs.pop()
+            expansions[current] = text, runs
+            stack.pop()
+        return expansions[name]
+
+    def _expand_sequential(self, line: str) -> Tuple[str, List[Segment]]:
 
         result = line
+        segments: List[Segment] = [(0, 0, ())]
         for name, value in sorted(self.macros.items(), key=lambda x: len(x[0]), reverse=True):
 
             pattern = r'\b' + re.escape(name) + r'\b'
-            result = re.sub(pattern, value, result)
-        return result
+            matches = list(re.finditer(pattern, result))
+            if matches:
+                result, segments = self._substitute(result, segments, matches, name, value)
+        return result, segments
+
+    def _substitute(self, line: str, segments: List[Segment], matches, name: str,
+                    value: str) -> Tuple[str, List[Segment]]:
+        # То же, что re.sub(pattern, value, line), но с пересчётом отрезков
+        # карты: подстановка указывает на место вызова, а цепочка раскрытий
+        # удлиняется, если вызов сам появился из макроса
+        starts = [segment[0] for segment in segments]
+
+        def origin(position):
+            out, src, chain = segments[bisect_right(starts, position) - 1]
+            return (src + position - out if not chain else src), chain
+
+        def carry(low, high, shift):
+            # Отрезки участка [low, high) без подстановок, сдвинутые на shift
+            if low >= high:
+                return
+            src, chain = origin(low)
+            new_segments.append((low + shift, src, chain))
+            for out, src, chain in segments[bisect_right(starts, low):]:
+                if out >= high:
+                    break
+                new_segments.append((out + shift, src, chain))
+
+        pieces = []
+        new_segments: List[Segment] = []
+        last = 0
+        shift = 0
+        for match in matches:
+            start, end = match.span()
+            carry(last, start, shift)
+            pieces.append(line[last:start])
+
+            replacement = match.expand(value)
+            src, chain = origin(start)
+            new_segments.append((start + shift, src, chain + (name,)))
+            pieces.append(replacement)
+
+            shift += len(replacement) - (end - start)
+            last = end
+        carry(last, len(line), shift)
+        pieces.append(line[last:])
+        return ''.join(pieces), new_segments
 
     def _process_line(self, line: str, line_idx: int) -> Optional[str]:
 
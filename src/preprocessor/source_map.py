@@ -0,0 +1,163 @@
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.lexer.diagnostic import Diagnostic, DiagnosticList
+from src.lexer.line_index import LineIndex
+
+
+# Отрезок карты внутри строки: (смещение в результате, смещение в исходнике,
+# цепочка раскрытий макросов). Пустая цепочка — прямое копирование.
+Segment = Tuple[int, int, Tuple[str, ...]]
+
+
+# Цепочка раскрытий внутри готового раскрытия макроса хранится связным
+# списком (имя, продолжение): обёртка во внешний макрос не копирует её.
+# Отрезки раскрытия — список (смещение в раскрытии, цепочка).
+def add_run(runs: list, offset: int, chain) -> None:
+    # Отрезок нулевой длины заменяется следующим
+    if runs[-1][0] == offset:
+        runs[-1] = (offset, chain)
+    else:
+        runs.append((offset, chain))
+
+
+def chain_names(chain) -> Tuple[str, ...]:
+    names = []
+    while chain is not None:
+        names.append(chain[0])
+        chain = chain[1]
+    return tuple(names)
+
+
+# Карта смещений результата препроцессора в смещения исходного файла,
+# сжатая по сериям. Запись открывает отрезок результата: в отрезке
+# копирования смещения растут вместе, отрезок раскрытия макроса целиком
+# указывает на место вызова. Соседние отрезки, продолжающие друг друга,
+# сливаются, поэтому файл без директив и макросов — это одна запись.
+# Отрезки из включаемых файлов (#include) хранят номер файла: смещения
+# в них отсчитываются от начала этого файла. Файл 0 — основной.
+class SourceMap:
+
+    def __init__(self, path: Optional[str] = None, source_lines: Optional[LineIndex] = None):
+        self.out_starts = array('q')
+        self.src_starts = array('q')
+        # -1 — прямое копирование, иначе номер цепочки в chains
+        self.chain_ids = array('i')
+        self.file_ids = array('i')
+        self.chains: List[Tuple[str, ...]] = []
+        self._chain_numbers: Dict[Tuple[str, ...], int] = {}
+        # Начала физических строк исходника (по '\n'), пополняются по мере
+        # чтения: сам исходник карта не хранит. Готовый индекс source_lines
+        # могут разделять карты одного исходника
+        if source_lines is None:
+            source_lines = LineIndex()
+            source_lines.add(0, 1)
+        self.source_lines = source_lines
+        # Пути и начала строк файлов; path — путь файла 0, у основного
+        # файла единицы трансляции None
+        self.files: List[Optional[str]] = [path]
+        self.file_lines: List[LineIndex] = [self.source_lines]
+        self._file_numbers: Dict[Optional[str], int] = {path: 0}
+
+    def __len__(self) -> int:
+        return len(self.out_starts)
+
+    def add(self, out: int, src: int, chain: Tuple[str, ...] = (), file: int = 0) -> None:
+        chain_id = self._chain_id(chain) if chain else -1
+        while self.out_starts:
+            last = len(self.out_starts) - 1
+            if self.chain_ids[last] == chain_id and self.file_ids[last] == file:
+                if chain_id == -1:
+                    continues = out - self.out_starts[last] == src - self.src_starts[last]
+                else:
+                    continues = src == self.src_starts[last]
+                if continues:
+                    return
+            if self.out_starts[last] != out:
+                break
+            # Предыдущий отрезок оказался пустым
+            del self.out_starts[last], self.src_starts[last], self.chain_ids[last], self.file_ids[last]
+
+        self.out_starts.append(out)
+        self.src_starts.append(src)
+        self.chain_ids.append(chain_id)
+        self.file_ids.append(file)
+
+    def add_source(self, offset: int, text: str) -> None:
+        # Очередная строка исходника, начинающаяся со смещения offset
+        position = text.find('\n')
+        while position != -1:
+            self.source_lines.add(offset + position + 1, self.source_lines.lines[-1] + 1)
+            position = text.find('\n', position + 1)
+
+    def extend(self, segments: Iterable[Segment], out_base: int, src_base: int) -> None:
+        # Отрезки одной строки, заданные относительно её начала
+        for out, src, chain in segments:
+            self.add(out_base + out, src_base + src, chain)
+
+    def include(self, other: 'SourceMap', out_base: int) -> None:
+        # Результат включаемого файла с картой other, вставленный со
+        # смещения out_base
+        files = [self._file_number(path, lines) for path, lines in zip(other.files, other.file_lines)]
+        for out, src, chain_id, file in zip(other.out_starts, other.src_starts, other.chain_ids, other.file_ids):
+            chain = other.chains[chain_id] if chain_id != -1 else ()
+            self.add(out_base + out, src, chain, files[file])
+
+    def _file_number(self, path: Optional[str], lines: LineIndex) -> int:
+        number = self._file_numbers.get(path)
+        if number is None:
+            number = self._file_numbers[path] = len(self.files)
+            self.files.append(path)
+            self.file_lines.append(lines)
+        return number
+
+    def _chain_id(self, chain: Tuple[str, ...]) -> int:
+        number = self._chain_numbers.get(chain)
+        if number is None:
+            number = self._chain_numbers[chain] = len(self.chains)
+            self.chains.append(chain)
+        return number
+
+    def lookup(self, offset: int) -> Tuple[int, Tuple[str, ...]]:
+        # Смещение в исходнике и цепочка раскрытий для смещения результата
+        return self._lookup(offset)[:2]
+
+    def lookup_file(self, offset: int) -> Optional[str]:
+        # Путь включаемого файла для смещения результата, None — основной файл
+        return self.files[self._lookup(offset)[2]]
+
+    def _lookup(self, offset: int) -> Tuple[int, Tuple[str, ...], int]:
+        index = bisect_right(self.out_starts, offset) - 1
+        if index < 0:
+            return offset, (), 0
+        chain_id = self.chain_ids[index]
+        file = self.file_ids[index]
+        if chain_id == -1:
+            return self.src_starts[index] + offset - self.out_starts[index], (), file
+        return self.src_starts[index], self.chains[chain_id], file
+
+    def source_position(self, offset: int, file: int = 0) -> Tuple[int, int]:
+        return self.file_lines[file].position(offset)
+
+    def remap(self, errors: DiagnosticList, line_index: LineIndex) -> DiagnosticList:
+        # Диагностики с позициями в результате препроцессора (line_index —
+        # нумерация сканера, читавшего результат) переводятся в позиции
+        # исходного файла
+        remapped = DiagnosticList(errors.limit)
+        remapped.dropped = errors.dropped
+        for error in errors:
+            if error.line is not None and len(line_index):
+                src, chain, file = self._lookup(line_index.offset(error.line, error.column or 1))
+                line, column = self.source_position(src, file)
+                error = Diagnostic(
+                    error.code,
+                    error.severity,
+                    line,
+                    None if error.column is None else column,
+                    error.args,
+                    chain,
+                    self.files[file]
+                )
+            remapped.append(error)
+        return remapped
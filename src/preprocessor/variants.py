@@ -0,0 +1,253 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.lexer.diagnostic import DiagnosticList
+from src.lexer.line_index import LineIndex
+from .include import HeaderCache
+from .preprocessor import WORD, Preprocessor
+from .source_map import Segment, SourceMap
+
+
+# Исходник, разобранный один раз на все варианты сборки: отрезки обычных
+# строк, директивы и условия с ветками. Вариант проходит только по
+# выбранным веткам и не смотрит на строки остальных. Строки отрезка без
+# комментариев зависят только от состояния многострочного комментария на
+# входе, а результат раскрытия — ещё от макросов, достижимых из слов
+# отрезка; оба вычисляются один раз на каждое различимое состояние.
+# Индекс строк исходника общий для карт всех вариантов
+
+class TextRun:
+
+    def __init__(self, line_idx: int, offset: int):
+        self.line_idx = line_idx
+        self.offset = offset
+        self.lines: List[str] = []
+        # Открыт ли комментарий на входе -> (строки без комментариев, None
+        # для выброшенных; открыт ли комментарий на выходе; слова строк)
+        self.stripped: Dict[bool, Tuple[List[Optional[str]], bool, frozenset]] = {}
+        # (комментарий на входе, макросы отрезка) -> (строки результата,
+        # отрезки карты относительно начала отрезка, длина результата)
+        self.expanded: Dict[tuple, Tuple[List[str], List[Segment], int]] = {}
+
+
+class Directive:
+
+    def __init__(self, text: str, line_idx: int):
+        self.text = text
+        self.line_idx = line_idx
+
+
+class Condition:
+
+    def __init__(self):
+        # Ветки по порядку: (директива #if/#ifdef/#ifndef/#elif/#else,
+        # содержимое ветки)
+        self.branches: List[Tuple[Directive, list]] = []
+
+
+class SegmentTree:
+
+    def __init__(self, lines: Sequence[str], preprocessor: Preprocessor):
+        # Условные директивы распознаются так же, как при построчной
+        # обработке (preprocessor._conditional)
+        self.segments: list = []
+        source_map = SourceMap()
+        # Открытые условия и содержимое текущей ветки
+        conditions: List[Condition] = []
+        current = self.segments
+        offset = 0
+
+        for line_idx, line in enumerate(lines, 1):
+            source_map.add_source(offset, line)
+            stripped = line.strip()
+
+            if not stripped.startswith('#'):
+                if not current or not isinstance(current[-1], TextRun):
+                    current.append(TextRun(line_idx, offset))
+                current[-1].lines.append(line)
+                offset += len(line)
+                continue
+
+            directive = Directive(stripped, line_idx)
+            conditional = preprocessor._conditional(stripped, line_idx, False)
+            kind = conditional[0] if conditional is not None else None
+            if kind in ('#if', '#ifdef', '#ifndef'):
+                condition = Condition()
+                current.append(condition)
+                conditions.append(condition)
+                current = []
+                condition.branches.append((directive, current))
+            elif kind in ('#elif', '#else') and conditions:
+                current = []
+                conditions[-1].branches.append((directive, current))
+            elif kind == '#endif' and conditions:
+                conditions.pop()
+                current = conditions[-1].branches[-1][1] if conditions else self.segments
+            else:
+                # И #endif, #elif, #else без условия: обработаются как директивы
+                current.append(directive)
+            offset += len(line)
+
+        self.source_lines: LineIndex = source_map.source_lines
+
+
+class VariantResult:
+
+    def __init__(self, macros: Dict[str, str], output: str, errors: DiagnosticList, source_map: SourceMap):
+        self.macros = macros
+        self.output = output
+        self.errors = errors
+        self.source_map = source_map
+
+
+class VariantPreprocessor(Preprocessor):
+    # Обработка одного варианта по готовому дереву: результат тот же, что
+    # у process_lines на строках исходника
+
+    def process_segments(self, tree: SegmentTree) -> Iterator[str]:
+        self._start(SourceMap(self.path, tree.source_lines))
+        out_lines = yield from self._process_segments(tree.segments, self.source_map)
+        self._finish(out_lines)
+
+    def _process_segments(self, segments: list, source_map: SourceMap) -> Iterator[str]:
+        # Вложенные ветки — явным стеком: глубина вложенности условий не
+        # ограничена стеком вызовов
+        out_offset = 0
+        out_lines = 0
+        stack = [iter(segments)]
+        while stack:
+            segment = next(stack[-1], None)
+            if segment is None:
+                stack.pop()
+                continue
+
+            if isinstance(segment, TextRun):
+                lines, run_segments, length = self._expand_run(segment)
+                source_map.extend(run_segments, out_offset, segment.offset)
+                out_offset += length
+                out_lines += len(lines)
+                yield from lines
+
+            elif isinstance(segment, Directive):
+                header = self.handle_directive(segment.text, segment.line_idx, [])
+                if header is not None:
+                    source_map.include(header.source_map, out_offset)
+                    out_offset += header.length
+                    out_lines += len(header.lines)
+                    yield from header.lines
+
+            else:
+                # Ветки проверяются по порядку, как при построчной обработке,
+                # до первой активной; None — остальные ветки не выбираются
+                conditions: List[Optional[bool]] = []
+                for directive, children in segment.branches:
+                    self.handle_directive(directive.text, directive.line_idx, conditions)
+                    if conditions[-1] is not False:
+                        if conditions[-1]:
+                            stack.append(iter(children))
+                        break
+
+        return out_lines
+
+    def _expand_run(self, run: TextRun) -> Tuple[List[str], List[Segment], int]:
+        entry = self.in_block_comment
+        stripped = run.stripped.get(entry)
+        if stripped is None:
+            lines = [self._process_line(line, line_idx) for line_idx, line in enumerate(run.lines, run.line_idx)]
+            words = frozenset(word for line in lines if line is not None for word in WORD.findall(line))
+            stripped = run.stripped[entry] = lines, self.in_block_comment, words
+        lines, self.in_block_comment, words = stripped
+
+        key = self._macro_key(words)
+        if key is not None:
+            cached = run.expanded.get((entry, key))
+            if cached is not None:
+                return cached
+
+        # Строки раскрываются как при построчной обработке, карта отрезка
+        # собирается отдельно и потом вставляется со сдвигом
+        output = []
+        source_map = SourceMap()
+        out_offset = 0
+        src_offset = 0
+        for line, processed_line in zip(run.lines, lines):
+            if processed_line is not None:
+                processed_line, line_segments = self._expand_macros(processed_line)
+                source_map.extend(line_segments, out_offset, src_offset)
+                out_offset += len(processed_line)
+                output.append(processed_line)
+            src_offset += len(line)
+        run_segments = [
+            (out, src, source_map.chains[chain_id] if chain_id != -1 else ())
+            for out, src, chain_id in zip(source_map.out_starts, source_map.src_starts, source_map.chain_ids)
+        ]
+        result = output, run_segments, out_offset
+        if key is not None:
+            run.expanded[(entry, key)] = result
+        return result
+
+    def _macro_key(self, words: frozenset) -> Optional[tuple]:
+        # Макросы, от которых зависит раскрытие слов words: имена из words
+        # и слова их значений, с порядком в очереди раскрытия. None — таблица
+        # раскрывается по очереди (см. _expand_macros), результат не кэшируется
+        macros = self.macros
+        if not macros:
+            return ()
+        order = self._order
+        if order is None:
+            order = self._refresh_order()
+        if len(order) < len(macros):
+            return None
+
+        names = macros.keys() & words
+        pending = list(names)
+        while pending:
+            for word in WORD.findall(macros[pending.pop()]):
+                if word in macros and word not in names:
+                    names.add(word)
+                    pending.append(word)
+        return tuple((name, macros[name]) for name in sorted(names, key=order.__getitem__))
+
+
+def _process_group(source: str, settings: tuple, base: Dict[str, str],
+                   configurations: Sequence[Dict[str, str]],
+                   header_cache: Optional[HeaderCache] = None) -> List[VariantResult]:
+    # Варианты одного процесса: дерево, кэш заголовков и кэши условий общие
+    error_limit, path, include_dirs = settings
+    if header_cache is None:
+        header_cache = HeaderCache()
+    first = VariantPreprocessor(error_limit=error_limit, path=path, include_dirs=include_dirs,
+                                header_cache=header_cache)
+    tree = SegmentTree(source.splitlines(keepends=True), first)
+
+    results = []
+    for configuration in configurations:
+        pp = first if not results else VariantPreprocessor(
+            error_limit=error_limit, path=path, include_dirs=include_dirs, header_cache=header_cache)
+        pp.evaluator = first.evaluator.fork()
+        for name, value in list(base.items()) + list(configuration.items()):
+            pp.define(name, value)
+        output = ''.join(pp.process_segments(tree))
+        results.append(VariantResult(dict(configuration), output, pp.errors, pp.source_map))
+    return results
+
+
+def process_variants(preprocessor: Preprocessor, configurations: Sequence[Dict[str, str]],
+                     workers: Optional[int] = None) -> List[VariantResult]:
+    # Исходник preprocessor.source под каждым набором макросов. Макросы,
+    # уже определённые в preprocessor, действуют во всех вариантах. С
+    # workers > 1 варианты делятся на группы подряд, группа — процесс со
+    # своим деревом; кэш заголовков preprocessor используется только без
+    # процессов
+    configurations = list(configurations)
+    settings = (preprocessor.errors.limit, preprocessor.path, preprocessor.include_dirs)
+    base = dict(preprocessor.macros)
+    workers = min(workers or 1, len(configurations)) or 1
+    if workers == 1:
+        return _process_group(preprocessor.source, settings, base, configurations, preprocessor.header_cache)
+
+    groups = [configurations[len(configurations) * n // workers:len(configurations) * (n + 1) // workers]
+              for n in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_process_group, preprocessor.source, settings, base, group) for group in groups]
+        return [result for future in futures for result in future.result()]
@@ -1,4 +1,5 @@
 import pytest
+import json
 import sys
 from pathlib import Path
 
@@ -7,10 +8,11 @@ root_dir = Path(__file__).parent.parent.parent.absolute()
 sys.path.insert(0, str(root_dir))
 
 from src.lexer.scanner import Scanner
+from src.lexer.serialize import TokenStreamReader, dump_tokens
 from src.lexer.token import TokenType
 from src.parser.parser import Parser
 from src.parser.ast import *
-from src.parser.visitor import ASTPrettyPrinter, ASTSemanticAnalyzer
+from src.parser.visitor import ASTPrettyPrinter, ASTSemanticAnalyzer, ASTVisitor
 
 
 def parse(code: str):
@@ -363,6 +365,64 @@ def test_assignment_expressions():
         assert stmt.expression.operator.lexeme == op
 
 
+def test_left_associative_operators():
+    ast, errors = parse_stmt("a - b - c * d / e;")
+    assert not errors, f"Ошибки парсера: {errors}"
+
+    expr = first_stmt(ast).expression
+    assert expr.operator.lexeme == "-"
+    assert expr.left.operator.lexeme == "-"
+    assert expr.right.operator.lexeme == "/"
+    assert expr.right.left.operator.lexeme == "*"
+
+
+@pytest.mark.parametrize("stmt_source, shape", [
+    ("a == b == c;", "((a == b) == c)"),
+    ("a < b >= c;", "((a < b) >= c)"),
+    ("a < b < c == d;", "(((a < b) < c) == d)"),
+    ("a == b != c + d && e;", "(((a == b) != (c + d)) && e)"),
+])
+def test_comparison_chains_are_non_associative(stmt_source, shape):
+    ast, errors = parse_stmt(stmt_source)
+    assert errors == [error for error in errors if "неассоциативны" in error]
+    assert len(errors) == 1
+
+    def show(expr):
+        if isinstance(expr, BinaryExprNode):
+            return f"({show(expr.left)} {expr.operator.lexeme} {show(expr.right)})"
+        return expr.name.lexeme
+
+    assert show(first_stmt(ast).expression) == shape
+
+
+def test_third_comparison_is_not_consumed():
+    # После восстановления цепочка сравнений не продолжается
+    ast, errors = parse_stmt("a == b == c == d;")
+    assert any("неассоциативны" in e for e in errors)
+    assert any("';'" in e for e in errors)
+
+
+def test_assignment_is_right_associative():
+    ast, errors = parse_stmt("a = b += c + 1;")
+    assert not errors, f"Ошибки парсера: {errors}"
+
+    expr = first_stmt(ast).expression
+    assert isinstance(expr, AssignmentExprNode)
+    assert expr.operator.lexeme == "="
+    assert isinstance(expr.value, AssignmentExprNode)
+    assert expr.value.operator.lexeme == "+="
+    assert isinstance(expr.value.value, BinaryExprNode)
+
+
+def test_invalid_assignment_target_after_value_errors():
+    # Цель проверяется после разбора значения
+    ast, errors = parse_stmt("a + b = c == d == e;")
+    assert len(errors) == 2
+    assert "неассоциативны" in errors[0]
+    assert "Недопустимая цель присваивания" in errors[1]
+    assert isinstance(first_stmt(ast).expression, AssignmentExprNode)
+
+
 def test_call_expression():
     code = """
     fn main() -> void {
@@ -979,6 +1039,28 @@ def test_missing_brace():
     assert any("'}'" in e for e in errors)
 
 
+def test_error_limit_counts_dropped_errors():
+    code = "fn main() -> void { int = ; int = ; int = ; }"
+    tokens = Scanner(code).scan_tokens()
+    full = Parser(tokens)
+    full.parse()
+
+    capped = Parser(tokens, error_limit=1)
+    capped.parse()
+
+    assert capped.get_errors() == full.get_errors()[:1]
+    assert capped.errors.count == full.errors.count > 1
+
+
+def test_semantic_errors_are_diagnostics():
+    ast, _, _ = parse("fn main() -> void { y = 1; }")
+    analyzer = ASTSemanticAnalyzer()
+    analyzer.visit(ast)
+
+    assert [e.code for e in analyzer.errors] == ["E004"]
+    assert analyzer.get_errors()[0].endswith("Переменная 'y' не объявлена")
+
+
 # ===================================================
 # ТЕСТЫ ИНТЕГРАЦИИ
 # ===================================================
@@ -1005,6 +1087,46 @@ def test_lexer_parser_integration():
     assert func.name.lexeme == "main"
 
 
+def test_parser_accepts_token_buffer():
+    code = "fn main() { int x = -5; return x + 1; }"
+
+    tokens = Scanner(code).scan_tokens()
+    buffer = Scanner(code).scan_buffer()
+
+    parser = Parser(buffer)
+    ast = parser.parse()
+    assert not parser.get_errors(), f"Ошибки парсера: {parser.get_errors()}"
+    assert ast.to_dict() == Parser(tokens).parse().to_dict()
+
+
+def test_parser_current_type_follows_advance():
+    tokens = Scanner("x = 1;").scan_tokens()
+    parser = Parser(tokens)
+
+    types = []
+    while not parser.isAtEnd():
+        assert parser.current_type == parser.peek().token_type
+        types.append(parser.current_type)
+        parser.advance()
+    assert types == [token.token_type for token in tokens[:-1]]
+
+    # На EOF позиция не меняется, EOF не совпадает ни с одним типом
+    parser.advance()
+    assert parser.current_type == TokenType.EOF
+    assert not parser.check(TokenType.EOF)
+    assert not parser.match(TokenType.EOF, TokenType.SEMICOLON)
+
+
+def test_parser_accepts_token_stream_reader():
+    code = "fn main() { int x = -5; if (x < 0) { x = 0; } return x; }"
+    tokens = Scanner(code).scan_tokens()
+
+    parser = Parser(TokenStreamReader(dump_tokens(tokens, [])))
+    ast = parser.parse()
+    assert not parser.get_errors(), f"Ошибки парсера: {parser.get_errors()}"
+    assert ast.to_dict() == Parser(tokens).parse().to_dict()
+
+
 # В tests/parser/test_parser.py замените функцию:
 
 def test_pretty_print_roundtrip():
@@ -1061,5 +1183,182 @@ fn test() {
     assert len(ast1.declarations) == len(ast2.declarations)
     assert ast1.declarations[0].name.lexeme == ast2.declarations[0].name.lexeme
     assert len(ast1.declarations[0].body.statements) == len(ast2.declarations[0].body.statements)
+
+
+# ===================================================
+# ГЛУБОКАЯ ВЛОЖЕННОСТЬ
+# ===================================================
+
+# Намного больше предела рекурсии: разбор и обходы без рекурсии
+DEEP = 100_000
+
+
+def parse_deep(body: str):
+    ast, errors = parse_stmt(body)
+    assert not errors, f"Ошибки парсера: {errors[:3]}"
+    return first_stmt(ast).expression if isinstance(first_stmt(ast), ExprStmtNode) else first_stmt(ast)
+
+
+def chain_depth(node, attribute):
+    depth = 0
+    while isinstance(node, ASTNode):
+        node = getattr(node, attribute, None)
+        depth += 1
+    return depth
+
+
+@pytest.mark.parametrize("body, attribute, depth", [
+    ("(" * DEEP + "x" + ")" * DEEP + ";", "name", 1),
+    ("!" * DEEP + "x;", "operand", DEEP + 1),
+    ("x = " * DEEP + "1;", "value", DEEP + 1),
+    ("f(" * DEEP + ")" * DEEP + ";", "callee", DEEP + 1),
+], ids=["parentheses", "prefix", "assignment", "calls"])
+def test_deep_expressions(body, attribute, depth):
+    expr = parse_deep(body)
+    if attribute == "callee":
+        # Вызов внутри аргументов: f(f(f()))
+        depth = 0
+        while isinstance(expr, CallExprNode):
+            expr = expr.arguments[0] if expr.arguments else None
+            depth += 1
+        assert depth == DEEP
+    else:
+        assert chain_depth(expr, attribute) == depth
+
+
+@pytest.mark.parametrize("body, attribute", [
+    ("{" * DEEP + "}" * DEEP, "statements"),
+    ("if (x) ; else " * DEEP + ";", "else_branch"),
+    ("while (x) " * DEEP + ";", "body"),
+], ids=["blocks", "else_if", "while"])
+def test_deep_statements(body, attribute):
+    stmt = parse_deep(body)
+    depth = 0
+    while isinstance(stmt, StatementNode) and not isinstance(stmt, EmptyStmtNode):
+        stmt = getattr(stmt, attribute)
+        if isinstance(stmt, list):
+            stmt = stmt[0] if stmt else None
+        depth += 1
+    assert depth == DEEP
+
+
+def test_deep_tree_walkers():
+    ast, errors = parse_program("fn main(int x) -> int { return " + "!" * DEEP + "x; }")
+    assert not errors, f"Ошибки парсера: {errors[:3]}"
+
+    assert ast.to_dict()["declarations"][0]["name"] == "main"
+    assert ast_to_code(ast).endswith("(!" * DEEP + "x" + ")" * DEEP + ";\n}")
+    assert expr_to_str(first_stmt(ast).value) == "(!" * DEEP + "x" + ")" * DEEP
+    assert pretty_print(ast).endswith("x" + ")" * DEEP)
+    assert generate_dot(ast).count('label="operand"') == DEEP
+
+    printer = ASTPrettyPrinter()
+    printer.visit(ast)
+    assert printer.get_result().endswith("x" + ")" * DEEP)
+
+    analyzer = ASTSemanticAnalyzer()
+    analyzer.visit(ast)
+    assert not analyzer.get_errors()
+
+
+def test_deep_statement_walkers():
+    ast, errors = parse_program("fn main() { " + "{" * DEEP + "x = 1;" + "}" * DEEP + " }")
+    assert not errors, f"Ошибки парсера: {errors[:3]}"
+
+    assert ast_to_code(ast).count("{") == DEEP + 1
+    assert generate_dot(ast).count('label="statements[0]"') == DEEP + 1
+
+    analyzer = ASTSemanticAnalyzer()
+    analyzer.visit(ast)
+    assert len(analyzer.get_errors()) == 1
+
+
+class NodeCounter(ASTVisitor):
+    # Узлы без visit_* обходятся по умолчанию
+
+    def __init__(self):
+        self.visited = []
+
+    def visit_IdentifierExprNode(self, node):
+        self.visited.append(node.name.lexeme)
+
+
+def test_deep_generic_visit():
+    ast, errors = parse_program("fn main(int x) { return " + "!" * DEEP + "x; }")
+    assert not errors, f"Ошибки парсера: {errors[:3]}"
+    counter = NodeCounter()
+    counter.visit(ast)
+    assert counter.visited == ["x"]
+
+
+def test_generic_visit_called_from_visit_method():
+    # generic_visit, вызванный обычным методом, сам обходит потомков
+    class FunctionVisitor(NodeCounter):
+
+        def visit_FunctionDeclNode(self, node):
+            self.visited.append(node.name.lexeme)
+            self.generic_visit(node)
+
+    ast, _ = parse_program("fn main(int x) { return f(x); }")
+    visitor = FunctionVisitor()
+    visitor.visit(ast)
+    assert visitor.visited == ["main", "x", "f"]
+
+
+def test_super_visit_method_walks_subtree():
+    # Подкласс вызывает стандартный visit_* через super() и получает
+    # полностью обойдённое поддерево, а не генератор
+    class BlockCounter(ASTPrettyPrinter):
+
+        def __init__(self):
+            super().__init__()
+            self.blocks = 0
+
+        def visit_BlockStmtNode(self, node):
+            self.blocks += 1
+            return super().visit_BlockStmtNode(node)
+
+    ast, _ = parse_program("fn main() { { x; } }")
+    printer = BlockCounter()
+    printer.visit(ast)
+    assert printer.blocks == 2
+    plain = ASTPrettyPrinter()
+    plain.visit(ast)
+    assert printer.get_result() == plain.get_result()
+
+    analyzer = ASTSemanticAnalyzer()
+    analyzer.variables.append({})
+    assert analyzer.visit_BlockStmtNode(first_stmt(ast)) is None
+    assert len(analyzer.get_errors()) == 1
+
+
+def test_overridden_generic_visit_is_used():
+    class Collector(ASTVisitor):
+
+        def __init__(self):
+            self.types = []
+
+        def generic_visit(self, node):
+            self.types.append(type(node).__name__)
+            super().generic_visit(node)
+
+    ast, _ = parse_program("fn main() { x; }")
+    collector = Collector()
+    ast.accept(collector)
+    assert collector.types == ["ProgramNode", "FunctionDeclNode", "BlockStmtNode",
+                               "ExprStmtNode", "IdentifierExprNode"]
+
+
+def test_ast_to_json_matches_json_dumps():
+    # На обычной глубине — тот же текст, что json.dumps; на глубине больше
+    # предела рекурсии json.dumps не справляется
+    ast, _ = parse_program("fn f(int a) -> int { if (a < 1) { return -a; } else { a = f(a - 1); } return 0.5; }")
+    assert ast_to_json(ast) == json.dumps(ast.to_dict(), indent=2, ensure_ascii=False)
+
+    ast, _ = parse_program("fn f(int a) { return " + "!" * 2000 + "a; }")
+    text = ast_to_json(ast)
+    assert text.count('"type": "UnaryExprNode"') == 2000
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,568 @@
+import itertools
+import os
+import pytest
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from src.lexer.scanner import Scanner
+from src.parser.parser import Parser
+from src.preprocessor.fused import FusedScanner
+from src.preprocessor.expression import ExpressionError, ExpressionEvaluator
+from src.preprocessor.include import HeaderCache, find_guard
+from src.preprocessor.macros import MacroProcessor
+from src.preprocessor.preprocessor import PreprocessedReader, Preprocessor, split_lines
+from src.preprocessor.source_map import SourceMap
+
+
+def preprocess(source: str):
+    pp = Preprocessor(source)
+    return pp.process(), pp.source_map
+
+
+def remapped_errors(output: str, source_map: SourceMap):
+    scanner = Scanner(output)
+    parser = Parser(scanner.scan_tokens())
+    parser.parse()
+    return [str(e) for e in source_map.remap(parser.errors, scanner.line_index)]
+
+
+# ==================== Карта исходника ====================
+
+def test_source_map_without_directives_is_one_run():
+    source = "fn main() -> int {\n    return 0;\n}\n"
+    output, source_map = preprocess(source)
+
+    assert output == source
+    assert len(source_map) == 1
+    assert source_map.lookup(len(source) - 2) == (len(source) - 2, ())
+
+
+def test_source_map_skips_dropped_lines():
+    source = "// c\n#define N 1\nint a;\n#ifdef M\nint b;\n#endif\nint c;\n"
+    output, source_map = preprocess(source)
+
+    assert output == "int a;\nint c;\n"
+    assert source_map.lookup(output.index("c")) == (source.index("int c") + 4, ())
+    assert source_map.source_position(source_map.lookup(output.index("c"))[0]) == (7, 5)
+
+
+@pytest.mark.parametrize("processor", ["pp", "macros"])
+def test_source_map_points_into_macro_invocation(processor):
+    source = "#define OUTER INNER + 1\n#define INNER x\ny = OUTER;\n"
+    if processor == "pp":
+        output, source_map = preprocess(source)
+    else:
+        macros = MacroProcessor()
+        output = macros.process_directives(source)
+        source_map = macros.source_map
+
+    call = source.index("OUTER;")
+    assert output == "y = x + 1;\n"
+    assert source_map.lookup(output.index("x")) == (call, ("OUTER", "INNER"))
+    assert source_map.lookup(output.index("+")) == (call, ("OUTER",))
+    assert source_map.lookup(output.index(";")) == (source.index(";"), ())
+
+
+def test_source_map_replaces_empty_runs():
+    source_map = SourceMap()
+    source_map.add(0, 0)
+    source_map.add(2, 4, ("M",))
+    source_map.add(2, 2)
+
+    assert len(source_map) == 1
+    assert source_map.lookup(5) == (5, ())
+
+
+def test_parser_errors_map_to_source_lines():
+    source = (
+        "// header\n"
+        "#define EXPR (1 + )\n"
+        "/* long\n"
+        "   comment */\n"
+        "fn main() -> int {\n"
+        "    int x = EXPR;\n"
+        "    return x\n"
+        "}\n"
+    )
+    output, source_map = preprocess(source)
+
+    assert remapped_errors(output, source_map) == [
+        "[Строка 6, Колонка 13] Ошибка: Ожидалось выражение (в раскрытии макроса EXPR)",
+        "[Строка 8, Колонка 1] Ошибка: Ожидалась ';' после return",
+    ]
+
+
+def test_remap_keeps_dropped_count():
+    output, source_map = preprocess("#define A\n#bogus\nint @x;\n")
+    scanner = Scanner(output, error_limit=0)
+    scanner.scan_tokens()
+
+    remapped = source_map.remap(scanner.errors, scanner.line_index)
+
+    assert remapped.count == scanner.errors.count
+    assert list(remapped) == []
+
+
+# ==================== Раскрытие макросов ====================
+
+MACRO_SOURCES = [
+    # Значение раскрывается только макросами дальше по очереди (короче имя)
+    "#define LONG SHORT + X\n#define SHORT 2\n#define X LONG\nLONG X SHORT\n",
+    "#define A B\n#define B A\nA B AB A_B\n",
+    "#define N 1\nN\n#undef N\nN\n#define N 2\nN\n",
+    '#define TAB \\t\n#define SELF \\g<0>!\nTAB SELF "TAB"\n',
+    "#define ЧИСЛО 42\nЧИСЛО ЧИСЛО2\n",
+    # Имена не из символов слова раскрываются по очереди
+    "#define + -\n#define A-B 7\na+b A-B A\n",
+    "#define MAX(a,b) m\nMAX(a,b)c MAX(a,b) c\n",
+]
+
+
+def expand_sequentially(source):
+    pp = Preprocessor(source)
+    pp._expand_macros = pp._expand_sequential
+    return pp.process()
+
+
+@pytest.mark.parametrize("source", MACRO_SOURCES)
+def test_single_pass_expansion_matches_sequential(source):
+    assert preprocess(source)[0] == expand_sequentially(source)
+
+
+def test_expansion_cache_follows_macro_table():
+    pp = Preprocessor("#define B A\n#define A 1\nB\n#undef A\nB\n#define A 3\nB\n")
+
+    assert pp.process() == "1\nA\n3\n"
+
+
+def test_long_macro_chain():
+    count = 5000
+    header = "".join(f"#define M{n:04} M{n + 1:04}\n" for n in range(count))
+    output, source_map = preprocess(header + "x = M0000;\n")
+
+    assert output == f"x = M{count:04};\n"
+    assert len(source_map.lookup(4)[1]) == count
+
+
+# ==================== MacroProcessor ====================
+
+def process_macros(source: str):
+    macros = MacroProcessor()
+    return macros.process_directives(source), macros.get_errors()
+
+
+def test_macro_cycle_is_reported_once_per_line():
+    output, errors = process_macros("#define A B\n#define B A\n#define X X+1\nA X A B\nX\n")
+
+    assert output == "A X+1 A B\nX+1\n"
+    assert errors == [
+        "[Строка 4] Ошибка: обнаружена рекурсия в макросе: A",
+        "[Строка 4] Ошибка: обнаружена рекурсия в макросе: X",
+        "[Строка 4] Ошибка: обнаружена рекурсия в макросе: B",
+        "[Строка 5] Ошибка: обнаружена рекурсия в макросе: X",
+    ]
+
+
+def test_macro_redefinition_invalidates_dependents():
+    output, errors = process_macros(
+        "#define TOP MID * 2\n#define MID LOW + 1\nTOP\n"
+        "#define LOW 5\nTOP\n"
+        "#undef LOW\n#define LOW 7\nTOP\n"
+        "#undef MID\nTOP\n"
+    )
+
+    assert output == "LOW + 1 * 2\n5 + 1 * 2\n7 + 1 * 2\nMID * 2\n"
+
+
+def test_diamond_expands_shared_macro_once():
+    macros = MacroProcessor()
+    output = macros.process_directives(
+        "#define BASE 1\n#define LEFT (BASE)\n#define RIGHT (BASE)\n#define TOP LEFT+RIGHT\nTOP TOP\n"
+    )
+
+    assert output == "(1)+(1) (1)+(1)\n"
+    assert set(macros._expansions) == {"BASE", "LEFT", "RIGHT", "TOP"}
+
+
+def test_long_macro_chain_without_recursion():
+    count = 5000
+    header = "".join(f"#define M{n} M{n + 1}\n" for n in range(count))
+    macros = MacroProcessor()
+
+    output = macros.process_directives(header + "x = M0;\n")
+
+    assert output == f"x = M{count};\n"
+    assert macros.get_errors() == []
+    assert len(macros.source_map.lookup(4)[1]) == count
+
+
+def test_long_macro_chain_into_cycle():
+    count = 5000
+    header = "".join(f"#define M{n} M{n + 1}\n" for n in range(count)) + f"#define M{count} M0 + 1\n"
+    macros = MacroProcessor()
+
+    output = macros.process_directives(header + "x = M0;\n" * 50)
+
+    assert output == "x = M0 + 1;\n" * 50
+    assert macros.get_errors() == [
+        f"[Строка {count + 2 + n}] Ошибка: обнаружена рекурсия в макросе: M0" for n in range(50)
+    ]
+    assert len(macros.source_map.lookup(4)[1]) == count + 1
+
+
+def test_cyclic_expansion_follows_macro_table():
+    output, errors = process_macros(
+        "#define A B C\n#define B A\n#define C 1\nA\n"
+        "#undef C\n#define C 2\nA\n"
+        "#undef B\nA\n"
+    )
+
+    assert output == "A 1\nA 2\nB 2\n"
+    assert len(errors) == 2
+
+
+# ==================== Потоковая обработка ====================
+
+@pytest.mark.parametrize("text", ["a\r\nb\rc\n", "x\x0cy\u2028z", "\n\n\r", "без перевода строки"])
+@pytest.mark.parametrize("size", [1, 2, 5])
+def test_split_lines_matches_splitlines(text, size):
+    chunks = [text[i:i + size] for i in range(0, len(text), size)]
+
+    assert list(split_lines(chunks)) == text.splitlines(keepends=True)
+
+
+def test_process_lines_is_lazy():
+    pp = Preprocessor()
+    lines = pp.process_lines(itertools.cycle(["#define N 1\n", "x = N; // c\n"]))
+
+    assert list(itertools.islice(lines, 3)) == ["x = 1; "] * 3
+
+
+def test_nested_conditionals_share_one_stack():
+    source = "#ifdef A\n#ifdef B\n#endif\nhidden\n#endif\n#ifndef A\nshown\n#endif\n"
+
+    assert preprocess(source)[0] == "shown\n"
+    assert MacroProcessor().process_directives(source) == "shown\n"
+
+
+def test_malformed_condition_keeps_nesting():
+    macros = MacroProcessor()
+
+    output = macros.process_directives("#ifdef\nx\n#endif\n#ifdef A\ny\n#endif\nz\n")
+
+    assert output == "x\nz\n"
+    assert macros.get_errors() == ["[Строка 1] Ошибка: синтаксическая ошибка в #ifdef"]
+
+
+# ==================== Условия #if ====================
+
+@pytest.mark.parametrize("expression, value", [
+    ("1 + 2 * 3", 7),
+    ("(1 + 2) * 3", 9),
+    ("-7 / 2 == -3 && -7 % 2 == -1", 1),
+    ("0x10 + 010 + 1u", 25),
+    ("1 ? 2 : 0 ? 3 : 4", 2),
+    ("!defined(A) || defined B", 1),
+    ("SUM * 2", 5),
+    ("SELF + 1", 1),
+    ("UNKNOWN", 0),
+    ("0 && 1 / 0", 0),
+    ("1 || 1 / 0", 1),
+    ("0 ? 1 / 0 : 2", 2),
+    ("9223372036854775807 + 1 < 0", 1),
+    ("~0 >> 1 == -1 /* сдвиг со знаком */", 1),
+])
+def test_condition_expressions(expression, value):
+    macros = {"B": "1", "SUM": "1 + 2", "SELF": "SELF"}
+
+    assert ExpressionEvaluator().evaluate(expression, macros) == value
+
+
+@pytest.mark.parametrize("expression, kind", [
+    ("", "syntax"),
+    ("1 +", "syntax"),
+    ("(1", "syntax"),
+    ("1 ? 2", "syntax"),
+    ("defined", "syntax"),
+    ("08", "syntax"),
+    ("1 / ZERO", "division"),
+    ("1 && 1 % 0", "division"),
+])
+def test_condition_expression_errors(expression, kind):
+    with pytest.raises(ExpressionError) as error:
+        ExpressionEvaluator().evaluate(expression, {"ZERO": "0"})
+    assert error.value.kind == kind
+
+
+def test_condition_results_follow_macro_table():
+    pp = Preprocessor("#if N > 1\nbig\n#else\nsmall\n#endif\n"
+                      "#define N 2\n#if N > 1\nbig\n#endif\n#undef N\n#if N > 1\nbig\n#endif\n")
+
+    assert pp.process() == "small\nbig\n"
+
+
+@pytest.mark.parametrize("processor", [Preprocessor, MacroProcessor])
+def test_if_elif_else_chain(processor):
+    source = ("#define LEVEL 2\n"
+              "#if LEVEL == 1\none\n#elif LEVEL == 2\ntwo\n#elif 1 / 0\nbad\n#else\nother\n#endif\n"
+              "#ifdef LEVEL\n#if 0\n#else\nnested\n#endif\n#else\n#if 1\nhidden\n#elif 1\nhidden\n#endif\n#endif\n")
+    pp = processor()
+
+    output = pp.process_lines(source.splitlines(keepends=True))
+
+    assert "".join(output) == "two\nnested\n"
+    assert list(pp.errors) == []
+
+
+def test_condition_errors():
+    pp = Preprocessor("#if 1 +\na\n#elif 2 / 0\nb\n#else\nc\n#endif\n#else\n")
+
+    assert pp.process() == "c\n"
+    assert [str(e) for e in pp.errors] == [
+        "[Строка 1, Колонка 1] Ошибка: Некорректное условие #if: 1 +",
+        "[Строка 3, Колонка 1] Ошибка: Деление на ноль в условии #elif: 2 / 0",
+        "[Строка 8, Колонка 1] Ошибка: #else без #if",
+    ]
+
+    macros = MacroProcessor()
+    assert macros.process_directives("#define DEBUG\n#if DEBUG\nx\n#endif\n#elif 1\n") == ""
+    assert macros.get_errors() == ["[Строка 2] Ошибка: синтаксическая ошибка в #if",
+                                   "[Строка 5] Ошибка: #elif без #if"]
+
+
+# ==================== Варианты сборки ====================
+
+VARIANT_SOURCE = (
+    "#define SCALE 2\n"
+    "#if defined(FAST) && LEVEL > 1\nint fast = LEVEL * SCALE; /* быстрый\n#else\n */\n"
+    "#elif LEVEL\nint level = LEVEL;\n#else\nint none @;\n#endif\n"
+    "// общий код\nint shared = SCALE;\n#ifndef FAST\n#if 1 / LEVEL\n#endif\n#endif\n#endif\n"
+)
+VARIANTS = [{}, {"LEVEL": "1"}, {"FAST": "1", "LEVEL": "2"}, {"LEVEL": "0", "SCALE": "3"}]
+
+
+def test_process_variants_matches_separate_runs():
+    base = Preprocessor(VARIANT_SOURCE)
+    base.define("EXTRA", "1")
+
+    results = base.process_variants(VARIANTS)
+
+    assert [result.macros for result in results] == VARIANTS
+    for macros, result in zip(VARIANTS, results):
+        pp = Preprocessor(VARIANT_SOURCE)
+        pp.define("EXTRA", "1")
+        for name, value in macros.items():
+            pp.define(name, value)
+        output = pp.process()
+
+        assert result.output == output
+        assert [str(e) for e in result.errors] == [str(e) for e in pp.errors]
+        assert [result.source_map.lookup(i) for i in range(len(output))] == \
+            [pp.source_map.lookup(i) for i in range(len(output))]
+
+
+def test_process_variants_in_processes():
+    results = Preprocessor(VARIANT_SOURCE).process_variants(VARIANTS, workers=2)
+
+    assert [result.output for result in results] == \
+        [result.output for result in Preprocessor(VARIANT_SOURCE).process_variants(VARIANTS)]
+    assert [e.code for e in results[0].errors] == ["P008"]
+
+
+def test_preprocessed_reader_feeds_scanner():
+    source = "#define N 42\n/* c */ fn main() -> int {\n    return N @;\n}\n" * 50
+    expected_pp = Preprocessor(source)
+    expected = Scanner(expected_pp.process())
+    expected_tokens = [str(t) for t in expected.scan_tokens()]
+
+    pp = Preprocessor()
+    scanner = Scanner(PreprocessedReader(pp.process_lines(source.splitlines(keepends=True)), chunk_size=64))
+
+    assert [str(t) for t in scanner.scan_tokens()] == expected_tokens
+    assert [str(e) for e in pp.source_map.remap(scanner.errors, scanner.line_index)] == \
+        [str(e) for e in expected_pp.source_map.remap(expected.errors, expected.line_index)]
+
+
+# ==================== Совмещённый режим ====================
+
+FUSED_SOURCES = [
+    "#define N 42\n/* c */ fn main() -> int {\n    return N @;\n}\n",
+    "#define OUTER INNER + 1\n#define INNER x\ny = OUTER;\n",
+    "#ifdef A\n{ @\n#else\n#endif\n#ifndef A\n  #define OPEN {\nint y = OPEN;\n#endif\n}\n}\n#bogus\n",
+    "#define A 1\n#undef A\nA\n#define A 2\n#ifdef A\nA /* a\n b */ A\n#endif\n",
+    "#define V 3\n#if V < 2\n{\n#elif V * 2 == 6\nint v = V;\n#else\n}\n#endif\n#elif\n",
+]
+
+
+def staged_tokens(source):
+    pp = Preprocessor(source)
+    scanner = Scanner(pp.process())
+    tokens = [(t.token_type, t.lexeme, t.literal_value) for t in scanner.scan_tokens()[:-1]]
+    errors = [e.code for e in pp.source_map.remap(scanner.errors, scanner.line_index)]
+    return tokens, errors, [str(e) for e in pp.errors]
+
+
+def fused_tokens(source):
+    pp = Preprocessor()
+    scanner = FusedScanner(source, pp)
+    tokens = [(t.token_type, t.lexeme, t.literal_value) for t in scanner.scan_tokens()[:-1]]
+    return tokens, [e.code for e in scanner.errors], [str(e) for e in pp.errors]
+
+
+@pytest.mark.parametrize("source", FUSED_SOURCES)
+def test_fused_scanner_matches_staged_pipeline(source):
+    assert fused_tokens(source) == staged_tokens(source)
+
+
+def test_fused_scanner_keeps_source_positions():
+    source = "#define OUTER INNER + 1\n#define INNER x\n// c\n\ny = OUTER; @\n"
+    scanner = FusedScanner(source)
+    tokens = scanner.scan_tokens()
+
+    assert [(t.lexeme, t.line, t.column) for t in tokens[:5]] == [
+        ("y", 5, 1), ("=", 5, 3), ("x", 5, 5), ("+", 5, 5), ("1", 5, 5)
+    ]
+    assert [str(e) for e in scanner.errors] == ["[Строка 5, Колонка 13] Ошибка: Недопустимый символ: '@' (ASCII: 64)"]
+
+
+def test_fused_scanner_reports_expansion_errors_at_call():
+    scanner = FusedScanner("#define BAD x @ }\n{\nint a = BAD;\n")
+    scanner.scan_tokens()
+
+    assert [str(e) for e in scanner.errors] == [
+        "[Строка 3, Колонка 9] Ошибка: Недопустимый символ: '@' (ASCII: 64) (в раскрытии макроса BAD)",
+    ]
+
+
+def test_fused_scanner_attributes_parser_errors_to_macros():
+    source = "#define EXPR (1 + )\nfn main() -> int {\n    int x = EXPR;\n    return x;\n}\n"
+    scanner = FusedScanner(source)
+    parser = Parser(scanner.scan_tokens())
+    parser.parse()
+
+    assert [str(e) for e in scanner.expansion_sites.remap(parser.errors)] == [
+        "[Строка 3, Колонка 13] Ошибка: Ожидалось выражение (в раскрытии макроса EXPR)",
+    ]
+
+
+@pytest.mark.parametrize("size", [1, 3, 64])
+def test_fused_scanner_reads_chunks(size):
+    source = "#define N 1\n#ifdef M\n@ {\n#endif\r\nint x = N;\r\n#undef N\nN\n" * 20
+    expected = [str(t) for t in FusedScanner(source).scan_tokens()]
+
+    scanner = FusedScanner(PreprocessedReader([source], chunk_size=size))
+    assert [str(t) for t in scanner.scan_tokens()] == expected
+
+
+# ==================== #include ====================
+
+def write_files(root, files):
+    for name, text in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+
+
+def preprocess_file(path, cache=None, include_dirs=()):
+    pp = Preprocessor(path.read_text(encoding="utf-8"), path=str(path), include_dirs=include_dirs,
+                      header_cache=cache)
+    return pp.process(), pp
+
+
+def test_include_guard_and_pragma_once(tmp_path):
+    write_files(tmp_path, {
+        "lib/point.h": "// точка\n#ifndef POINT_H\n#define POINT_H\nstruct Point { int x; };\n#endif\n",
+        "lib/shape.h": "#pragma once\n#include \"point.h\"\nint area = SCALE;",
+        "main.src": '#define SCALE 2\n#include "lib/shape.h"\n#include <point.h>\n#include "lib/shape.h"\nint x;\n',
+    })
+
+    output, pp = preprocess_file(tmp_path / "main.src", include_dirs=[str(tmp_path / "lib")])
+
+    assert output == "struct Point { int x; };\nint area = 2;\nint x;\n"
+    assert list(pp.errors) == []
+    assert pp.header_cache.guard(str((tmp_path / "lib/point.h").resolve()),
+                                 (tmp_path / "lib/point.h").stat().st_mtime_ns) == "POINT_H"
+
+
+@pytest.mark.parametrize("lines, guard", [
+    (["#ifndef A\n", "#define A\n", "x\n", "#endif\n"], "A"),
+    (["// c\n", "#ifndef A\n", "#define A 1\n", "#ifdef B\n", "#endif\n", "#endif\n", "\n"], "A"),
+    (["#ifndef A\n", "#define A\n", "#else\n", "#endif\n"], None),
+    (["#ifndef A\n", "#define A\n", "#endif\n", "x\n"], None),
+    (["#ifndef A\n", "#define B\n", "#endif\n"], None),
+    (["#if !defined(A)\n", "#define A\n", "#if X > 1\n", "#endif\n", "#endif\n"], "A"),
+    (["#if ! defined A\n", "#define A\n", "#endif\n"], "A"),
+    (["#if !defined(A) && B\n", "#define A\n", "#endif\n"], None),
+])
+def test_find_guard(lines, guard):
+    assert find_guard(lines) == guard
+
+
+def test_include_errors_name_the_header(tmp_path):
+    write_files(tmp_path, {
+        "bad.h": "#bogus\nint @;\n#include \"missing.h\"\n",
+        "main.src": '#include "bad.h"\n#include bad.h\n#include "main.src"\nint y;\n',
+    })
+    header = str(tmp_path / "bad.h")
+
+    output, pp = preprocess_file(tmp_path / "main.src")
+    scanner = Scanner(output)
+    scanner.scan_tokens()
+
+    assert [str(e) for e in pp.errors] == [
+        f"{header}: [Строка 1, Колонка 1] Ошибка: Unknown preprocessor directive: #bogus",
+        f"{header}: [Строка 3, Колонка 1] Ошибка: Включаемый файл не найден: missing.h",
+        "[Строка 2, Колонка 1] Ошибка: Некорректная директива #include: bad.h",
+        "[Строка 3, Колонка 1] Ошибка: Рекурсивное включение файла: main.src",
+    ]
+    assert [str(e) for e in pp.source_map.remap(scanner.errors, scanner.line_index)] == [
+        f"{header}: [Строка 2, Колонка 6] Ошибка: Недопустимый символ: '@' (ASCII: 64)",
+    ]
+
+
+def test_header_cache_is_shared_between_units(tmp_path):
+    write_files(tmp_path, {
+        "config.h": "#ifndef CONFIG_H\n#define CONFIG_H\n#define LIMIT SIZE * 2\nint table[LIMIT];\n#endif\n",
+        "a.src": '#define SIZE 4\n#include "config.h"\nint a = LIMIT;\n',
+        "b.src": '#define SIZE 4\n#include "config.h"\nint b = LIMIT;\n',
+        "c.src": '#define SIZE 8\n#include "config.h"\nint c = LIMIT;\n',
+    })
+    cache = HeaderCache()
+
+    outputs = [preprocess_file(tmp_path / name, cache)[0] for name in ["a.src", "b.src", "c.src"]]
+
+    assert outputs == [
+        "int table[4 * 2];\nint a = 4 * 2;\n",
+        "int table[4 * 2];\nint b = 4 * 2;\n",
+        "int table[8 * 2];\nint c = 8 * 2;\n",
+    ]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_header_cache_tracks_nested_files(tmp_path):
+    write_files(tmp_path, {
+        "outer.h": '#include "inner.h"\n',
+        "inner.h": "int inner = 1;\n",
+        "main.src": '#include "outer.h"\n',
+    })
+    cache = HeaderCache()
+    assert preprocess_file(tmp_path / "main.src", cache)[0] == "int inner = 1;\n"
+
+    inner = tmp_path / "inner.h"
+    inner.write_text("int inner = 2;\n", encoding="utf-8")
+    stat = inner.stat()
+    os.utime(inner, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert preprocess_file(tmp_path / "main.src", cache)[0] == "int inner = 2;\n"
+    assert cache.hits == 0
+
+
+def test_fused_scanner_rejects_include(tmp_path):
+    pp = Preprocessor()
+    FusedScanner('#include "x.h"\nint a;\n', pp).scan_tokens()
+
+    assert [e.code for e in pp.errors] == ["P006"]
@@ -211,4 +211,197 @@ def test_cli_missing_input_file():
         "не найден",
         "системе не удается найти",
         "система не может найти"
-    ])
\ No newline at end of file
+    ])
+
+
+def test_cli_lex_regex_engine(tmp_path):
+    """Движок regex выдаёт те же токены, что и классический"""
+    test_file = tmp_path / "test.src"
+    test_file.write_text("fn main() { int x = -42; /* c */ return x; }", encoding="utf-8")
+
+    classic = run_command("lex", "--input", str(test_file))
+    regex = run_command("lex", "--input", str(test_file), "--engine", "regex")
+
+    assert regex.returncode == 0
+    assert regex.stdout == classic.stdout
+
+
+def test_cli_lex_mmap_reader(tmp_path):
+    """Чтение через mmap выдаёт те же токены, что и чтение целиком"""
+    test_file = tmp_path / "test.src"
+    test_file.write_text("fn main() {\r\n  /* c */ return -1;\r\n}", encoding="utf-8")
+
+    memory = run_command("lex", "--input", str(test_file))
+    mmap = run_command("lex", "--input", str(test_file), "--reader", "mmap", "--engine", "regex")
+
+    assert mmap.returncode == 0
+    assert mmap.stdout == memory.stdout
+
+
+def test_cli_lex_cache_dir(tmp_path):
+    """Второй запуск берёт токены из кэша и выводит то же самое"""
+    test_file = tmp_path / "test.src"
+    test_file.write_text("fn main() { return 0; }", encoding="utf-8")
+    cache_dir = tmp_path / "cache"
+
+    first = run_command("lex", "--input", str(test_file), "--cache-dir", str(cache_dir))
+    second = run_command("lex", "--input", str(test_file), "--cache-dir", str(cache_dir))
+
+    assert first.returncode == 0 and second.returncode == 0
+    assert second.stdout == first.stdout
+    assert len(list(cache_dir.glob("*.tok"))) == 1
+    # Статистика кэша в stderr: промах, затем попадание
+    assert first.stderr != second.stderr
+
+
+def test_cli_lex_binary_format_roundtrip(tmp_path):
+    """Двоичный поток токенов от lex разбирается parse --tokens"""
+    test_file = tmp_path / "test.src"
+    test_file.write_text("fn main() { int x = 42; return x; }", encoding="utf-8")
+    tokens_file = tmp_path / "test.tokb"
+
+    lexed = run_command("lex", "--input", str(test_file), "--format", "binary", "--output", str(tokens_file))
+    assert lexed.returncode == 0
+    assert tokens_file.read_bytes().startswith(b"TOKS")
+
+    from_tokens = run_command("parse", "--input", str(tokens_file), "--tokens")
+    from_source = run_command("parse", "--input", str(test_file))
+    assert from_tokens.returncode == 0
+    assert from_tokens.stdout == from_source.stdout
+
+
+def test_cli_check_count_only(tmp_path):
+    """check --count-only завершается с ошибкой, не выводя сообщений"""
+    test_file = tmp_path / "test.src"
+    test_file.write_text("int @x = $;", encoding="utf-8")
+
+    result = run_command("check", "--input", str(test_file), "--count-only")
+
+    assert result.returncode != 0
+    assert "2" in result.stderr
+    assert "ASCII" not in result.stderr
+
+
+def test_cli_check_fail_fast(tmp_path):
+    """check --fail-fast останавливается на первой ошибке"""
+    test_file = tmp_path / "test.src"
+    test_file.write_text("int @x = $;", encoding="utf-8")
+
+    result = run_command("check", "--input", str(test_file), "--fail-fast")
+
+    assert result.returncode != 0
+    assert "ASCII: 64" in result.stderr
+    assert "ASCII: 36" not in result.stderr
+
+
+def test_cli_parse_preprocess_reports_source_lines(tmp_path):
+    """Позиции ошибок после препроцессора указывают на исходный файл"""
+    test_file = tmp_path / "test.src"
+    test_file.write_text(
+        "// comment\n#define N 1\n\n/* a\n b */\nfn main() -> int {\n    int y = @;\n    return N;\n}\n",
+        encoding="utf-8"
+    )
+
+    result = run_command("parse", "--input", str(test_file), "--preprocess")
+
+    assert "ASCII: 64" in result.stderr
+    assert "7, " in result.stderr
+    assert " 14]" in result.stderr
+
+
+@pytest.mark.parametrize("command", [["full"], ["parse", "--preprocess"]])
+def test_cli_fused_matches_preprocessed(tmp_path, command):
+    """Совмещённый режим: те же ошибки, что у препроцессора перед лексером"""
+    test_file = tmp_path / "test.src"
+    test_file.write_text(
+        "// comment\n#define EXPR (1 + )\n#ifdef DEBUG\nint hidden = @;\n#endif\n"
+        "fn main() -> int {\n    int y = EXPR;\n    return $;\n}\n",
+        encoding="utf-8"
+    )
+
+    fused = run_command(*command, "--input", str(test_file), "--fused")
+    staged = run_command(*command, "--input", str(test_file))
+
+    assert fused.returncode == staged.returncode
+    assert fused.stderr == staged.stderr
+    assert "ASCII: 36" in fused.stderr
+    assert "ASCII: 64" not in fused.stderr
+
+
+def test_cli_full_fused_keeps_source_lines(tmp_path):
+    test_file = tmp_path / "test.src"
+    test_file.write_text("// comment\n#define N 42\n\nint x = N;\n", encoding="utf-8")
+
+    result = run_command("full", "--input", str(test_file), "--fused")
+
+    assert result.returncode == 0
+    assert '4:9 INT_LITERAL "42" 42' in result.stdout
+
+
+def test_cli_parse_fused_requires_preprocess(tmp_path):
+    test_file = tmp_path / "test.src"
+    test_file.write_text("int x;\n", encoding="utf-8")
+
+    result = run_command("parse", "--input", str(test_file), "--fused")
+
+    assert result.returncode != 0
+    assert "--preprocess" in result.stderr
+
+
+@pytest.mark.parametrize("mode", ["--preprocess", "--tokens"])
+def test_cli_parse_cache_dir_rejected(tmp_path, mode):
+    """Кэш токенов не применяется к результату препроцессора и потоку токенов"""
+    test_file = tmp_path / "test.src"
+    test_file.write_text("int x;\n", encoding="utf-8")
+    cache_dir = tmp_path / "cache"
+
+    result = run_command("parse", "--input", str(test_file), mode, "--cache-dir", str(cache_dir))
+
+    assert result.returncode != 0
+    assert "--cache-dir" in result.stderr
+    assert not cache_dir.exists()
+
+
+def test_cli_preprocess_include_dirs(tmp_path):
+    """#include ищется рядом с файлом и в каталогах -I"""
+    (tmp_path / "inc").mkdir()
+    (tmp_path / "inc" / "defs.h").write_text("#define SIZE 8\nint table[SIZE];\n", encoding="utf-8")
+    (tmp_path / "local.h").write_text("#pragma once\nint local;\n", encoding="utf-8")
+    test_file = tmp_path / "test.src"
+    test_file.write_text('#include <defs.h>\n#include "local.h"\n#include "local.h"\nint n = SIZE;\n',
+                         encoding="utf-8")
+
+    result = run_command("preprocess", "--input", str(test_file), "--show", "-I", str(tmp_path / "inc"))
+
+    assert result.returncode == 0
+    assert "int table[8];\nint local;\nint n = 8;\n" in result.stdout
+
+
+def test_cli_preprocess_defines_select_variant(tmp_path):
+    """-D определяет макросы до обработки файла"""
+    test_file = tmp_path / "test.src"
+    test_file.write_text("#if defined(FAST) && LEVEL > 1\nint fast;\n#elif LEVEL\nint level;\n#else\nint none;\n#endif\n",
+                         encoding="utf-8")
+
+    variants = [[], ["-D", "LEVEL=1"], ["-D", "FAST", "-D", "LEVEL=2"]]
+    outputs = [run_command("preprocess", "--input", str(test_file), "--show", *defines).stdout
+               for defines in variants]
+
+    assert "int none;" in outputs[0]
+    assert "int level;" in outputs[1]
+    assert "int fast;" in outputs[2]
+
+
+def test_cli_preprocess_variants(tmp_path):
+    """--variant: по файлу результата на каждый вариант"""
+    test_file = tmp_path / "test.src"
+    test_file.write_text("#if LEVEL == 2\nint two;\n#elif defined(FAST)\nint fast;\n#else\nint other;\n#endif\n",
+                         encoding="utf-8")
+
+    result = run_command("preprocess", "--input", str(test_file), "-D", "LEVEL=1",
+                         "--variant", "", "--variant", "FAST", "--variant", "LEVEL=2,FAST",
+                         "--output-dir", str(tmp_path / "out"))
+
+    assert result.returncode == 0
+    assert [(tmp_path / "out" / f"test.{n}.src").read_text(encoding="utf-8") for n in (1, 2, 3)] == \
+        ["int other;\n", "int fast;\n", "int two;\n"]
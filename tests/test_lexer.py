@@ -1,10 +1,19 @@
 # tests/test_lexer.py
+import os
 import sys
 from pathlib import Path
 
 # Добавляем корневую папку проекта в путь Python
 sys.path.insert(0, str(Path(__file__).parent.parent))
+import pytest
+
 from src.lexer.scanner import Scanner
+from src.lexer.regex_scanner import RegexScanner, create_scanner
+from src.lexer.source import ChunkedReader, MmapReader, open_reader
+from src.lexer import parallel
+from src.lexer.cache import TokenCache
+from src.lexer.diagnostic import Diagnostic, Severity
+from src.lexer.serialize import SerializationError, TokenStreamReader, dump_tokens, load_tokens
 from src.lexer.token import TokenType
 
 
@@ -519,4 +528,620 @@ def test_get_line_column():
 
     # Получаем следующий токен
     token2 = scanner.next_token()
-    assert token2.lexeme == "main"
\ No newline at end of file
+    assert token2.lexeme == "main"
+
+
+# ==================== Движок на регулярных выражениях ====================
+
+# Исходники из тестов выше плюс пограничные случаи быстрого пути
+PARITY_SOURCES = [
+    "",
+    "   \t\n\r\n   ",
+    "if else while for int float bool return true false void struct fn string",
+    "x counter _private var123 CamelCase",
+    "a" * 255,
+    "a" * 256,
+    "123abc",
+    "__my_var__ WITH_UNDERSCORE",
+    "0 42 -17 2147483647 -2147483648",
+    "2147483648 -2147483649",
+    "0.0 3.14 -2.5 100.0 0.001",
+    "1.  .5 1..2",
+    '"hello" "world" "test with spaces"',
+    '"hello\\nworld" "tab\\there" "quote\\"inside"',
+    '"hello world',
+    '"hello\nworld"',
+    "true false",
+    "+ - * / %",
+    "== != < <= > >=",
+    "&& || !",
+    "= += -= *= /=",
+    "++ --",
+    "->",
+    "point.x",
+    "a & b",
+    "a | b",
+    "( ) { } [ ] , ; : .",
+    "int x = 42; // это комментарий\nint y = 5;",
+    "int x = 42; /* это\nмногострочный\nкомментарий */ int y = 5;",
+    "int x = 42; /* незакрытый комментарий",
+    "if (x < 10) { return true; }",
+    "x = -42; y = -3.14;",
+    "int x = 42;\r\nint y = 5;",
+    "fn main()",
+    "fn main()\n{\n    int x;\n}",
+    "int x = @42;",
+    "@ & | $",
+    "int x = @42; int y = 5;",
+    # Пограничные случаи
+    "/* a\n b */ x /* c\r\n */ y",
+    "x-5 --5 -> -= a\rb",
+    "}{ { } }",
+    "имя = 1; x\u0663 = 2; 1.\u0663",
+    '"a\\qb" "\\',
+    "1e5 0x1F 00 007",
+    "a  ",
+]
+
+
+def scan_with(scanner_class, source):
+    scanner = scanner_class(source)
+    tokens = scanner.scan_tokens()
+    return [(str(t), type(t.literal_value)) for t in tokens], scanner.get_errors()
+
+
+@pytest.mark.parametrize("source", PARITY_SOURCES)
+def test_regex_engine_parity(source):
+    assert scan_with(RegexScanner, source) == scan_with(Scanner, source)
+
+
+def test_regex_engine_parity_on_examples():
+    examples = Path(__file__).parent.parent / "examples"
+    for path in sorted(examples.glob("*.src")):
+        source = path.read_text(encoding="utf-8")
+        assert scan_with(RegexScanner, source) == scan_with(Scanner, source), path.name
+
+
+def test_create_scanner_engines():
+    assert type(create_scanner("x", "classic")) is Scanner
+    assert type(create_scanner("x", "regex")) is RegexScanner
+
+    with pytest.raises(ValueError):
+        create_scanner("x", "unknown")
+
+
+def test_regex_engine_next_token():
+    scanner = RegexScanner("fn main")
+
+    assert scanner.next_token().token_type == TokenType.KW_FN
+    assert scanner.peek_token().lexeme == "main"
+    assert scanner.next_token().lexeme == "main"
+    assert scanner.next_token().token_type == TokenType.EOF
+
+
+# ==================== Компактное хранение токенов ====================
+
+def test_token_has_no_dict():
+    token = Scanner("x").scan_tokens()[0]
+    assert not hasattr(token, "__dict__")
+
+
+@pytest.mark.parametrize("scanner_class", [Scanner, RegexScanner])
+@pytest.mark.parametrize("source", PARITY_SOURCES)
+def test_token_buffer_matches_token_list(scanner_class, source):
+    buffer = scanner_class(source).scan_buffer()
+    tokens = scanner_class(source).scan_tokens()
+
+    assert len(buffer) == len(tokens)
+    assert [(str(t), type(t.literal_value)) for t in buffer] == \
+        [(str(t), type(t.literal_value)) for t in tokens]
+    assert buffer[-1].token_type == TokenType.EOF
+
+
+def test_token_buffer_offsets():
+    buffer = Scanner('x = -5; "hi"').scan_buffer()
+
+    spans = [(buffer.starts[i], buffer.ends[i]) for i in range(len(buffer))]
+    assert spans == [(0, 1), (2, 3), (4, 6), (6, 7), (8, 12), (12, 12)]
+    assert buffer[2].lexeme == "5"
+    assert buffer[2].literal_value == -5
+    assert buffer[4].literal_value == "hi"
+
+
+POSITION_SOURCES = [
+    "a\r\nb\rc\n\n  d",
+    "x /* 1\n 2 */ y /* 3\r\n4 */ z",
+    '"a\\\nb" c\n"d\ne" f',
+    "-5 + 10\n\t-x",
+]
+
+
+@pytest.mark.parametrize("scanner_class", [Scanner, RegexScanner])
+@pytest.mark.parametrize("source", POSITION_SOURCES + PARITY_SOURCES)
+def test_line_index_matches_token_positions(scanner_class, source):
+    tokens = scanner_class(source).scan_tokens()
+    buffer = scanner_class(source).scan_buffer()
+
+    assert [buffer.position(i) for i in range(len(buffer))] == \
+        [(t.line, t.column) for t in tokens]
+
+
+def test_token_buffer_range_queries():
+    source = "int a = 1;\n/* c */\nb = a + 22;\n"
+    buffer = Scanner(source).scan_buffer()
+    second = source.index("b")
+
+    assert buffer[buffer.index_at(source.index("22") + 1)].lexeme == "22"
+    assert buffer.index_at(3) is None
+    assert [buffer[i].lexeme for i in buffer.indices_between(6, 9)] == ["=", "1"]
+    assert [buffer[i].lexeme for i in buffer.indices_on_line(3)] == ["b", "=", "a", "+", "22", ";"]
+    assert buffer.indices_on_line(3)[0] == buffer.index_at(second)
+    assert list(buffer.indices_on_line(2)) == []
+    assert list(buffer.indices_on_line(9)) == []
+
+
+# ==================== Потоковый режим ====================
+
+@pytest.mark.parametrize("scanner_class", [Scanner, RegexScanner])
+@pytest.mark.parametrize("source", PARITY_SOURCES)
+def test_iter_tokens_matches_scan_tokens(scanner_class, source):
+    streaming = scanner_class(source)
+    streamed = [(str(t), type(t.literal_value)) for t in streaming.iter_tokens()]
+
+    assert (streamed, streaming.get_errors()) == scan_with(scanner_class, source)
+
+
+@pytest.mark.parametrize("scanner_class", [Scanner, RegexScanner])
+def test_next_token_scans_lazily(scanner_class):
+    scanner = scanner_class("fn main() { return 0; }" + " x" * 1000)
+
+    assert scanner.next_token().token_type == TokenType.KW_FN
+    assert scanner.peek_token(2).token_type == TokenType.RPAREN
+    # Просмотр вперёд не сканирует весь файл
+    assert scanner.current < 20
+    assert scanner.next_token().lexeme == "main"
+
+
+def test_peek_token_past_eof():
+    scanner = Scanner("x")
+
+    assert scanner.peek_token(5).token_type == TokenType.EOF
+    assert scanner.next_token().lexeme == "x"
+    assert scanner.next_token().token_type == TokenType.EOF
+    assert scanner.next_token().token_type == TokenType.EOF
+
+
+# ==================== Чтение фрагментами ====================
+
+READER_SOURCES = [
+    "fn main() { return 0; }",
+    "int counter = -42;\r\nfloat pi = 3.14159;",
+    "/* комментарий\nна две строки */ x /* и ещё */",
+    'string s = "привет\\n мир"; // хвост',
+    "a && b || !c\n{ /* незакрытый",
+    '"незавершённая',
+    "} лишняя скобка",
+    "a \t \r\n/* x **/ b // c\r\n\"d\\\"e\"   ",
+]
+
+
+@pytest.mark.parametrize("reader_class", [ChunkedReader, MmapReader])
+@pytest.mark.parametrize("scanner_class", [Scanner, RegexScanner])
+@pytest.mark.parametrize("source", READER_SOURCES)
+def test_reader_matches_in_memory(tmp_path, reader_class, scanner_class, source):
+    path = tmp_path / "input.src"
+    path.write_text(source, encoding="utf-8")
+    text = path.read_text(encoding="utf-8")
+
+    for chunk_size in (1, 2, 3, 7):
+        with reader_class(str(path), chunk_size) as reader:
+            scanner = scanner_class(reader)
+            tokens = [(str(t), type(t.literal_value)) for t in scanner.iter_tokens()]
+        assert (tokens, scanner.get_errors()) == scan_with(scanner_class, text)
+
+
+def test_reader_on_examples(tmp_path):
+    examples = Path(__file__).parent.parent / "examples"
+    for path in examples.glob("*.src"):
+        text = path.read_text(encoding="utf-8")
+        with open_reader(str(path), "mmap", chunk_size=16) as reader:
+            scanner = Scanner(reader)
+            tokens = [(str(t), type(t.literal_value)) for t in scanner.scan_tokens()]
+        assert (tokens, scanner.get_errors()) == scan_with(Scanner, text)
+
+
+def test_reader_empty_file(tmp_path):
+    path = tmp_path / "empty.src"
+    path.write_bytes(b"")
+
+    with MmapReader(str(path)) as reader:
+        tokens = Scanner(reader).scan_tokens()
+    assert [t.token_type for t in tokens] == [TokenType.EOF]
+
+
+def test_reader_rejects_token_buffer(tmp_path):
+    path = tmp_path / "input.src"
+    path.write_text("x", encoding="utf-8")
+
+    with ChunkedReader(str(path)) as reader:
+        with pytest.raises(ValueError):
+            Scanner(reader).scan_buffer()
+
+
+# ==================== Параллельный режим ====================
+
+def test_split_points_skip_strings_and_comments():
+    source = 'a\n/* x\ny */ "s\\\nt"\nb\nc'
+    # Переводы строк внутри комментария и строки не годятся для разреза
+    safe = {2, source.index("b"), source.index("c")}
+    lines = {t.lexeme: t.line for t in Scanner(source).scan_tokens()}
+
+    points = parallel.find_split_points(source, 8)
+
+    assert points[0] == (0, 1)
+    assert {offset for offset, _ in points[1:]} <= safe
+    for offset, line in points[1:]:
+        assert line == lines[source[offset]]
+
+
+@pytest.mark.parametrize("scanner_class", [Scanner, RegexScanner])
+def test_parallel_matches_serial(monkeypatch, scanner_class):
+    monkeypatch.setattr(parallel, "MIN_SEGMENT_SIZE", 1)
+    source = "\n".join([
+        "fn main() {",
+        "    /* многострочный",
+        "       комментарий */ int x = -1;",
+        '    string s = "a\\',
+        'b";',
+        "}",
+        "} @",
+        "{",
+        "    return 1.5;",
+    ])
+
+    expected = scan_with(scanner_class, source)
+
+    scanner = scanner_class(source)
+    tokens = scanner.scan_tokens_parallel(workers=4)
+    assert ([(str(t), type(t.literal_value)) for t in tokens], scanner.get_errors()) == expected
+
+
+@pytest.mark.parametrize("scanner_class", [Scanner, RegexScanner])
+def test_parallel_respects_max_errors(monkeypatch, scanner_class):
+    monkeypatch.setattr(parallel, "MIN_SEGMENT_SIZE", 1)
+    source = "x = @ $ #;\n" * 50
+
+    scanner = scanner_class(source, max_errors=1)
+    tokens = scanner.scan_tokens_parallel(workers=4)
+
+    assert scanner.truncated
+    assert len(scanner.get_errors()) == 1
+    assert [t.lexeme for t in tokens] == ["x", "=", ""]
+
+
+# ==================== Интернирование лексем ====================
+
+@pytest.mark.parametrize("scanner_class", [Scanner, RegexScanner])
+def test_equal_lexemes_share_one_object(scanner_class):
+    tokens = scanner_class("count += count; int x; int y; a == b == c").scan_tokens()
+    by_lexeme = {}
+    for token in tokens[:-1]:
+        assert by_lexeme.setdefault(token.lexeme, token.lexeme) is token.lexeme
+
+
+# ==================== Инкрементальное сканирование ====================
+
+RELEX_SOURCE = """fn main() {
+    int x = 42; /* комментарий
+    на две строки */ int y = -7;
+    string s = "текст";
+}
+"""
+
+NUMBER = RELEX_SOURCE.index("42")
+COMMENT = RELEX_SOURCE.index("/*")
+QUOTE = RELEX_SOURCE.index('"')
+
+RELEX_EDITS = [
+    ((NUMBER, NUMBER + 2), "4200"),         # правка внутри числа
+    ((NUMBER, NUMBER), "\n"),               # новая строка сдвигает хвост
+    ((COMMENT + 3, COMMENT + 3), "*/ z /*"),  # комментарий закрывается раньше
+    ((0, len(RELEX_SOURCE)), ""),           # удаление всего текста
+    ((len(RELEX_SOURCE), len(RELEX_SOURCE)), "// хвост"),
+    ((QUOTE, QUOTE + 1), ""),               # без открывающей кавычки меняется всё до конца строки
+    ((NUMBER, NUMBER), '"'),                # незакрытая строка
+    ((COMMENT + 2, COMMENT + 2), "*/"),     # хвост комментария становится кодом
+    ((NUMBER, NUMBER), "/*"),               # незакрытый комментарий до конца файла
+    ((NUMBER, NUMBER), "{"),                # незакрытый блок
+    ((NUMBER, NUMBER), "} }"),              # лишние '}' и сдвиг ошибок хвоста
+    ((len(RELEX_SOURCE) - 2, len(RELEX_SOURCE) - 1), ""),  # удаление последней '}'
+]
+
+
+@pytest.mark.parametrize("scanner_class", [Scanner, RegexScanner])
+@pytest.mark.parametrize("edit_range, new_text", RELEX_EDITS)
+def test_relex_matches_full_rescan(scanner_class, edit_range, new_text):
+    scanner = scanner_class(RELEX_SOURCE)
+    buffer = scanner.scan_buffer()
+
+    relexed = scanner.relex(buffer, edit_range, new_text)
+
+    start, end = edit_range
+    edited = RELEX_SOURCE[:start] + new_text + RELEX_SOURCE[end:]
+    full = scanner_class(edited)
+    expected = full.scan_buffer()
+    assert scanner.source == edited
+    assert [str(t) for t in relexed] == [str(t) for t in expected]
+    assert list(relexed.starts) == list(expected.starts)
+    assert list(relexed.ends) == list(expected.ends)
+    assert list(relexed.line_index.starts) == list(expected.line_index.starts)
+    assert list(relexed.line_index.lines) == list(expected.line_index.lines)
+    assert scanner.errors == full.errors
+
+
+def test_relex_sequence_of_edits():
+    source = "int a = 1;\nint b = 2;\n"
+    scanner = Scanner(source)
+    buffer = scanner.scan_buffer()
+
+    for position, text in [(4, "x"), (0, "fn f() {\n"), (11, '"'), (11, "} @"), (len(source), "}")]:
+        buffer = scanner.relex(buffer, (position, position), text)
+        source = source[:position] + text + source[position:]
+        full = Scanner(source)
+        assert [str(t) for t in buffer] == [str(t) for t in full.scan_buffer()]
+        assert scanner.errors == full.errors
+
+
+# ==================== Кэш токенов ====================
+
+SERIALIZE_SOURCES = PARITY_SOURCES + [
+    "x = 99999999999999999999999; y = -0.0; z = 1.5e3",
+    'string s = "\\\\n \\\\t"; "незакрытая',
+]
+
+
+@pytest.mark.parametrize("source", SERIALIZE_SOURCES)
+def test_serialize_roundtrip(source):
+    scanner = Scanner(source)
+    tokens = scanner.scan_tokens()
+
+    loaded, errors = load_tokens(dump_tokens(tokens, scanner.get_errors()))
+
+    assert [(str(t), type(t.literal_value)) for t in loaded] == \
+        [(str(t), type(t.literal_value)) for t in tokens]
+    assert errors == scanner.get_errors()
+
+
+def test_serialize_rejects_garbage():
+    with pytest.raises(SerializationError):
+        load_tokens(b"not a token stream")
+
+
+def test_token_cache_hit_and_miss(tmp_path):
+    cache = TokenCache(str(tmp_path))
+    source = "fn main() { int x = @; }"
+
+    first = cache.scan(Scanner(source))
+    scanner = Scanner(source)
+    second = cache.scan(scanner)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert [str(t) for t in second] == [str(t) for t in first]
+    reference = Scanner(source)
+    reference.scan_tokens()
+    assert scanner.get_errors() == reference.get_errors() != []
+
+
+def test_token_cache_corrupt_entry_is_miss(tmp_path):
+    cache = TokenCache(str(tmp_path))
+    source = "int x;"
+    (tmp_path / (cache.key(source) + TokenCache.SUFFIX)).write_bytes(b"\x00" * 10)
+
+    cache.scan(Scanner(source))
+
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert len(cache.load(cache.key(source))[0]) == 4
+
+
+def test_token_cache_evicts_least_recently_used(tmp_path):
+    cache = TokenCache(str(tmp_path))
+    sources = [f"int x{i} = {i};" for i in range(3)]
+    for i, source in enumerate(sources):
+        cache.scan(Scanner(source))
+        path = tmp_path / (cache.key(source) + TokenCache.SUFFIX)
+        os.utime(path, (i, i))
+    entry_size = (tmp_path / (cache.key(sources[0]) + TokenCache.SUFFIX)).stat().st_size
+
+    cache.max_bytes = entry_size * 2 + 10
+    cache.evict()
+
+    assert cache.load(cache.key(sources[0])) is None
+    assert cache.load(cache.key(sources[2])) is not None
+
+
+def test_token_stream_reader_indexing():
+    scanner = Scanner('fn f() { return "s"; }')
+    tokens = scanner.scan_tokens()
+    reader = TokenStreamReader(dump_tokens(tokens, scanner.get_errors()))
+
+    assert len(reader) == len(tokens)
+    assert str(reader[0]) == str(tokens[0])
+    assert str(reader[-1]) == str(tokens[-1])
+    assert reader[-4].literal_value == "s"
+    with pytest.raises(IndexError):
+        reader[len(tokens)]
+
+
+def test_token_stream_reader_truncated():
+    data = dump_tokens(Scanner("int x = 1;").scan_tokens(), ["ошибка"])
+    with pytest.raises(SerializationError):
+        TokenStreamReader(data[:-2])
+
+
+# ==================== Пропуск серий символов ====================
+
+BULK_SOURCES = [
+    "/*" + "длинный комментарий " * 500 + "*/ x",
+    "/*" + "строка\n" * 300 + "*/ x\n/*" + "строка\r\n" * 300 + "*/ y",
+    "// " + "хвост " * 500 + "\r\nx",
+    'string s = "' + "текст " * 500 + '\\n' + "ещё " * 100 + '";',
+    '"' + "незавершённая " * 100 + "\nx",
+    "x" + " \t\r" * 300 + "\ny" + " " * 100,
+]
+
+
+@pytest.mark.parametrize("source", BULK_SOURCES)
+def test_bulk_skip_matches_regex_engine(source):
+    assert scan_with(Scanner, source) == scan_with(RegexScanner, source)
+
+
+def test_bulk_skip_positions_after_comment_and_string():
+    scanner = Scanner('/* a\n  bb */ x "' + "s" * 1000 + '" y')
+    tokens = scanner.scan_tokens()
+
+    assert (tokens[0].lexeme, tokens[0].line, tokens[0].column) == ("x", 2, 10)
+    assert tokens[1].literal_value == "s" * 1000
+    assert (tokens[2].lexeme, tokens[2].line, tokens[2].column) == ("y", 2, 1015)
+
+
+# ==================== Диагностики ====================
+
+def test_errors_are_formatted_lazily():
+    scanner = Scanner("int x = @;")
+    scanner.scan_tokens()
+
+    error = scanner.errors[0]
+    assert isinstance(error, Diagnostic)
+    assert (error.code, error.severity, error.line, error.column) == ("L003", Severity.ERROR, 1, 10)
+    assert error.args == ("@", 64)
+    assert scanner.get_errors() == ["[Строка 1, Колонка 10] Ошибка: Недопустимый символ: '@' (ASCII: 64)"]
+
+
+def test_error_limit_keeps_count():
+    source = "@ " * 10
+    full = Scanner(source)
+    full.scan_tokens()
+
+    capped = Scanner(source, error_limit=3)
+    capped.scan_tokens()
+    assert capped.get_errors() == full.get_errors()[:3]
+    assert (capped.errors.count, capped.errors.dropped) == (10, 7)
+
+
+@pytest.mark.parametrize("scanner_class", [Scanner, RegexScanner])
+def test_error_limit_zero_counts_only(scanner_class):
+    scanner = scanner_class('"a\\q" @ } /* x', error_limit=0)
+    scanner.scan_tokens()
+
+    assert len(scanner.errors) == 0
+    assert scanner.errors
+    assert scanner.errors.count == len(scan_with(scanner_class, '"a\\q" @ } /* x')[1])
+
+
+def test_capped_errors_are_not_cached(tmp_path):
+    cache = TokenCache(str(tmp_path))
+    source = "@ @ @"
+
+    cache.scan(Scanner(source, error_limit=1))
+    scanner = Scanner(source)
+    cache.scan(scanner)
+
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert len(scanner.get_errors()) == 3
+
+
+# ==================== Ранняя остановка ====================
+
+@pytest.mark.parametrize("scanner_class", [Scanner, RegexScanner])
+def test_max_errors_stops_scanning(scanner_class):
+    source = "int x = @; } int y = $; z"
+    full = scanner_class(source)
+    full.scan_tokens()
+
+    scanner = scanner_class(source, max_errors=2)
+    tokens = scanner.scan_tokens()
+
+    assert scanner.truncated and not full.truncated
+    assert scanner.get_errors() == full.get_errors()[:2]
+    assert [t.lexeme for t in tokens] == ["int", "x", "=", ";", ""]
+    assert tokens[-1].token_type == TokenType.EOF
+
+
+@pytest.mark.parametrize("scanner_class", [Scanner, RegexScanner])
+def test_validate_builds_no_tokens(scanner_class):
+    valid = scanner_class("fn main() { return 0; }")
+    assert valid.validate()
+    assert valid.tokens is None
+
+    invalid = scanner_class("int x = @;")
+    assert not invalid.validate()
+    assert invalid.get_errors() == scan_with(scanner_class, "int x = @;")[1]
+
+
+def test_validate_stops_reading_at_first_error(tmp_path):
+    path = tmp_path / "input.src"
+    path.write_text("int @x;\n" + "int y = 1;\n" * 1000, encoding="utf-8")
+
+    with ChunkedReader(str(path), chunk_size=64) as reader:
+        scanner = Scanner(reader, max_errors=1)
+        assert not scanner.validate()
+        assert reader.file.read(1) != ""
+
+
+def test_truncated_scan_is_not_cached(tmp_path):
+    cache = TokenCache(str(tmp_path))
+    source = "@ x @"
+
+    cache.scan(Scanner(source, max_errors=1))
+    scanner = Scanner(source)
+    cache.scan(scanner)
+
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert len(scanner.get_errors()) == 2
+
+
+def test_max_errors_bypasses_warm_cache(tmp_path):
+    cache = TokenCache(str(tmp_path))
+    source = "int x = @; } int y = $; z"
+    cache.scan(Scanner(source))
+
+    scanner = Scanner(source, max_errors=1)
+    tokens = cache.scan(scanner)
+
+    assert scanner.truncated
+    assert scanner.get_errors() == scan_with(Scanner, source)[1][:1]
+    assert [t.lexeme for t in tokens] == ["int", "x", "=", ""]
+
+
+# ==================== Классы символов ====================
+
+@pytest.mark.parametrize("source,expected", [
+    ("٣٤ + 1", ['1:1 INT_LITERAL "٣٤" 34', '1:4 PLUS "+"', '1:6 INT_LITERAL "1" 1']),
+    ("x²½ = y", ['1:1 IDENTIFIER "x²½"', '1:5 ASSIGN "="', '1:7 IDENTIFIER "y"']),
+    ("_a9 фЫ9", ['1:1 IDENTIFIER "_a9"', '1:5 IDENTIFIER "фЫ9"']),
+    ("-٣ -x", ['1:1 INT_LITERAL "٣" -3', '1:4 MINUS "-"', '1:5 IDENTIFIER "x"']),
+])
+def test_unicode_character_classes(source, expected):
+    scanner = Scanner(source)
+    tokens = scanner.scan_tokens()
+
+    assert [str(t) for t in tokens[:-1]] == expected
+    assert scanner.get_errors() == []
+
+
+def test_non_ascii_digit_without_value_is_error():
+    scanner = Scanner("x = ²;")
+    tokens = scanner.scan_tokens()
+
+    assert tokens[2].token_type == TokenType.INT_LITERAL
+    assert tokens[2].literal_value == 0
+    assert "Недопустимый целочисленный литерал" in scanner.get_errors()[0]
+
+
+@pytest.mark.parametrize("char", ["\x00", "\x7f", "$", "`", "\u00a0"])
+def test_unknown_characters_are_errors(char):
+    scanner = Scanner(f"a{char}b")
+    tokens = scanner.scan_tokens()
+
+    assert [t.lexeme for t in tokens[:-1]] == ["a", "b"]
+    assert "Недопустимый символ" in scanner.get_errors()[0]